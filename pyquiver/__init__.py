@@ -17,8 +17,10 @@ import logging as _logging
 from .quiver import System, Isotopologue
 from .config import Config
 from .kie import KIE_Calculation, KIE
-from .results import Results, KIEResult, EIEResult
-from .batch import batch, BatchResults
+from .results import (Results, KIEResult, EIEResult, ScreenResult, ArrheniusFit,
+                      CombinationResult, PairResult)
+from .batch import batch, iter_results, BatchResults
+from .sweep import SweepResults
 from . import tunneling
 
 # a library should not configure logging itself; attach a no-op handler so
@@ -41,8 +43,14 @@ __all__ = [
     "Results",
     "KIEResult",
     "EIEResult",
+    "ScreenResult",
+    "ArrheniusFit",
+    "CombinationResult",
+    "PairResult",
     "batch",
+    "iter_results",
     "BatchResults",
+    "SweepResults",
     "tunneling",
     "__version__",
 ]
@@ -14,18 +14,38 @@ over a glob)::
     results.to_dataframe()
 """
 
+import logging
+import traceback
 from collections import OrderedDict
 
 from .config import Config
 from .kie import KIE_Calculation
 
+logger = logging.getLogger("pyquiver")
+
+
+def _rows(label, results, skodje_truhlar=None):
+    # one table row per isotopologue result, led by the pair's label
+    rows = []
+    for result in results:
+        row = {"label": label}
+        row.update(result._asdict())
+        if skodje_truhlar is not None:
+            row["skodje_truhlar"] = skodje_truhlar.get(result.name)
+        rows.append(row)
+    return rows
+
 
 class BatchResults(object):
     """Results of a :func:`batch` run: one KIE_Calculation per label."""
 
-    def __init__(self, calcs, skodje_truhlar=None):
-        self._calcs = OrderedDict(calcs)   # label -> KIE_Calculation
+    def __init__(self, calcs, skodje_truhlar=None, energies=None, failures=None):
+        # label -> KIE_Calculation, or a PairResult from executor="process"
+        self._calcs = OrderedDict(calcs)
         self._st = skodje_truhlar          # label -> {isotopologue: corrected} or None
+        self._energies = energies          # label -> (reactant, ts, product) or None
+        # label -> error (traceback) of every pair that failed
+        self.failures = OrderedDict(failures or ())
 
     def __getitem__(self, label):
         return self._calcs[label]
@@ -43,14 +63,31 @@ class BatchResults(object):
         """Tidy long-form rows: one dict per (label, isotopologue)."""
         rows = []
         for label, calc in self._calcs.items():
-            for result in calc.results:
-                row = {"label": label}
-                row.update(result._asdict())
-                if self._st is not None:
-                    row["skodje_truhlar"] = self._st[label].get(result.name)
-                rows.append(row)
+            rows += _rows(label, calc.results,
+                          None if self._st is None else self._st[label])
         return rows
 
+    def sweep(self, temperatures, energies=None):
+        """Temperature sweep of every pair (see :meth:`KIE_Calculation.sweep`),
+        as one table with a leading ``label`` column. ``energies`` defaults to
+        the ones given to :func:`batch`, and adds a Skodje-Truhlar column."""
+        from .sweep import SweepResults
+
+        if energies is None:
+            energies = self._energies
+        columns, records = None, []
+        for label, calc in self._calcs.items():
+            if not isinstance(calc, KIE_Calculation):
+                raise ValueError("sweep needs the full calculations, which "
+                                 "executor='process' does not keep; run the batch "
+                                 "with executor='serial'")
+            result = calc.sweep(temperatures,
+                                energies[label] if energies is not None else None)
+            columns = ["label"] + result.columns
+            for row in result.to_records():
+                records.append(OrderedDict([("label", label)] + list(row.items())))
+        return SweepResults(columns or ["label", "temperature", "name"], records)
+
     def to_dataframe(self):
         """Return the results as a pandas DataFrame (optional pandas extra)."""
         try:
@@ -79,7 +116,116 @@ class BatchResults(object):
         return text
 
 
-def batch(config, pairs, style="gaussian", n_jobs=1, energies=None):
+def _prepare(config, pairs, style, n_jobs, engine, executor, timeout, memory_limit,
+             dry_run=False):
+    # check the executor options and, for executor="auto" or a dry run, plan
+    # the batch; returns (config, plan or None, executor, n_jobs, engine, the
+    # order in which to submit pairs to worker processes)
+    if executor not in ("serial", "process", "auto"):
+        raise ValueError("executor must be 'serial', 'process' or 'auto', not %r"
+                         % (executor,))
+    if timeout is not None and executor == "serial":
+        raise ValueError("timeout requires executor='process'")
+    for label, pair in pairs.items():
+        if len(pair) != 2:
+            raise ValueError("pair %r is not a (gs, ts) pair" % (label,))
+    if isinstance(config, str):
+        config = Config(config)   # parse once, reuse for every pair
+
+    plan, order = None, list(pairs)
+    if executor == "auto" or dry_run:
+        from . import planner
+
+        if executor == "process" or timeout is not None:
+            # only worker processes can time out a pair
+            strategy = "process"
+        elif executor == "serial":
+            strategy = ("batched" if engine == "batched" else
+                        "thread" if n_jobs not in (None, 1) else "serial")
+        else:
+            strategy = None
+        # an engine the caller chose is kept; the planner picks one only when
+        # engine is left at None
+        plan = planner.plan(config, pairs, style=style, n_jobs=n_jobs,
+                            memory_limit=memory_limit, strategy=strategy, engine=engine)
+        if not dry_run:
+            order, n_jobs = plan.order, plan.n_jobs
+            executor, engine = plan.executor, plan.engine
+    if engine is None:
+        engine = "eigvalsh"
+    return config, plan, executor, n_jobs, engine, order
+
+
+def _process_results(config, pairs, order, n_jobs, timeout, style, energies, engine,
+                     active_atoms, symmetry, blas_threads):
+    # PairResults from worker processes, as they complete
+    from . import workers
+
+    items = [(label, tuple(pairs[label])) for label in order]
+    for _, result in workers.run_pairs(config, items,
+                                       n_jobs=-1 if n_jobs is None else n_jobs,
+                                       timeout=timeout, style=style,
+                                       energies=energies, engine=engine,
+                                       active_atoms=active_atoms,
+                                       symmetry=symmetry,
+                                       blas_threads=blas_threads):
+        yield result
+
+
+def _in_order(results, labels):
+    # re-yield ``results`` in the order of ``labels``, holding back only those
+    # that complete early
+    waiting = {}
+    labels = iter(labels)
+    expected = next(labels, None)
+    for result in results:
+        waiting[result.label] = result
+        while expected in waiting:
+            yield waiting.pop(expected)
+            expected = next(labels, None)
+
+
+def iter_results(config, pairs, style="gaussian", n_jobs=None, energies=None,
+                 engine=None, active_atoms=None, symmetry=False, executor="serial",
+                 timeout=None, blas_threads="auto", memory_limit=None, ordered=False):
+    """Run :func:`batch`, but yield a :class:`~pyquiver.results.PairResult`
+    per pair as soon as it is done instead of collecting the calculations.
+
+    Every calculation is dropped once it has been summarized, so the memory
+    used does not grow with the number of pairs; write the records out as they
+    arrive with a :class:`~pyquiver.sinks.CSVSink` or
+    :class:`~pyquiver.sinks.JSONLSink`. With the process executor the
+    records arrive in the order the pairs complete, unless ``ordered=True``
+    (which holds back those that complete ahead of an earlier pair). A pair
+    that fails is logged and yielded with its ``error`` set, whatever the
+    executor. The other arguments are those of :func:`batch`.
+    """
+    config, _, executor, n_jobs, engine, order = _prepare(
+        config, pairs, style, n_jobs, engine, executor, timeout, memory_limit)
+
+    if executor == "process":
+        results = _process_results(config, pairs, order, n_jobs, timeout, style, energies,
+                                   engine, active_atoms, symmetry, blas_threads)
+        return _in_order(results, list(pairs)) if ordered else results
+
+    def serial():
+        from . import workers
+
+        for label, (gs, ts) in pairs.items():
+            result = workers.compute(label, config, gs, ts,
+                                     None if energies is None else energies[label],
+                                     style=style, n_jobs=1 if n_jobs is None else n_jobs,
+                                     engine=engine, active_atoms=active_atoms,
+                                     symmetry=symmetry, blas_threads=blas_threads)
+            if result.error is not None:
+                logger.warning("Pair %s failed:\n%s", label, result.error)
+            yield result
+    return serial()
+
+
+def batch(config, pairs, style="gaussian", n_jobs=None, energies=None,
+          engine=None, active_atoms=None, symmetry=False, executor="serial",
+          timeout=None, blas_threads="auto", dry_run=False, memory_limit=None):
     """Run a KIE calculation for each ground-state/transition-state pair.
 
     ``config`` is a path to a .config file or a :class:`~pyquiver.Config`.
@@ -91,16 +237,73 @@ def batch(config, pairs, style="gaussian", n_jobs=1, energies=None):
     along the reaction coordinate:
     ``{label: (reactant_energy, ts_energy, product_energy)}``. (If your reaction
     is effectively a single well, pass the reactant energy for the product too.)
+
+    ``engine`` (default ``"eigvalsh"``), ``active_atoms`` and ``symmetry`` are
+    passed through to every :class:`~pyquiver.KIE_Calculation`. With the
+    default ``executor="serial"`` the pairs run one after another and
+    ``n_jobs`` (default 1) is passed through as well. With
+    ``executor="process"`` the pairs are parsed and computed in ``n_jobs``
+    worker processes (default, or if negative, one per CPU; see
+    :mod:`pyquiver.workers`): the results hold a
+    :class:`~pyquiver.results.PairResult` per label instead of a
+    KIE_Calculation, a pair may also fail by running longer than ``timeout``
+    seconds, and ``BatchResults.sweep`` is not available. With either
+    executor a pair that fails is logged and listed in
+    ``BatchResults.failures`` rather than raising.
+
+    ``executor="auto"`` lets :func:`pyquiver.planner.plan` choose between
+    serial, threaded, batched-engine and process execution from the atom
+    counts and isotopologues, using at most ``n_jobs`` cores (default all)
+    and ``memory_limit`` bytes (default the available memory); the process
+    executor then starts the largest pairs first. The planner picks the engine
+    only if ``engine`` is not given, and plans process execution if a
+    ``timeout`` is. With ``dry_run=True``
+    nothing runs and the :class:`~pyquiver.planner.Plan` is returned instead
+    (print it for a table of the estimates); for an explicit ``executor`` it
+    shows that executor's plan.
+
+    ``blas_threads`` caps the threads of the BLAS library under each
+    diagonalization so that workers x BLAS threads fit the cores: ``"auto"``,
+    a number per worker, or None to leave BLAS alone (see
+    :mod:`pyquiver.threads`).
+
+    To write results as they are produced rather than holding every
+    calculation in memory, use :func:`iter_results`.
     """
-    if isinstance(config, str):
-        config = Config(config)   # parse once, reuse for every pair
+    config, plan, executor, n_jobs, engine, order = _prepare(
+        config, pairs, style, n_jobs, engine, executor, timeout, memory_limit, dry_run)
+    if dry_run:
+        return plan
 
-    calcs = OrderedDict()
+    if executor == "process":
+        done = {}
+        for result in _process_results(config, pairs, order, n_jobs, timeout, style,
+                                       energies, engine, active_atoms, symmetry,
+                                       blas_threads):
+            done[result.label] = result
+        ordered = [done[label] for label in pairs]
+        records = [(r.label, r) for r in ordered if r.error is None]
+        st = (OrderedDict((label, r.skodje_truhlar) for label, r in records)
+              if energies is not None else None)
+        return BatchResults(records, st, energies,
+                            [(r.label, r.error) for r in ordered if r.error is not None])
+
+    calcs, failures = OrderedDict(), OrderedDict()
     st = OrderedDict() if energies is not None else None
     for label, (gs, ts) in pairs.items():
-        calc = KIE_Calculation(config, gs, ts, style=style, n_jobs=n_jobs)
+        # a pair that fails is recorded, as with the process executor, and
+        # the rest carry on
+        try:
+            calc = KIE_Calculation(config, gs, ts, style=style,
+                                   n_jobs=1 if n_jobs is None else n_jobs,
+                                   engine=engine, active_atoms=active_atoms,
+                                   symmetry=symmetry, blas_threads=blas_threads)
+            if energies is not None:
+                reactant, ts_energy, product = energies[label]
+                st[label] = calc.skodje_truhlar(reactant, product, ts_energy)
+        except Exception:
+            failures[label] = traceback.format_exc()
+            logger.warning("Pair %s failed:\n%s", label, failures[label])
+            continue
         calcs[label] = calc
-        if energies is not None:
-            reactant, ts_energy, product = energies[label]
-            st[label] = calc.skodje_truhlar(reactant, product, ts_energy)
-    return BatchResults(calcs, st)
+    return BatchResults(calcs, st, energies, failures)
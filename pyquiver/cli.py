@@ -25,6 +25,20 @@ def _configure_logging(verbosity):
     logging.basicConfig(level=level, format="%(message)s")
 
 
+def _blas_threads(value):
+    """Parse --blas-threads: "auto", "none" or a positive integer."""
+    if value in ("auto", "none"):
+        return None if value == "none" else value
+    try:
+        n = int(value)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError("expected 'auto', 'none' or a positive "
+                                         "integer, not %r" % value)
+    return n
+
+
 def main(argv=None):
     """Run a single KIE/EIE calculation (the ``pyquiver`` command)."""
     parser = argparse.ArgumentParser(
@@ -33,10 +47,14 @@ def main(argv=None):
     parser.add_argument('-v', '--verbose', dest="debug", action='count',
                         help='print debug information (repeatable)')
     parser.add_argument('-s', '--style', dest="style", default='gaussian',
-                        help='style of input files (gaussian, orca, or pyquiver)')
+                        help='style of input files (gaussian, fchk, orca, or pyquiver)')
     parser.add_argument('-j', '--jobs', dest="jobs", type=int, default=1,
                         help='number of worker threads for the isotopologue '
                              'computations (default 1; -1 uses all cores)')
+    parser.add_argument('--blas-threads', dest="blas_threads", type=_blas_threads,
+                        default="auto",
+                        help='BLAS threads per worker: "auto" (cores divided by '
+                             '-j), a number, or "none" to leave BLAS alone')
     parser.add_argument('config', help='configuration file path')
     parser.add_argument('gs', help='ground state file path')
     parser.add_argument('ts', help='transition state file path')
@@ -50,7 +68,7 @@ def main(argv=None):
     print("warning: " + _msg, file=sys.stderr)
 
     calc = KIE_Calculation(args.config, args.gs, args.ts, style=args.style,
-                           n_jobs=args.jobs)
+                           n_jobs=args.jobs, blas_threads=args.blas_threads)
     print(calc)
     return calc
 
@@ -0,0 +1,124 @@
+"""Multiply labelled isotopologues from single-site results.
+
+Clumped-isotope and multiple-labelling studies need every k-label combination
+of a set of sites, which is far too many isotopologues to diagonalize. By the
+rule of the geometric mean, the isotope effect of a multiply substituted
+isotopologue is close to the product of its single-site effects. The
+deviation from that rule comes from the coupling of the substituted atoms in
+the Hessian: in the trace expansion of the reduced partition function ratio
+(see :func:`~pyquiver.kie.approximate_rpfr`) the first-order term is exactly
+additive, and the leading non-additive term is
+
+    ln RPFR(i+j) - ln RPFR(i) - ln RPFR(j) = c2^2/1440 sum_{p in i, q in j} H_pq^2 d_p d_q
+
+with ``d = 1/m_light - 1/m_heavy`` per Cartesian coordinate and ``c2`` as in
+``approximate_rpfr``. :func:`combination_results` estimates every combination
+this way and only builds and diagonalizes those whose predicted deviation
+exceeds a tolerance. The prediction covers the partition function ratios; the
+tunnelling corrections are assumed to combine multiplicatively.
+"""
+
+import itertools
+import logging
+
+import numpy as np
+
+from . import engines
+from . import quiver
+from .constants import PHYSICAL_CONSTANTS
+from .kie import KIE
+from .results import CombinationResult
+
+logger = logging.getLogger("pyquiver")
+
+h = PHYSICAL_CONSTANTS["h"]    # J s
+kB = PHYSICAL_CONSTANTS["kB"]  # J / K
+
+
+def _coupling(system, reference_masses, site_masses):
+    # M_ij = sum_{p in site i, q in site j} H_pq^2 d_p d_q for every pair of
+    # sites, from the changed coordinates of all sites at once
+    reference = np.repeat(np.asarray(reference_masses, dtype=float), 3)
+    coords, owners, d = [], [], []
+    for site, masses in enumerate(site_masses):
+        masses = np.repeat(np.asarray(masses, dtype=float), 3)
+        changed = np.flatnonzero(masses != reference)
+        coords.append(changed)
+        owners.append(np.full(len(changed), site))
+        d.append(1.0 / reference[changed] - 1.0 / masses[changed])
+    coords, owners, d = np.concatenate(coords), np.concatenate(owners), np.concatenate(d)
+    weights = system.hessian[np.ix_(coords, coords)] ** 2 * np.outer(d, d)
+    indicator = (owners[None, :] == np.arange(len(site_masses))[:, None]).astype(float)
+    return indicator @ weights @ indicator.T
+
+
+def combination_results(calc, sites=None, k=2, tolerance=1e-3):
+    """The body of :meth:`KIE_Calculation.combinations`."""
+    config = calc.config
+    ref = config.reference_isotopologue
+    has_ref = ref not in ("default", "none")
+    if sites is None:
+        sites = [name for name in calc.KIES if not (has_ref and name == ref)]
+    sites = list(sites)
+    missing = [name for name in sites if name not in calc.KIES]
+    if missing:
+        raise ValueError("unknown isotopologues: %s" % ", ".join(missing))
+    sizes = sorted(set([k] if np.isscalar(k) else k))
+    if not sizes or sizes[0] < 1 or sizes[-1] > len(sites):
+        raise ValueError("combination sizes must be between 1 and %d" % len(sites))
+
+    def headline(kie):
+        return float(kie.value) if calc.eie_flag == 1 else float(kie.value[-1])
+
+    # absolute single-site values (the table's are divided by the reference)
+    ref_value = headline(calc.KIES[ref]) if has_ref else 1.0
+    single = np.array([headline(calc.KIES[name]) for name in sites])
+    single_abs = single * ref_value if has_ref else single
+
+    first = calc.KIES[sites[0]]
+    gs_default, ts_default = first.gs_tuple[0], first.ts_tuple[0]
+    gs_sites = [np.asarray(calc.KIES[name].gs_tuple[1].masses, dtype=float) for name in sites]
+    ts_sites = [np.asarray(calc.KIES[name].ts_tuple[1].masses, dtype=float) for name in sites]
+    gs_reference = np.asarray(gs_default.masses, dtype=float)
+    ts_reference = np.asarray(ts_default.masses, dtype=float)
+    gs_changed = [set(np.flatnonzero(m != gs_reference)) for m in gs_sites]
+    ts_changed = [set(np.flatnonzero(m != ts_reference)) for m in ts_sites]
+    for i, j in itertools.combinations(range(len(sites)), 2):
+        if gs_changed[i] & gs_changed[j] or ts_changed[i] & ts_changed[j]:
+            raise ValueError("isotopologues %s and %s substitute the same atom"
+                             % (sites[i], sites[j]))
+
+    # prefactor of the second-order trace term, as in approximate_rpfr
+    conv_factor = PHYSICAL_CONSTANTS['Eh']/(PHYSICAL_CONSTANTS['a0']**2 * PHYSICAL_CONSTANTS['amu'])
+    c2 = conv_factor * (config.scaling * h / (2.0 * np.pi * kB * config.temperature))**2
+    coupling = (c2**2 / 1440.0 * _coupling(calc.gs_system, gs_reference, gs_sites)
+                - c2**2 / 1440.0 * _coupling(calc.ts_system, ts_reference, ts_sites))
+
+    rows, exact_pairs = [], []
+    for size in sizes:
+        for combo in itertools.combinations(range(len(sites)), size):
+            combo = list(combo)
+            estimate = float(np.prod(single_abs[combo])) / ref_value
+            block = coupling[np.ix_(combo, combo)]
+            deviation = float(np.expm1((block.sum() - np.trace(block)) / 2.0))
+            name = "+".join(sites[i] for i in combo)
+            rows.append([name, tuple(sites[i] for i in combo), estimate, deviation, None])
+            if size > 1 and abs(deviation) > tolerance:
+                gs_masses = gs_reference + sum(gs_sites[i] - gs_reference for i in combo)
+                ts_masses = ts_reference + sum(ts_sites[i] - ts_reference for i in combo)
+                gs_iso = quiver.Isotopologue(name, calc.gs_system, gs_masses, gs_default.active)
+                ts_iso = quiver.Isotopologue(name, calc.ts_system, ts_masses, ts_default.active)
+                exact_pairs.append((rows[-1], gs_iso, ts_iso))
+
+    engines.run(calc.engine, [iso for _, gs_iso, ts_iso in exact_pairs for iso in (gs_iso, ts_iso)],
+                config.imag_threshold, config.scaling)
+    for row, gs_iso, ts_iso in exact_pairs:
+        kie = KIE(row[0], (gs_default, gs_iso), (ts_default, ts_iso), config.temperature,
+                  config.scaling, config.imag_threshold)
+        row[4] = headline(kie) / ref_value
+    logger.info("%d of %d combinations computed exactly (tolerance %g).",
+                len(exact_pairs), len(rows), tolerance)
+
+    return [CombinationResult(name, combo, estimate, deviation, exact,
+                              estimate if exact is None else exact)
+            for name, combo, estimate, deviation, exact in rows]
@@ -1,6 +1,7 @@
 # This file reads PyQuiver configuration files.
+import copy
 import logging
-from .constants import REPLACEMENTS_Z, replacement_mass
+from .constants import REPLACEMENTS_Z, replacement_mass, elements
 from collections import OrderedDict
 
 logger = logging.getLogger("pyquiver")
@@ -21,6 +22,10 @@ class Config(object):
         # each tuple is (from_atom_number, to_atom_number, replacement_isotope)
         # this format allows for multiple replacements in one isotopologue
         isotopologues = OrderedDict()
+        # isotope labels to substitute at every atom of their element ("scan
+        # 13C"), and the gs -> ts atom correspondence those scans use
+        scans = []
+        atom_map = {}
         expected_fields = EXPECTED_FIELDS
 
         # read file
@@ -72,6 +77,16 @@ class Config(object):
                 except KeyError:
                     isotopologues[isotopologue_id] = [(from_atom_number, to_atom_number, replacement)]
 
+            elif fields[0] == "scan":
+                if len(fields) != 2:
+                    raise ValueError("unexpected number of fields for scan in config file:\n%s" % line)
+                scans.append(fields[1])
+
+            elif fields[0] == "atom_map":
+                if len(fields) != 3:
+                    raise ValueError("unexpected number of fields for atom_map in config file:\n%s" % line)
+                atom_map[int(fields[1])] = int(fields[2])
+
             elif len(fields) == 2:
                 # read regular configuration fields that have only one entry
                 fields = [ str(i) for i in fields ]
@@ -81,12 +96,13 @@ class Config(object):
             else:
                 raise ValueError("unexpected number of fields in config file:\n%s" % line)
 
-        self._finalize(config, isotopologues)
+        self._finalize(config, isotopologues, scans, atom_map)
 
     @classmethod
     def from_dict(cls, isotopologues, temperature, scaling, imag_threshold,
                   reference_isotopologue="none",
-                  mass_override_isotopologue="default", filename="<dict>"):
+                  mass_override_isotopologue="default", filename="<dict>",
+                  scan=(), atom_map=None):
         """Build a Config programmatically, without a .config file.
 
         ``isotopologues`` maps each isotopologue name to a list of
@@ -94,6 +110,10 @@ class Config(object):
         ``replacement`` is either a standard isotope label from weights.dat
         (e.g. ``"13C"``) or a number giving an unusual mass directly (e.g.
         ``5000.0``).
+
+        ``scan`` lists isotope labels to substitute, one at a time, at every
+        atom of their element (see :meth:`expand_scans`); ``atom_map`` maps
+        1-indexed gs atoms to ts atoms for the scan (default: same number).
         """
         self = cls.__new__(cls)
         config = {i: None for i in EXPECTED_FIELDS}
@@ -127,10 +147,13 @@ class Config(object):
                 normalized_rules.append((int(from_atom), int(to_atom), replacement))
             normalized[str(name)] = normalized_rules
 
-        self._finalize(config, normalized)
+        if isinstance(scan, str):
+            scan = [scan]
+        atom_map = {int(k): int(v) for k, v in (atom_map or {}).items()}
+        self._finalize(config, normalized, list(scan), atom_map)
         return self
 
-    def _finalize(self, config, isotopologues):
+    def _finalize(self, config, isotopologues, scans=(), atom_map=None):
         # ensure we have all the fields we are supposed to
         for k,v in config.items():
             if k == "frequency_threshold" and v is not None:
@@ -140,9 +163,21 @@ class Config(object):
                     config["frequency_threshold"] = 0.0
                 else:
                     raise ValueError("missing config file field: %s" % k)
-        if len(isotopologues) == 0:
+        if len(isotopologues) == 0 and len(scans) == 0:
             raise ValueError("must specify at least one isotopologue")
 
+        # a scan needs an element to enumerate, so only standard labels
+        scanned = set()
+        for label in scans:
+            if label not in REPLACEMENTS_Z:
+                raise ValueError("scan needs a standard isotope label, not %s" % label)
+            if REPLACEMENTS_Z[label] in scanned:
+                raise ValueError("only one scan per element is allowed: %s" % label)
+            scanned.add(REPLACEMENTS_Z[label])
+        atom_map = dict(atom_map or {})
+        if any(k < 1 or v < 1 for k, v in atom_map.items()):
+            raise ValueError("check atom numbers in atom_map")
+
         # check some of the other fields
         config["temperature"] = float(config["temperature"])
         if config["temperature"] < 0.0:
@@ -162,8 +197,40 @@ class Config(object):
 
         # store all the information in the object dictionary
         config["isotopologues"] = isotopologues
+        config["scans"] = list(scans)
+        config["atom_map"] = atom_map
         self.__dict__ = config
 
+    def expand_scans(self, gs):
+        """Return this Config with its scans turned into isotopologues.
+
+        Every ``scan`` label substitutes each atom of its element in the
+        ground state ``gs``, one isotopologue per atom, named by element and gs
+        atom number (``"C1"``, ``"H7"``, ...); the matching ts atom comes from
+        ``atom_map``, defaulting to the same number. Isotopologues listed
+        explicitly take precedence over scan sites of the same name. Returns
+        ``self`` if there is nothing to scan, otherwise a copy, so one Config
+        can be shared between systems.
+        """
+        if not self.scans:
+            return self
+        symbols = {e.atomic_number: e.symbol for e in elements}
+        isotopologues = OrderedDict(self.isotopologues)
+        for label in self.scans:
+            z = REPLACEMENTS_Z[label]
+            for i, atomic_number in enumerate(gs.atomic_numbers):
+                if atomic_number != z:
+                    continue
+                name = "%s%d" % (symbols[z], i + 1)
+                if name not in isotopologues:
+                    isotopologues[name] = [(i + 1, self.atom_map.get(i + 1, i + 1), label)]
+        logger.info("Scan of %s: %d isotopologues.", gs.filename,
+                    len(isotopologues) - len(self.isotopologues))
+        expanded = copy.copy(self)
+        expanded.isotopologues = isotopologues
+        expanded.scans = []
+        return expanded
+
     # checks if this config file is compatible with a pair of ground and transition state systems
     def check(self, gs, ts, verbose=False):
         # check that the isotopic replacements make sense
@@ -206,6 +273,9 @@ class Config(object):
         if self.frequency_threshold != 0:
             to_string += "Frequency threshold (cm-1): %d\n" % self.frequency_threshold
 
+        if self.scans:
+            to_string += "Scan: %s\n" % ", ".join(self.scans)
+
         keys = list(self.isotopologues.keys())
         if self.reference_isotopologue != "default" and self.reference_isotopologue != "none":
             try:
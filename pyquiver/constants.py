@@ -15,7 +15,8 @@ PHYSICAL_CONSTANTS = {
     'a0' : 5.291772E-11, # bohr radius in m
     'atb': 5.291772E-01, # angstroms per bohr
     'amu': 1.660468E-27, # atomic mass unit in units kg
-    'kB' : 1.380649E-23  # Boltzmann's constant in J/K
+    'kB' : 1.380649E-23, # Boltzmann's constant in J/K
+    'NA' : 6.022141E+23  # Avogadro's number in 1/mol
 }
     #CM/2.998E10/,EM/1.440E13/,HBC/1.4387/
 
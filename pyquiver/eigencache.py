@@ -0,0 +1,299 @@
+"""Caches of mass-weighted Hessian eigenvalues.
+
+The eigenvalues of an isotopologue depend only on its Hessian, its mass
+vector and (for a partial Hessian analysis) its active atoms; the scaling
+factor, imaginary-frequency threshold, temperature and reference are all
+applied afterwards. :meth:`Isotopologue.calculate_frequencies` and every
+engine in :mod:`pyquiver.engines` therefore look the eigenvalues up by a hash
+of those inputs before diagonalizing, and save what they compute, in two
+layers:
+
+* an in-process LRU cache (:class:`MemoryCache`), on by default and shared by
+  every isotopologue, so calculations on the same systems with different
+  configs, references or mass overrides reuse each other's work; its size is
+  bounded in bytes (:func:`configure_memory`, ``0`` turns it off);
+* an optional persistent store (:class:`EigenvalueStore`), a SQLite file, so
+  that a later session never diagonalizes the same isotopologue again::
+
+    from pyquiver import eigencache
+    store = eigencache.enable_store("eigenvalues.sqlite")
+    calc = KIE_Calculation(...)
+    calc.eigenvalue_cache          # {"hits": ..., "misses": ..., "memory_hits": ...}
+    store.hits, store.misses       # running totals of the store
+
+Both are safe to share between the threads of one process. The reaction mode
+(see :meth:`Isotopologue.reaction_mode_composition`) is kept in the store
+alongside the eigenvalues once it has been computed.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger("pyquiver")
+
+_SCHEMA = ("CREATE TABLE IF NOT EXISTS eigenvalues ("
+           "key TEXT PRIMARY KEY, eigenvalues BLOB NOT NULL, reaction_mode BLOB)")
+
+
+# default size of the in-process cache
+DEFAULT_MEMORY_BYTES = 64 * 1024**2
+
+
+def hessian_digest(system):
+    """SHA-256 (hex) of ``system.hessian``, computed once per Hessian and
+    remembered on the system until ``system.hessian`` is reassigned. (A
+    Hessian modified in place is not noticed: assign a new array instead.)"""
+    digest = getattr(system, "_hessian_digest", None)
+    if digest is None:
+        # hash the array's own buffer rather than a bytes copy of it
+        hessian = np.ascontiguousarray(system.hessian, dtype="<f8")
+        digest = hashlib.sha256(("%d,%d;" % hessian.shape).encode())
+        digest.update(hessian)
+        digest = digest.hexdigest()
+        system._hessian_digest = digest
+    return digest
+
+
+def isotopologue_key(iso):
+    """The cache key of an isotopologue: SHA-256 of its system's Hessian, its
+    mass vector and its active atoms."""
+    digest = hashlib.sha256(hessian_digest(iso.system).encode())
+    digest.update(np.ascontiguousarray(iso.masses, dtype="<f8").tobytes())
+    if iso.active is not None:
+        digest.update(b"active")
+        digest.update(np.ascontiguousarray(iso.active, dtype="<i8").tobytes())
+    return digest.hexdigest()
+
+
+def _blob(array):
+    return sqlite3.Binary(np.ascontiguousarray(array, dtype="<f8").tobytes())
+
+
+class EigenvalueStore(object):
+    """Eigenvalues (SI units, unscaled) and optional reaction modes in a
+    SQLite database at ``path`` (``":memory:"`` for a throwaway store)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(_SCHEMA)
+
+    def get(self, key):
+        """The stored eigenvalues for ``key``, or None; counts a hit or miss."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT eigenvalues FROM eigenvalues WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return np.frombuffer(row[0], dtype="<f8").astype(np.float64)
+
+    def put(self, key, eigenvalues):
+        """Store ``eigenvalues`` under ``key`` (keeping any reaction mode)."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO eigenvalues (key, eigenvalues) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET eigenvalues = excluded.eigenvalues",
+                (key, _blob(eigenvalues)))
+
+    def get_reaction_mode(self, key):
+        """The stored reaction-mode composition for ``key``, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT reaction_mode FROM eigenvalues WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return np.frombuffer(row[0], dtype="<f8").astype(np.float64)
+
+    def put_reaction_mode(self, key, composition):
+        """Attach a reaction-mode composition to the entry for ``key`` (a no-op
+        if its eigenvalues are not stored)."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE eigenvalues SET reaction_mode = ? WHERE key = ?",
+                (_blob(composition), key))
+
+    def stats(self):
+        """``{"hits": ..., "misses": ..., "entries": ...}``."""
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM eigenvalues").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class MemoryCache(object):
+    """A thread-safe LRU map from isotopologue keys to eigenvalue arrays,
+    holding at most ``max_bytes`` of eigenvalues (0 disables it). Cached
+    arrays are read-only, since isotopologues share them."""
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The cached eigenvalues for ``key`` (now most recently used), or
+        None; counts a hit or miss."""
+        with self._lock:
+            v = self._entries.get(key)
+            if v is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return v
+
+    def put(self, key, eigenvalues):
+        """Cache ``eigenvalues`` under ``key``, evicting the least recently
+        used entries beyond ``max_bytes``. Returns the cached (read-only)
+        array."""
+        v = np.array(eigenvalues, dtype=np.float64)
+        v.setflags(write=False)
+        if v.nbytes > self.max_bytes:
+            return v
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = v
+            self.nbytes += v.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return v
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = self.hits = self.misses = 0
+
+    def stats(self):
+        """``{"hits": ..., "misses": ..., "entries": ..., "bytes": ...}``."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "bytes": self.nbytes}
+
+
+# its keys trust that a Hessian is replaced rather than modified in place
+# (see hessian_digest); configure_memory(0) opts out
+_memory = MemoryCache()
+
+
+def memory_cache():
+    """The process-wide :class:`MemoryCache`."""
+    return _memory
+
+
+def configure_memory(max_bytes):
+    """Resize the process-wide cache (``0`` disables it), evicting the least
+    recently used entries if it shrinks."""
+    if max_bytes < 0:
+        raise ValueError("max_bytes must not be negative")
+    with _memory._lock:
+        _memory.max_bytes = int(max_bytes)
+        while _memory.nbytes > _memory.max_bytes:
+            _, evicted = _memory._entries.popitem(last=False)
+            _memory.nbytes -= evicted.nbytes
+
+
+_active = None
+
+
+def enable_store(path):
+    """Consult and fill the eigenvalue store at ``path`` from now on. Returns
+    the :class:`EigenvalueStore`."""
+    global _active
+    disable_store()
+    _active = EigenvalueStore(path)
+    return _active
+
+
+def disable_store():
+    """Stop using the eigenvalue store (the database is kept)."""
+    global _active
+    if _active is not None:
+        _active.close()
+    _active = None
+
+
+def active_store():
+    """The enabled :class:`EigenvalueStore`, or None."""
+    return _active
+
+
+# lookups since the process started, by outcome (see counters)
+_counters = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+_counter_lock = threading.Lock()
+
+
+def counters():
+    """Running totals of :func:`lookup` outcomes: ``{"memory_hits": ...,
+    "store_hits": ..., "misses": ...}``."""
+    with _counter_lock:
+        return dict(_counters)
+
+
+def _count(iso, outcome):
+    # a lookup outcome, in the running totals and on the isotopologue itself
+    # (so that a calculation counts its own lookups, not its neighbours')
+    iso.cache_lookup = outcome
+    with _counter_lock:
+        _counters[outcome] += 1
+
+
+def lookup(iso):
+    """Set ``iso.eigenvalues`` from the in-process cache or, failing that,
+    the active store (which then fills the in-process cache); True on a hit.
+    The outcome (``"memory_hits"``, ``"store_hits"`` or ``"misses"``) is
+    recorded in ``iso.cache_lookup``."""
+    use_memory = _memory.max_bytes > 0
+    store = _active
+    if not use_memory and store is None:
+        return False   # nothing to look in: not counted
+    key = isotopologue_key(iso)
+    v = _memory.get(key) if use_memory else None
+    if v is not None:
+        _count(iso, "memory_hits")
+    elif store is not None:
+        v = store.get(key)
+        if v is not None:
+            _count(iso, "store_hits")
+            if use_memory:
+                v = _memory.put(key, v)
+    if v is None:
+        _count(iso, "misses")
+        return False
+    iso.eigenvalues = v
+    return True
+
+
+def save(iso):
+    """Save ``iso.eigenvalues`` to the in-process cache and the active store."""
+    store = _active
+    if iso.eigenvalues is None or (_memory.max_bytes <= 0 and store is None):
+        return
+    key = isotopologue_key(iso)
+    if _memory.max_bytes > 0:
+        iso.eigenvalues = _memory.put(key, iso.eigenvalues)
+    if store is not None:
+        store.put(key, iso.eigenvalues)
@@ -0,0 +1,99 @@
+"""Frequency engines: alternative ways to diagonalize many isotopologues.
+
+By default every :class:`~pyquiver.quiver.Isotopologue` runs its own
+``np.linalg.eigvalsh`` when its frequencies are first requested. An engine
+computes the frequencies of a whole collection of isotopologues up front and
+stores them on each object, so the per-isotopologue ``calculate_frequencies``
+calls that follow are cache hits. Engines are looked up by name through
+``_ENGINES``; ``KIE_Calculation(..., engine=...)`` selects one.
+
+* ``"eigvalsh"`` (default) - no up-front work; one diagonalization per
+  isotopologue, optionally spread over ``n_jobs`` threads.
+* ``"batched"`` - stack the mass-weighted Hessians of all isotopologues of one
+  system into a ``(k, 3N, 3N)`` array and diagonalize them with a single
+  stacked LAPACK call, in chunks that stay under a memory budget.
+"""
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from . import eigencache
+from .constants import PHYSICAL_CONSTANTS
+
+logger = logging.getLogger("pyquiver")
+
+# upper bound on the size of one stacked (k, 3N, 3N) float64 array
+DEFAULT_BATCH_BYTES = 256 * 1024**2
+
+
+def _pending_by_system(isotopologues):
+    # isotopologues without stored eigenvalues, grouped by the System and
+    # active atom set they share (only those Hessians have the same shape and
+    # the same reference); duplicates are dropped so each object is diagonalized once
+    groups = OrderedDict()
+    seen = set()
+    for iso in isotopologues:
+        if iso.eigenvalues is not None or id(iso) in seen:
+            continue
+        seen.add(id(iso))
+        active = None if iso.active is None else iso.active.tobytes()
+        groups.setdefault((id(iso.system), active), []).append(iso)
+    return list(groups.values())
+
+
+def batched(isotopologues, imag_threshold, scaling=1.0,
+            max_bytes=DEFAULT_BATCH_BYTES):
+    """Compute frequencies for ``isotopologues`` with stacked diagonalizations.
+
+    Isotopologues of the same system are diagonalized together, in chunks of
+    at most ``max_bytes`` (always at least one Hessian per chunk). The results
+    are identical to calling ``calculate_frequencies`` on each one.
+    """
+    conv_factor = PHYSICAL_CONSTANTS['Eh']/(PHYSICAL_CONSTANTS['a0']**2 * PHYSICAL_CONSTANTS['amu'])
+    for group in _pending_by_system(isotopologues):
+        n = len(group[0].coordinates())
+        chunk = max(1, int(max_bytes // (n * n * 8)))
+        for start in range(0, len(group), chunk):
+            members = group[start:start + chunk]
+            stack = np.empty((len(members), n, n))
+            for i, iso in enumerate(members):
+                iso.calculate_mw_hessian(out=stack[i])
+            logger.debug("Diagonalizing %d isotopologues of %s in one batch.",
+                         len(members), getattr(members[0].system, "filename", "system"))
+            eigenvalues = np.linalg.eigvalsh(stack) * conv_factor
+            del stack
+            for iso, v in zip(members, eigenvalues):
+                iso.set_eigenvalues(v, imag_threshold, scaling)
+
+
+# engine name -> callable(isotopologues, imag_threshold, scaling); None means
+# "nothing up front", i.e. each isotopologue diagonalizes itself on demand
+_ENGINES = {
+    "eigvalsh": None,
+    "batched": batched,
+}
+
+
+def supported_engines():
+    """Return the sorted list of accepted engine names."""
+    return sorted(_ENGINES)
+
+
+def run(engine, isotopologues, imag_threshold, scaling=1.0):
+    """Precompute frequencies for ``isotopologues`` with the named engine."""
+    if engine not in _ENGINES:
+        raise ValueError("specified engine, {0}, not supported (choose from {1})"
+                         .format(engine, ", ".join(supported_engines())))
+    fn = _ENGINES[engine]
+    if fn is None:
+        return
+    # eigenvalues found in the eigenvalue store (if enabled) are not
+    # recomputed; whatever the engine computes is saved to it
+    distinct = list(OrderedDict((id(iso), iso) for iso in isotopologues).values())
+    missing = [iso for iso in distinct
+               if iso.eigenvalues is None and not eigencache.lookup(iso)]
+    fn(missing, imag_threshold, scaling)
+    for iso in missing:
+        eigencache.save(iso)
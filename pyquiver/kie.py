@@ -2,9 +2,12 @@
 import logging
 import numpy as np
 from . import quiver
+from . import engines
+from . import symmetry
+from . import threads
 from .config import Config
 from .constants import DEFAULT_MASSES
-from .results import Results, KIEResult, EIEResult
+from .results import Results, KIEResult, EIEResult, ScreenResult
 from collections import OrderedDict
 
 # load constants
@@ -21,35 +24,73 @@ kB = PHYSICAL_CONSTANTS["kB"] # in J/K
 PRIMARY_HYDROGEN_MODE_FRACTION = 0.1
 
 class KIE_Calculation(object):
-    def __init__(self, config, gs, ts, style="gaussian", n_jobs=1):
+    def __init__(self, config, gs, ts, style="gaussian", n_jobs=1, engine="eigvalsh",
+                 active_atoms=None, track_memory=False, symmetry=False,
+                 blas_threads="auto"):
         # n_jobs controls optional parallelism over isotopologues (default
         # serial). The heavy step is np.linalg.eigvalsh, which releases the
         # GIL, so threads give real speedup for large systems / many
         # isotopologues. n_jobs < 0 lets the pool pick a default worker count.
         self.n_jobs = n_jobs
-
-        # accept either file paths (str) or already-built objects
-        if isinstance(config, str):
-            self.config = Config(config)
-        elif isinstance(config, Config):
-            self.config = config
-        else:
-            raise TypeError("config argument must be either a filepath or Config object.")
-
-        if isinstance(gs, str):
-            self.gs_system = quiver.System(gs, style=style)
-        elif isinstance(gs, quiver.System):
-            self.gs_system = gs
-        else:
-            raise TypeError("gs argument must be either a filepath or quiver.System object.")
-
-        if isinstance(ts, str):
-            self.ts_system = quiver.System(ts, style=style)
-        elif isinstance(ts, quiver.System):
-            self.ts_system = ts
-        else:
-            raise TypeError("ts argument must be either a filepath or quiver.System object.")
-
+        # engine selects how frequencies are computed (see pyquiver.engines);
+        # "batched" diagonalizes all isotopologues of a system in one stacked
+        # LAPACK call, after which n_jobs has nothing left to parallelize
+        self.engine = engine
+        # active_atoms turns on a partial Hessian vibrational analysis (PHVA):
+        # "auto" (drop frozen atoms), a radius in angstroms around the
+        # substituted atoms, a list of 1-indexed atom numbers for both
+        # structures, or a (gs_atoms, ts_atoms) pair of lists
+        self.active_atoms = active_atoms
+        # with symmetry, isotopologues that are equivalent under a symmetry
+        # operation of both structures (see pyquiver.symmetry) share one
+        # diagonalization
+        self.symmetry = symmetry
+        # blas_threads caps the threads of the BLAS library under eigvalsh
+        # while this calculation runs, so that n_jobs threads each running a
+        # multithreaded diagonalization don't oversubscribe the cores: "auto"
+        # (cores // n_jobs when n_jobs != 1), a number, or None to leave BLAS
+        # alone (see pyquiver.threads)
+        self.blas_threads = threads.blas_threads_for(n_jobs, blas_threads)
+        # with track_memory, the peak memory allocated while computing the
+        # frequencies and KIEs (not while parsing) is recorded in bytes, via
+        # tracemalloc; it scales with the Hessians being diagonalized at once,
+        # not with the number of isotopologues
+        self.peak_memory = None
+        # eigenvalues found in the in-process cache or the persistent store
+        # (see pyquiver.eigencache) and those that had to be computed
+        self.eigenvalue_cache = None
+
+        self._load(config, gs, ts, style)
+        with threads.limit_blas_threads(self.blas_threads):
+            try:
+                self._calculate(track_memory)
+            finally:
+                # a 3N x 3N buffer is not worth keeping past the calculation
+                quiver.release_workspaces()
+
+    def _calculate(self, track_memory):
+        # _compute, under tracemalloc if track_memory; tracing started here is
+        # stopped even if the calculation raises
+        if not track_memory:
+            self._compute()
+            return
+        import tracemalloc
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            self._compute()
+            self.peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        logger.info("Peak memory for the frequency and KIE calculation: %.1f MB",
+                    self.peak_memory / 1024.0**2)
+
+    def _compute(self):
+        # frequencies and KIEs of every isotopologue (the body of __init__)
         # set the eie_flag to the recognized uninitialized value (used for checking if there are inconsistent calculation types)
         self.eie_flag = -1
 
@@ -61,6 +102,14 @@ class KIE_Calculation(object):
             logger.warning("config file uses the frequency_threshold parameter. This has been deprecated and low frequencies are dropped by linearity detection.")
 
         iso_pairs = list(self.make_isotopologues())
+        representatives = self.find_representatives(iso_pairs)
+        unique = [pair for i, pair in enumerate(iso_pairs) if representatives[i] == i]
+
+        # engines other than the default compute every isotopologue's
+        # frequencies here, so building the KIEs below only hits the caches
+        engines.run(self.engine,
+                    [iso for pair in unique for tup in pair for iso in tup],
+                    self.config.imag_threshold, self.config.scaling)
 
         # pre-compute the reference ("default") isotopologue's frequencies once,
         # serially: every pair shares those objects, so warming the cache here
@@ -79,15 +128,27 @@ class KIE_Calculation(object):
             return name, KIE(name, gs_tuple, ts_tuple, self.config.temperature,
                              self.config.scaling, self.config.imag_threshold)
 
-        if self.n_jobs == 1 or len(iso_pairs) <= 1:
-            built = [_build(p) for p in iso_pairs]
+        if self.n_jobs == 1 or len(unique) <= 1:
+            built = [_build(p) for p in unique]
         else:
             from concurrent.futures import ThreadPoolExecutor
             max_workers = self.n_jobs if self.n_jobs > 0 else None
             with ThreadPoolExecutor(max_workers=max_workers) as pool:
-                built = list(pool.map(_build, iso_pairs))  # preserves order
-
-        for name, kie in built:
+                built = list(pool.map(_build, unique))  # preserves order
+
+        # the remaining isotopologues take their representative's eigenvalues
+        built = iter(built)
+        ordered = []
+        for i, pair in enumerate(iso_pairs):
+            if representatives[i] == i:
+                ordered.append(next(built))
+                continue
+            for tup, rep_tup in zip(pair, iso_pairs[representatives[i]]):
+                tup[1].set_eigenvalues(rep_tup[1].eigenvalues, self.config.imag_threshold,
+                                       self.config.scaling)
+            ordered.append(_build(pair))
+
+        for name, kie in ordered:
             KIES[name] = kie
             self._warn_if_primary_hydrogen(name, kie)
 
@@ -111,6 +172,102 @@ class KIE_Calculation(object):
 
         self.KIES = KIES
 
+        # counted on this calculation's own isotopologues, not from the
+        # process-wide totals, which calculations in other threads also move
+        counters = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+        distinct = {id(iso): iso for pair in iso_pairs for tup in pair for iso in tup}
+        for iso in distinct.values():
+            if iso.cache_lookup is not None:
+                counters[iso.cache_lookup] += 1
+        self.eigenvalue_cache = {"hits": counters["memory_hits"] + counters["store_hits"],
+                                 "misses": counters["misses"],
+                                 "memory_hits": counters["memory_hits"]}
+        logger.info("Eigenvalue caches: %d hits (%d in memory), %d misses.",
+                    self.eigenvalue_cache["hits"], counters["memory_hits"], counters["misses"])
+
+    def _load(self, config, gs, ts, style):
+        # accept either file paths (str) or already-built objects
+        if isinstance(config, str):
+            self.config = Config(config)
+        elif isinstance(config, Config):
+            self.config = config
+        else:
+            raise TypeError("config argument must be either a filepath or Config object.")
+
+        if isinstance(gs, str):
+            self.gs_system = quiver.System(gs, style=style)
+        elif isinstance(gs, quiver.System):
+            self.gs_system = gs
+        else:
+            raise TypeError("gs argument must be either a filepath or quiver.System object.")
+
+        if isinstance(ts, str):
+            self.ts_system = quiver.System(ts, style=style)
+        elif isinstance(ts, quiver.System):
+            self.ts_system = ts
+        else:
+            raise TypeError("ts argument must be either a filepath or quiver.System object.")
+
+        # scan lines in the config become one isotopologue per site
+        self.config = self.config.expand_scans(self.gs_system)
+
+    @classmethod
+    def screen(cls, config, gs, ts, style="gaussian", order=1, validate=False):
+        """Approximate KIEs/EIEs for every isotopologue without diagonalizing.
+
+        Uses the Bigeleisen-Mayer expansion of each reduced partition function
+        ratio in traces of the mass-weighted Hessian (see
+        :func:`approximate_rpfr`), which only involve the substituted atoms'
+        rows, so each isotopologue costs O(N) instead of an O(N^3)
+        diagonalization. ``order`` is 1 (trace of the Hessian) or 2 (adds the
+        trace of its square). The estimate is ``rpfr_gs / rpfr_ts``: the
+        imaginary-frequency ratio and tunnelling corrections of a KIE need the
+        reaction mode and are not included, and the expansion converges only
+        for modes with hv/kT < 2 pi, so it is a screen for which positions
+        carry a sizeable heavy-atom effect rather than a final number.
+
+        With ``validate=True`` the exact ``calculate_rpfr`` ratio is also
+        computed for each isotopologue and reported with the relative error of
+        the estimate. Values are referenced to the reference isotopologue as
+        in the full calculation. Returns a list of
+        :class:`~pyquiver.results.ScreenResult`.
+        """
+        self = cls.__new__(cls)
+        self._load(config, gs, ts, style)
+        config = self.config
+        config.check(self.gs_system, self.ts_system)
+
+        rows = OrderedDict()
+        for id_, gs_masses, ts_masses in self.make_mass_vectors():
+            rpfr_gs = approximate_rpfr(self.gs_system, gs_masses[0], gs_masses[1],
+                                       config.temperature, config.scaling, order)
+            rpfr_ts = approximate_rpfr(self.ts_system, ts_masses[0], ts_masses[1],
+                                       config.temperature, config.scaling, order)
+            exact = None
+            if validate:
+                gs_tuple = (quiver.Isotopologue("default", self.gs_system, gs_masses[0]),
+                            quiver.Isotopologue(id_, self.gs_system, gs_masses[1]))
+                ts_tuple = (quiver.Isotopologue("default", self.ts_system, ts_masses[0]),
+                            quiver.Isotopologue(id_, self.ts_system, ts_masses[1]))
+                exact_gs = calculate_rpfr(gs_tuple, config.imag_threshold,
+                                          config.scaling, config.temperature)[0]
+                exact_ts = calculate_rpfr(ts_tuple, config.imag_threshold,
+                                          config.scaling, config.temperature)[0]
+                exact = float(exact_gs / exact_ts)
+            rows[id_] = [rpfr_gs, rpfr_ts, rpfr_gs / rpfr_ts, exact]
+
+        ref = config.reference_isotopologue
+        results = []
+        for id_, (rpfr_gs, rpfr_ts, value, exact) in rows.items():
+            if ref in rows and id_ != ref:
+                value /= rows[ref][2]
+                if exact is not None:
+                    exact /= rows[ref][3]
+            error = None if exact is None else value / exact - 1.0
+            results.append(ScreenResult(id_, float(rpfr_gs), float(rpfr_ts),
+                                        float(value), exact, error))
+        return results
+
     # retrieves KIEs for autoquiver output
     # if report_tunnelling = True, the first number will be the infinite parabola KIE
     # and the second number will be the tunnelling correction
@@ -174,16 +331,7 @@ class KIE_Calculation(object):
         """
         from .tunneling import skodje_truhlar as _st_ratio
 
-        if self.eie_flag != 0:
-            raise ValueError("Skodje-Truhlar correction applies to KIE (not "
-                             "EIE) calculations")
-        if unit == "hartree":
-            scale = PHYSICAL_CONSTANTS["Eh"]
-        elif unit in ("J", "joule", "joules"):
-            scale = 1.0
-        else:
-            raise ValueError("unit must be 'hartree' or 'J'")
-        barrier = (ts_energy - max(reactant_energy, product_energy)) * scale
+        barrier = self._barrier(reactant_energy, product_energy, ts_energy, unit)
 
         def _imag(kie):
             light = kie.ts_tuple[0].calculate_frequencies(
@@ -210,6 +358,76 @@ class KIE_Calculation(object):
                 corrected[name] = float(kie.value[0]) * ratio / ref_ratio
         return corrected
 
+    def _barrier(self, reactant_energy, product_energy, ts_energy, unit):
+        # the Skodje-Truhlar barrier height in joules
+        if self.eie_flag != 0:
+            raise ValueError("Skodje-Truhlar correction applies to KIE (not "
+                             "EIE) calculations")
+        if unit == "hartree":
+            scale = PHYSICAL_CONSTANTS["Eh"]
+        elif unit in ("J", "joule", "joules"):
+            scale = 1.0
+        else:
+            raise ValueError("unit must be 'hartree' or 'J'")
+        return (ts_energy - max(reactant_energy, product_energy)) * scale
+
+    def sweep(self, temperatures, energies=None, unit="hartree"):
+        """Re-evaluate the KIEs/EIEs at many temperatures from the frequencies
+        already computed, without re-parsing or re-diagonalizing anything.
+
+        The reduced partition function ratios and tunnelling corrections are
+        evaluated as arrays over every temperature, isotopologue and mode at
+        once (see :mod:`pyquiver.sweep`). Pass ``energies=(reactant, ts,
+        product)`` single-point energies (hartree by default, or ``unit='J'``)
+        to add a Skodje-Truhlar column. Values are referenced exactly as in
+        the fixed-temperature table. Returns
+        :class:`~pyquiver.sweep.SweepResults`, whose ``arrhenius()`` fits
+        ln KIE against 1/T for each isotopologue.
+        """
+        from .sweep import sweep_calculation
+
+        barrier = None
+        if energies is not None:
+            reactant, ts_energy, product = energies
+            barrier = self._barrier(reactant, product, ts_energy, unit)
+        return sweep_calculation(self, temperatures, barrier)
+
+    def sweep_scaling(self, scalings, temperatures=None, energies=None, unit="hartree"):
+        """Re-evaluate the KIEs/EIEs for many frequency scaling factors (and,
+        optionally, many temperatures; by default the configured one).
+
+        A scaling factor only multiplies the frequencies, so every combination
+        reuses the eigenvalues the calculation already holds. Returns
+        :class:`~pyquiver.sweep.SweepResults` with a leading ``scaling``
+        column; ``energies`` and ``unit`` are as in :meth:`sweep`.
+        """
+        from .sweep import sweep_scaling
+
+        if temperatures is None:
+            temperatures = [self.config.temperature]
+        barrier = None
+        if energies is not None:
+            reactant, ts_energy, product = energies
+            barrier = self._barrier(reactant, product, ts_energy, unit)
+        return sweep_scaling(self, scalings, temperatures, barrier)
+
+    def combinations(self, sites=None, k=2, tolerance=1e-3):
+        """Isotope effects of every ``k``-label combination of ``sites``.
+
+        ``sites`` are isotopologue names of this calculation (default: all
+        but the reference) and ``k`` is a combination size or a sequence of
+        sizes. Each combination is estimated from the single-site results with
+        the rule of the geometric mean; its predicted relative deviation from
+        that rule comes from the Hessian coupling of the substituted atoms (see
+        :mod:`pyquiver.combinations`), and only combinations predicted to
+        deviate by more than ``tolerance`` are diagonalized, with this
+        calculation's engine. Values are the infinite-parabola KIE (or the
+        EIE), referenced as in the table. Returns a list of
+        :class:`~pyquiver.results.CombinationResult`.
+        """
+        from .combinations import combination_results
+        return combination_results(self, sites, k, tolerance)
+
     def _warn_if_primary_hydrogen(self, name, kie):
         """Warn when an isotopologue is a primary hydrogen KIE, where the
         harmonic tunnelling corrections are unreliable. Treated as primary
@@ -272,6 +490,67 @@ class KIE_Calculation(object):
             ts_rules[ts_atom_number-1] = mass
         return gs_rules, ts_rules
 
+    # index of the isotopologue pair whose eigenvalues each pair can reuse:
+    # itself, unless symmetry is on and an earlier pair is equivalent to it
+    def find_representatives(self, iso_pairs):
+        if not self.symmetry:
+            return list(range(len(iso_pairs)))
+        representatives = symmetry.deduplicate(
+            iso_pairs, symmetry.symmetry_operations(self.gs_system),
+            symmetry.symmetry_operations(self.ts_system))
+        logger.info("%d of %d isotopologues are symmetry-equivalent to another.",
+                    sum(r != i for i, r in enumerate(representatives)), len(iso_pairs))
+        return representatives
+
+    # resolves the active_atoms option to 0-based (gs, ts) index arrays (or
+    # None for a full analysis of that structure)
+    def select_active_atoms(self):
+        selection = self.active_atoms
+        gs_sub, ts_sub = set(), set()
+        for iso in self.config.isotopologues.values():
+            for from_atom, to_atom, _ in iso:
+                gs_sub.add(from_atom - 1)
+                ts_sub.add(to_atom - 1)
+
+        if (isinstance(selection, (tuple, list)) and len(selection) == 2
+                and not np.isscalar(selection[0])):
+            gs_selection, ts_selection = selection
+        else:
+            gs_selection = ts_selection = selection
+        return (quiver.select_active_atoms(self.gs_system, gs_selection, gs_sub),
+                quiver.select_active_atoms(self.ts_system, ts_selection, ts_sub))
+
+    # mass vectors for the requested isotopic substitutions
+    # yields tuples of the form (id_, (gs_ref, gs_sub), (ts_ref, ts_sub))
+    # all substituted mass vectors are built at once as rows of one 2D array
+    # per structure, so thousands of scan sites cost a single array fill
+    def make_mass_vectors(self):
+        config = self.config
+        mass_override_gs_masses, mass_override_ts_masses = self.build_mass_override_masses()
+
+        ids = [id_ for id_ in config.isotopologues if id_ != config.mass_override_isotopologue]
+        # (row, atom, mass) triples for each structure; compile_mass_rules
+        # keeps the last replacement of an atom, so there are no duplicates
+        gs_triples, ts_triples = [], []
+        for row, id_ in enumerate(ids):
+            gs_rules, ts_rules = self.compile_mass_rules(config.isotopologues[id_])
+            gs_triples.extend((row, atom, mass) for atom, mass in gs_rules.items())
+            ts_triples.extend((row, atom, mass) for atom, mass in ts_rules.items())
+
+        def _fill(reference, triples):
+            masses = np.tile(np.asarray(reference, dtype=float), (len(ids), 1))
+            if triples:
+                rows, atoms, values = zip(*triples)
+                masses[list(rows), list(atoms)] = values
+            return masses
+
+        gs_masses = _fill(mass_override_gs_masses, gs_triples)
+        ts_masses = _fill(mass_override_ts_masses, ts_triples)
+
+        for row, id_ in enumerate(ids):
+            yield (id_, (mass_override_gs_masses, gs_masses[row]),
+                   (mass_override_ts_masses, ts_masses[row]))
+
     # make the requested isotopic substitutions
     # yields tuples of tuples of the form ((gs_sub, gs_ref), (ts_sub, ts_ref))
     def make_isotopologues(self):
@@ -280,20 +559,17 @@ class KIE_Calculation(object):
         ts_system = self.ts_system
         config.check(gs_system, ts_system)
 
-        mass_override_gs_masses, mass_override_ts_masses = self.build_mass_override_masses()
+        gs_active, ts_active = self.select_active_atoms()
+
+        default_gs = default_ts = None
+        for id_, gs_masses, ts_masses in self.make_mass_vectors():
+            if default_gs is None:
+                default_gs = quiver.Isotopologue("default", gs_system, gs_masses[0], gs_active)
+                default_ts = quiver.Isotopologue("default", ts_system, ts_masses[0], ts_active)
+            sub_gs = quiver.Isotopologue(id_, gs_system, gs_masses[1], gs_active)
+            sub_ts = quiver.Isotopologue(id_, ts_system, ts_masses[1], ts_active)
+            yield ((default_gs, sub_gs), (default_ts, sub_ts))
 
-        default_gs = quiver.Isotopologue("default", gs_system, mass_override_gs_masses)
-        default_ts = quiver.Isotopologue("default", ts_system, mass_override_ts_masses)
-
-        for id_,iso in config.isotopologues.items():
-            if id_ != config.mass_override_isotopologue:
-                gs_rules, ts_rules = self.compile_mass_rules(iso)
-                gs_masses = self.apply_mass_rules(mass_override_gs_masses, gs_rules)
-                ts_masses = self.apply_mass_rules(mass_override_ts_masses, ts_rules)
-                sub_gs = quiver.Isotopologue(id_, gs_system, gs_masses)
-                sub_ts = quiver.Isotopologue(id_, ts_system, ts_masses)
-                yield ((default_gs, sub_gs), (default_ts, sub_ts))
-               
     def __str__(self):
         string = "\n=== PyQuiver Analysis ===\n"
         if self.eie_flag == 0:
@@ -457,6 +733,40 @@ def calculate_rpfr(tup, imag_threshold, scaling, temperature):
 
     return (np.prod(partition_factors), imag_ratios, np.array(heavy_freqs), np.array(light_freqs))
 
+# approximates the reduced isotopic partition function ratio without
+# diagonalizing, from the Bigeleisen-Mayer expansion
+#   ln RPFR = sum_i [g(u_light,i) - g(u_heavy,i)],  g(u) = ln(sinh(u/2)/(u/2))
+#           = sum_i (u_L^2 - u_H^2)/24 - (u_L^4 - u_H^4)/2880 + ...
+# where sum_i u^(2k) = (h/(2 pi kB T))^(2k) tr(A^k) for the mass-weighted
+# Hessian A. Only the substituted atoms' rows of A change, so the differences of
+# the traces are O(N) to evaluate. The traces run over all 3N modes (including
+# any imaginary mode, which the exact calculate_rpfr drops).
+def approximate_rpfr(system, light_masses, heavy_masses, temperature, scaling=1.0, order=1):
+    if order not in (1, 2):
+        raise ValueError("order must be 1 or 2")
+    conv_factor = PHYSICAL_CONSTANTS['Eh']/(PHYSICAL_CONSTANTS['a0']**2 * PHYSICAL_CONSTANTS['amu'])
+    c2 = conv_factor * (scaling * h / (2.0 * np.pi * kB * temperature))**2
+
+    inv_light = 1.0 / np.repeat(np.asarray(light_masses, dtype=float), 3)
+    inv_heavy = 1.0 / np.repeat(np.asarray(heavy_masses, dtype=float), 3)
+    delta = inv_light - inv_heavy
+    changed = np.flatnonzero(delta)
+    if len(changed) == 0:
+        return 1.0
+
+    hessian = system.hessian
+    rows = hessian[changed, :]
+    d = delta[changed]
+    # tr(A_L) - tr(A_H) = sum_p H_pp (1/m_p - 1/m'_p)
+    log_rpfr = c2 / 24.0 * np.dot(np.diag(hessian)[changed], d)
+    if order >= 2:
+        # tr(A_L^2) - tr(A_H^2) = sum_pq H_pq^2 (a_p a_q - a'_p a'_q), a = 1/m,
+        # written with delta = a - a' so only the changed rows are needed
+        dtr2 = (2.0 * np.dot(d, (rows * rows) @ inv_light)
+                - d @ (rows[:, changed] ** 2) @ d)
+        log_rpfr -= c2**2 / 2880.0 * dtr2
+    return float(np.exp(log_rpfr))
+
 # calculates the Wigner tunnelling correction
 # multiplies the KIE by a factor of (1+u_H^2/24)/(1+u_D^2/24)
 # assumes the frequencies are sorted in ascending order
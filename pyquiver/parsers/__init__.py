@@ -4,17 +4,32 @@ Each parser exposes ``parse(path) -> ParsedSystem``. Styles are looked up
 through ``_ALIASES`` so that, e.g., ``gaussian``, ``g16`` and ``g09`` all map
 to the Gaussian parser. ``gaussian`` is the preferred name; ``g09`` is kept as
 an alias for backward compatibility.
+
+:func:`enable_cache` turns on an on-disk cache of parsed systems (see
+:mod:`pyquiver.parsers.cache`), which :func:`parse` then consults.
 """
 
-from . import gaussian, orca, native
+from . import gaussian, fchk, orca, native, binary
 from ._common import ParsedSystem
+from .cache import ParseCache, enable_cache, disable_cache, active_cache
 
-__all__ = ["ParsedSystem", "parse", "supported_styles"]
+__all__ = ["ParsedSystem", "parse", "count_atoms", "supported_styles", "ParseCache",
+           "enable_cache", "disable_cache", "active_cache"]
 
 _PARSERS = {
     "gaussian": gaussian.parse,
+    "fchk": fchk.parse,
     "orca": orca.parse,
     "native": native.parse,
+    "binary": binary.parse,
+}
+
+_COUNTERS = {
+    "gaussian": gaussian.count_atoms,
+    "fchk": fchk.count_atoms,
+    "orca": orca.count_atoms,
+    "native": native.count_atoms,
+    "binary": binary.count_atoms,
 }
 
 # user-facing style name -> canonical parser key
@@ -22,10 +37,13 @@ _ALIASES = {
     "gaussian": "gaussian",
     "g16": "gaussian",
     "g09": "gaussian",      # deprecated spelling, still accepted
+    "fchk": "fchk",         # Gaussian formatted checkpoint
     "orca": "orca",
     "native": "native",
     "pyquiver": "native",   # the .qin format
     "qin": "native",
+    "binary": "binary",     # the binary .qinb format (native version 2)
+    "qinb": "binary",
 }
 
 
@@ -34,10 +52,24 @@ def supported_styles():
     return sorted(_ALIASES)
 
 
-def parse(path, style):
-    """Parse ``path`` using the parser registered for ``style``."""
+def _key(style):
     key = _ALIASES.get(style)
     if key is None:
         raise ValueError("specified style, {0}, not supported (choose from {1})"
                          .format(style, ", ".join(supported_styles())))
-    return _PARSERS[key](path)
+    return key
+
+
+def count_atoms(path, style):
+    """The number of atoms in ``path``, read from the file's header rather
+    than by parsing it (used to plan batches, see pyquiver.planner)."""
+    return _COUNTERS[_key(style)](path)
+
+
+def parse(path, style):
+    """Parse ``path`` using the parser registered for ``style``."""
+    key = _key(style)
+    cache = active_cache()
+    if cache is None or key == "binary":   # a .qinb file is already the cached form
+        return _PARSERS[key](path)
+    return cache.parse(path, key, _PARSERS[key])
@@ -1,6 +1,8 @@
 """Shared helpers and the common return type for input-file parsers."""
 
+import mmap
 from collections import namedtuple
+from contextlib import contextmanager
 
 import numpy as np
 
@@ -11,21 +13,123 @@ import numpy as np
 ParsedSystem = namedtuple("ParsedSystem",
                           ["atomic_numbers", "positions_angstrom", "hessian"])
 
+# decode_floats works through its input in pieces of about this many bytes
+_DECODE_CHUNK = 1 << 23
+# token delimiters understood by decode_floats: whitespace and commas
+_DELIMITERS = frozenset(b" \t\r\n\f\v,")
+_COMMAS_TO_SPACES = bytes.maketrans(b",", b" ")
+
+
+@contextmanager
+def mapped_file(path):
+    """Yield a read-only memory map of ``path`` (``b""`` for an empty file,
+    which cannot be mapped), so parsers can search bytes without reading the
+    whole file into a string."""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        try:
+            yield data
+        finally:
+            data.close()
+
+
+def decode_floats(data, chunk_size=_DECODE_CHUNK):
+    """Decode comma- and/or whitespace-delimited numbers into a float64 array.
+
+    ``data`` is text or any bytes-like object (``bytes``, a memory map, a
+    ``memoryview``). It is cut at delimiters into chunks of about
+    ``chunk_size`` bytes, and each chunk is parsed by ``np.fromstring`` in C,
+    so no Python object is created per number and only one chunk is copied
+    out of ``data`` at a time. Empty fields (a trailing comma, ``,,``) are
+    skipped.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    # the views are released on the way out, so a memory map can be closed
+    # even when decoding fails
+    with memoryview(data) as raw, raw.cast("B") as view:
+        return _decode_chunks(view, chunk_size)
+
+
+def _decode_chunks(view, chunk_size):
+    size = len(view)
+
+    # chunk boundaries, each moved forward to the next delimiter
+    bounds = [0]
+    while bounds[-1] < size:
+        stop = min(bounds[-1] + max(int(chunk_size), 1), size)
+        while stop < size and view[stop] not in _DELIMITERS:
+            stop += 1
+        bounds.append(stop)
+
+    def decode(start, stop):
+        chunk = view[start:stop].tobytes().translate(_COMMAS_TO_SPACES)
+        if not chunk.strip():
+            return np.empty(0)
+        try:
+            return np.fromstring(chunk, sep=" ")
+        except ValueError:
+            bad = next(t for t in chunk.split() if not _is_float(t))
+            raise ValueError("could not convert %r to a number" % bad.decode(errors="replace"))
+
+    arrays = [decode(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+    if not arrays:
+        return np.empty(0)
+    return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+
+def _is_float(token):
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
+
 
 def parse_serial_lower_hessian(fields, number_of_atoms):
     """Expand a serialized lower-triangular Hessian into the full matrix.
 
-    ``fields`` is the comma-split lower triangle (row-major). A trailing comma
-    in the source leaves an empty final field, so blanks are dropped before
-    converting to float.
+    ``fields`` is the lower triangle (row-major), either as its comma-separated
+    text (``str`` or bytes-like, decoded by :func:`decode_floats`) or as a
+    list of the comma-split fields. A trailing comma in the source leaves an
+    empty final field, which is ignored.
     """
-    fields = [f for f in fields if f.strip() != ""]
+    if isinstance(fields, (list, tuple)):
+        values = np.array([f for f in fields if f.strip() != ""], dtype=float)
+    else:
+        values = decode_floats(fields)
+    size = 3 * number_of_atoms
+    _check_triangle(values, size)
+    return expand_lower_triangle(values, size)
 
-    # map every (i, j) of the full grid onto its lower-triangle serial index
-    range1d = np.arange(3 * number_of_atoms, dtype=int)
-    xgrid, ygrid = np.meshgrid(range1d, range1d)
-    agrid = np.minimum(xgrid, ygrid)
-    bgrid = np.maximum(xgrid, ygrid)
-    idxs = (bgrid * (bgrid + 1) / 2 + agrid).astype(int)
 
-    return np.array(fields, dtype=float)[idxs]
+def _check_triangle(values, size):
+    if len(values) != size * (size + 1) // 2:
+        raise ValueError("expected %d lower-triangle elements for a %dx%d matrix, found %d"
+                         % (size * (size + 1) // 2, size, size, len(values)))
+
+
+def expand_lower_triangle(values, size, out=None, dtype=np.float64):
+    """Expand the row-major lower triangle ``values`` (length
+    ``size*(size+1)/2``, already numeric) into the full symmetric matrix.
+
+    Each row is copied straight from the packed vector and then mirrored into
+    the upper triangle, so no index grids or other size x size temporaries
+    are built. The result is written into ``out`` if given.
+    """
+    values = np.asarray(values, dtype=float)
+    _check_triangle(values, size)
+    if out is None:
+        out = np.empty((size, size), dtype=dtype)
+    offset = 0
+    for i in range(size):
+        row = out[i, :i + 1]
+        row[...] = values[offset:offset + i + 1]
+        # mirror into column i of the rows above
+        out[:i, i] = row[:i]
+        offset += i + 1
+    return out
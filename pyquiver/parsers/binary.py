@@ -0,0 +1,154 @@
+"""Binary ``.qinb`` format (native format version 2).
+
+A compact, memory-mappable counterpart of the text ``.qin`` format, so that
+re-running an analysis on an archived system does no text parsing at all.
+All numbers are little-endian::
+
+    offset  size   content
+    0       8      magic b"PYQUIVER"
+    8       4      uint32 format version (2)
+    12      4      uint32 number of atoms n
+    16      32     SHA-256 of everything after the header
+    48      16     reserved (zero)
+    64      4n     int32 atomic numbers, zero-padded to a multiple of 8 bytes
+    ...     24n    float64 positions (angstroms), n x 3
+    ...     8m     float64 lower-triangle Hessian, row-major, m = 3n(3n+1)/2
+
+The arrays are opened with ``np.memmap`` and only the Hessian is copied, when
+it is expanded to the full matrix. :func:`convert` writes a ``.qinb`` file
+from any supported style, as does ``System.dump_pyquiver_binary_file``.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from ._common import ParsedSystem, expand_lower_triangle
+
+MAGIC = b"PYQUIVER"
+VERSION = 2
+HEADER_SIZE = 64
+
+_HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("number_of_atoms", "<u4"),
+                    ("sha256", "u1", (32,)), ("reserved", "V16")])
+
+
+def _layout(number_of_atoms):
+    # byte offsets of the atomic numbers, positions and packed Hessian, and
+    # the total file size
+    size = 3 * number_of_atoms
+    z_offset = HEADER_SIZE
+    positions_offset = z_offset + 8 * ((4 * number_of_atoms + 7) // 8)
+    hessian_offset = positions_offset + 24 * number_of_atoms
+    end = hessian_offset + 8 * (size * (size + 1) // 2)
+    return z_offset, positions_offset, hessian_offset, end
+
+
+def read_header(path):
+    """Return ``(version, number_of_atoms, sha256 hex digest)`` of a ``.qinb``
+    file, checking its magic number and size."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or raw[:8] != MAGIC:
+        raise ValueError("%s is not a binary PyQuiver (.qinb) file." % path)
+    header = np.frombuffer(raw, dtype=_HEADER)[0]
+    version, number_of_atoms = int(header["version"]), int(header["number_of_atoms"])
+    if version != VERSION:
+        raise ValueError("%s has unsupported .qinb version %d." % (path, version))
+    if os.path.getsize(path) != _layout(number_of_atoms)[3]:
+        raise ValueError("%s is truncated or has trailing data." % path)
+    return version, number_of_atoms, header["sha256"].tobytes().hex()
+
+
+def content_hash(path):
+    """SHA-256 (hex) of the payload of a ``.qinb`` file, recomputed from its
+    contents (compare with the stored ``read_header(path)[2]``)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE)
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load(path, verify=False):
+    """Open a ``.qinb`` file as read-only memory-mapped arrays.
+
+    Returns ``(atomic_numbers, positions_angstrom, packed_hessian)``, all
+    ``np.memmap`` views into the file. With ``verify=True`` the stored hash is
+    checked against the contents first (a full read of the file).
+    """
+    _, number_of_atoms, stored = read_header(path)
+    if verify and content_hash(path) != stored:
+        raise ValueError("%s is corrupt: content hash does not match its header." % path)
+    z_offset, positions_offset, hessian_offset, _ = _layout(number_of_atoms)
+    size = 3 * number_of_atoms
+    atomic_numbers = np.memmap(path, dtype="<i4", mode="r", offset=z_offset,
+                               shape=(number_of_atoms,))
+    positions = np.memmap(path, dtype="<f8", mode="r", offset=positions_offset,
+                          shape=(number_of_atoms, 3))
+    hessian = np.memmap(path, dtype="<f8", mode="r", offset=hessian_offset,
+                        shape=(size * (size + 1) // 2,))
+    return atomic_numbers, positions, hessian
+
+
+def parse(path, verify=False):
+    """Parse a ``.qinb`` file into a :class:`ParsedSystem` (``verify`` as in
+    :func:`load`)."""
+    atomic_numbers, positions, packed = load(path, verify)
+    return ParsedSystem([int(z) for z in atomic_numbers], np.array(positions),
+                        expand_lower_triangle(packed, 3 * len(atomic_numbers)))
+
+
+def count_atoms(path):
+    """The number of atoms in a ``.qinb`` file, from its header."""
+    return read_header(path)[1]
+
+
+def write(system, path):
+    """Write ``system`` (a ``System`` or ``ParsedSystem``) to ``path`` in the
+    ``.qinb`` format. The Hessian's lower triangle is streamed row by row, so
+    no packed copy is built. Returns the content hash (hex)."""
+    atomic_numbers = np.asarray(system.atomic_numbers, dtype="<i4")
+    positions = np.ascontiguousarray(system.positions_angstrom, dtype="<f8")
+    hessian = np.asarray(system.hessian)
+    number_of_atoms = len(atomic_numbers)
+    size = 3 * number_of_atoms
+    if positions.shape != (number_of_atoms, 3) or hessian.shape != (size, size):
+        raise ValueError("inconsistent shapes for %d atoms: positions %s, Hessian %s"
+                         % (number_of_atoms, positions.shape, hessian.shape))
+    z_offset, positions_offset, _, _ = _layout(number_of_atoms)
+
+    digest = hashlib.sha256()
+    with open(path, "wb") as f:
+        def emit(data):
+            digest.update(data)
+            f.write(data)
+
+        f.write(b"\0" * HEADER_SIZE)
+        emit(atomic_numbers.tobytes())
+        emit(b"\0" * (positions_offset - z_offset - 4 * number_of_atoms))
+        emit(positions.tobytes())
+        for i in range(size):
+            emit(np.ascontiguousarray(hessian[i, :i + 1], dtype="<f8").tobytes())
+
+        header = np.zeros((), dtype=_HEADER)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["number_of_atoms"] = number_of_atoms
+        header["sha256"] = np.frombuffer(digest.digest(), dtype=np.uint8)
+        f.seek(0)
+        f.write(header.tobytes())
+    return digest.hexdigest()
+
+
+def convert(path, style="gaussian", out=None):
+    """Parse ``path`` with any supported ``style`` and write it as ``.qinb``
+    (by default next to the input, with the extension replaced). Returns the
+    output path."""
+    from . import parse as parse_style   # the registry imports this module
+    if out is None:
+        out = os.path.splitext(path)[0] + ".qinb"
+    write(parse_style(path, style), out)
+    return out
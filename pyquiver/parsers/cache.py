@@ -0,0 +1,156 @@
+"""Opt-in on-disk cache of parsed systems.
+
+Re-running notebooks and batch jobs parses the same output files again and
+again. With the cache enabled, :func:`pyquiver.parsers.parse` (and so
+``System``, ``KIE_Calculation`` and ``batch``) looks each file up by the
+SHA-256 of its contents, the parser style and :data:`PARSER_VERSION`, and on
+a hit loads the stored :class:`ParsedSystem` from a binary ``.qinb`` file
+instead of parsing::
+
+    from pyquiver import parsers
+    parsers.enable_cache("~/.cache/pyquiver", max_bytes=2 * 1024**3)
+
+Entries are evicted least recently used first (by file modification time,
+which a hit refreshes) once the directory grows beyond ``max_bytes``.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+
+from . import binary
+
+logger = logging.getLogger("pyquiver")
+
+# bump whenever a parser changes what it returns, to invalidate old entries
+PARSER_VERSION = 1
+
+DEFAULT_DIRECTORY = os.path.join("~", ".cache", "pyquiver")
+DEFAULT_MAX_BYTES = 1 << 30
+
+_SUFFIX = ".qinb"
+
+
+def file_hash(path):
+    """SHA-256 (hex) of the contents of ``path``."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache(object):
+    """A directory of parsed systems, keyed by content hash, style and parser
+    version, holding at most ``max_bytes`` of entries."""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = int(max_bytes)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, path, style):
+        """The cache key of ``path`` parsed as (canonical) ``style``."""
+        return "%s-%s-v%d" % (file_hash(path), style, PARSER_VERSION)
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def _entries(self):
+        # (mtime, size, path) of every entry
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:   # removed by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def size(self):
+        """Total bytes held by the cache."""
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        """Remove every entry."""
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    def parse(self, path, style, parser):
+        """Return the :class:`ParsedSystem` of ``path``: from the cache if
+        present, otherwise from ``parser(path)``, which is then stored."""
+        key = self.key(path, style)
+        entry = self._entry(key)
+        try:
+            # the stored hash is checked, so a truncated or corrupted entry is
+            # never returned as a valid Hessian
+            parsed = binary.parse(entry, verify=True)
+        except OSError:   # not cached (or unreadable)
+            parsed = None
+        except ValueError as e:
+            logger.warning("Discarding a bad parse cache entry for %s: %s", path, e)
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+            parsed = None
+        if parsed is not None:
+            os.utime(entry)   # most recently used
+            logger.debug("Parse cache hit for %s.", path)
+            return parsed
+
+        parsed = parser(path)
+        # write to a temporary file first so a reader never sees a partial entry
+        fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            binary.write(parsed, temporary)
+            os.replace(temporary, entry)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        logger.debug("Parse cache miss for %s; stored as %s.", path, key)
+        self.evict()
+        return parsed
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in
+        ``max_bytes``."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            logger.debug("Evicted %s from the parse cache.", os.path.basename(path))
+
+
+_active = None
+
+
+def enable_cache(directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+    """Cache every parse in ``directory`` from now on. Returns the
+    :class:`ParseCache`."""
+    global _active
+    _active = ParseCache(directory, max_bytes)
+    return _active
+
+
+def disable_cache():
+    """Stop consulting the parse cache (its files are kept)."""
+    global _active
+    _active = None
+
+
+def active_cache():
+    """The enabled :class:`ParseCache`, or None."""
+    return _active
@@ -0,0 +1,76 @@
+"""Parser for Gaussian formatted checkpoint (.fchk) files.
+
+A formatted checkpoint stores every quantity as a labelled section whose
+header gives the type and element count::
+
+    Atomic numbers                             I   N=          14
+               6           6           6           8           6           6
+    ...
+    Current cartesian coordinates              R   N=          42
+    Cartesian Force Constants                  R   N=         903
+
+The parser finds the three sections it needs in a memory map of the file and
+decodes each numeric block with ``decode_floats``, checking the result
+against the declared count. Coordinates are in bohr and the force
+constants are the row-major lower triangle in hartree/bohr^2 (the same
+quantity as the archive of a Gaussian log file).
+"""
+
+import re
+
+from ..constants import PHYSICAL_CONSTANTS
+from ._common import ParsedSystem, decode_floats, expand_lower_triangle, mapped_file
+
+_BOHR_TO_ANGSTROM = PHYSICAL_CONSTANTS["atb"]
+
+# the next section header: a line that starts with a letter (data lines are
+# indented)
+_NEXT_HEADER = re.compile(rb"\n[A-Za-z]")
+
+
+def _section(data, name, path, missing="Could not find '%s' in %s."):
+    # the numbers of the array section ``name``, checked against its N= count;
+    # ``missing`` is the message when there is no such section
+    match = re.search(rb"^" + re.escape(name) + rb" +([IR]) +N= *([0-9]+)[ \t]*\r?$",
+                      data, re.MULTILINE)
+    if match is None:
+        raise ValueError(missing % (name.decode(), path))
+    kind, count = match.group(1), int(match.group(2))
+    start = match.end()
+    stop = _NEXT_HEADER.search(data, start)
+    stop = len(data) if stop is None else stop.start()
+    values = decode_floats(data[start:stop])
+    if len(values) != count:
+        raise ValueError("'%s' in %s declares %d values but holds %d."
+                         % (name.decode(), path, count, len(values)))
+    return values.astype(int) if kind == b"I" else values
+
+
+def count_atoms(path):
+    """The number of atoms in a .fchk file, from the ``Atomic numbers``
+    header alone."""
+    with mapped_file(path) as data:
+        match = re.search(rb"^Atomic numbers +I +N= *([0-9]+)", data, re.MULTILINE)
+        if match is None:
+            raise ValueError("Could not find 'Atomic numbers' in %s." % path)
+        return int(match.group(1))
+
+
+def parse(path):
+    """Parse a Gaussian .fchk file into a :class:`ParsedSystem`."""
+    with mapped_file(path) as data:
+        atomic_numbers = _section(data, b"Atomic numbers", path)
+        coordinates = _section(data, b"Current cartesian coordinates", path)
+        # only a missing section means there was no frequency job; a bad
+        # count or token in one that is there is reported as such
+        force_constants = _section(data, b"Cartesian Force Constants", path,
+                                   missing="No frequency job detected ('%s' is absent from %s).")
+
+    number_of_atoms = len(atomic_numbers)
+    if len(coordinates) != 3 * number_of_atoms:
+        raise ValueError("%s has %d atoms but %d coordinates."
+                         % (path, number_of_atoms, len(coordinates)))
+    positions = coordinates.reshape(number_of_atoms, 3) * _BOHR_TO_ANGSTROM
+    hessian = expand_lower_triangle(force_constants, 3 * number_of_atoms)
+
+    return ParsedSystem([int(z) for z in atomic_numbers], positions, hessian)
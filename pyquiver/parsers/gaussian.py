@@ -1,27 +1,50 @@
-"""Parser for Gaussian output files (g09 / g16)."""
+"""Parser for Gaussian output files (g09 / g16).
+
+The file is memory-mapped and read in one pass over the few places that
+matter, so a multi-hundred-megabyte opt+freq log is never decoded as a whole:
+the route card and atom count near the top, the last orientation table, the
+last archive block carrying a frequency job (found by scanning backwards from
+the end), and the final line for the termination check.
+"""
 
-import os
 import re
 import logging
 
 import numpy as np
 
-from ._common import ParsedSystem, parse_serial_lower_hessian
+from ._common import ParsedSystem, mapped_file, parse_serial_lower_hessian
 
 logger = logging.getLogger("pyquiver")
 
+_ROUTE = re.compile(rb" *#[pP] ")
+_NATOMS = re.compile(rb"NAtoms\= +([0-9]+)")
+_ARCHIVE_START = b"1\\1\\GINC"
+_ARCHIVE_END = re.compile(rb"\\\s*@")
+# the archive wraps lines anywhere, including inside numbers
+_ARCHIVE_SQUASH = b" \t\r\n\f\v+"
+
+
+def _last_line(data):
+    # the last line of the mapping, ignoring a trailing newline
+    end = len(data)
+    if end and data[end - 1:end] == b"\n":
+        end -= 1
+    return data[data.rfind(b"\n", 0, end) + 1:end].decode(errors="replace")
+
 
 def _tail(filename):
     """Return the last line of a file (used to check normal termination)."""
-    # https://stackoverflow.com/questions/46258499
-    with open(filename, 'rb') as f:
-        try:  # catch OSError in case of a one-line file
-            f.seek(-2, os.SEEK_END)
-            while f.read(1) != b'\n':
-                f.seek(-2, os.SEEK_CUR)
-        except OSError:
-            f.seek(0)
-        return f.readline().decode()
+    with mapped_file(filename) as data:
+        return _last_line(data)
+
+
+def count_atoms(path):
+    """The number of atoms in a Gaussian output file, without parsing it."""
+    with mapped_file(path) as data:
+        m = _NATOMS.search(data)
+        if not m:
+            raise ValueError("Number of atoms not detected.")
+        return int(m.group(1))
 
 
 def _valid_geom_line(split_line):
@@ -34,67 +57,74 @@ def _valid_geom_line(split_line):
     return False
 
 
-def _parse_hessian(data, filename):
-    # the force constant matrix lives in the archive between 1\1\GINC and \@
-    raw_archive = re.findall(r"1\\1\\GINC(.+?)\\(\s*)@", data, re.DOTALL)
-    archive = None
-    for candidate in raw_archive:
-        squashed = re.sub(r'[\s+]', '', candidate[0])
-        archive = re.search(r"NImag\=(.+?)$", squashed, re.DOTALL)
-        if archive:
-            break
-    if not archive:
-        raise ValueError("No frequency job detected in %s." % filename)
+def _last_table(data, header, ends):
+    # the text between the last ``header`` that is followed by one of
+    # ``ends`` and that end marker, or None
+    start = len(data)
+    while True:
+        start = data.rfind(header, 0, start)
+        if start < 0:
+            return None
+        stops = [s for s in (data.find(end, start) for end in ends) if s >= 0]
+        if stops:
+            return data[start + len(header):min(stops)].decode(errors="replace")
 
-    return archive.group(0).split('\\')[2].split(',')
+
+def _parse_hessian(data, filename):
+    # the force constant matrix lives in the last archive (between 1\1\GINC
+    # and \@) that belongs to a frequency job, i.e. carries NImag=
+    stop = len(data)
+    while True:
+        start = data.rfind(_ARCHIVE_START, 0, stop)
+        if start < 0:
+            raise ValueError("No frequency job detected in %s." % filename)
+        end = _ARCHIVE_END.search(data, start)
+        if end is not None:
+            squashed = data[start:end.start()].translate(None, _ARCHIVE_SQUASH)
+            marker = squashed.find(b"NImag=")
+            if marker >= 0:
+                # the comma-separated lower triangle, left as bytes for
+                # decode_floats
+                return squashed[marker:].split(b"\\", 3)[2]
+        stop = start
 
 
 def parse(path):
     """Parse a Gaussian output file into a :class:`ParsedSystem`."""
-    # require a normally terminated job (snippet files are exempt)
-    if not path.endswith(".snip") and "Normal termination" not in _tail(path):
-        raise ValueError("Gaussian job %s terminated in an error" % path)
-
-    with open(path, 'r') as f:
-        data = f.read()
-
-    # the verbose route card (#p) is required for the archive to be present
-    if re.search(r" *#[pP] ", data) is None and not path.lower().endswith(".snip"):
-        raise ValueError(
-            "Gaussian output file %s was not run with the verbose flag, so it "
-            "does not contain enough information for PyQuiver to run. Please "
-            "re-run this calculation with a route card that starts with #p"
-            % path)
-
-    m = re.search(r"NAtoms\= +([0-9]+)", data)
-    if not m:
-        raise ValueError("Number of atoms not detected.")
-    number_of_atoms = int(m.group(1))
+    snip = path.lower().endswith(".snip")
+    with mapped_file(path) as data:
+        # require a normally terminated job (snippet files are exempt)
+        if not path.endswith(".snip") and "Normal termination" not in _last_line(data):
+            raise ValueError("Gaussian job %s terminated in an error" % path)
+
+        # the verbose route card (#p) is required for the archive to be present
+        if _ROUTE.search(data) is None and not snip:
+            raise ValueError(
+                "Gaussian output file %s was not run with the verbose flag, so it "
+                "does not contain enough information for PyQuiver to run. Please "
+                "re-run this calculation with a route card that starts with #p"
+                % path)
+
+        m = _NATOMS.search(data)
+        if not m:
+            raise ValueError("Number of atoms not detected.")
+        number_of_atoms = int(m.group(1))
+
+        # prefer standard orientation; fall back to input orientation (nosymm)
+        table = _last_table(data, b"Standard orientation", [b"Rotational constants (GHZ)"])
+        if table is None:
+            table = _last_table(data, b"Input orientation",
+                                [b"Distance matrix", b"Rotational constants (GHZ)"])
+            if table is not None:
+                logger.info("Couldn't find standard orientation so used input orientation instead.")
+        if table is None:
+            raise ValueError("Geometry table not detected.")
+
+        raw_fcm = _parse_hessian(data, path)
 
     atomic_numbers = [0] * number_of_atoms
     positions = np.zeros((number_of_atoms, 3))
-
-    # prefer standard orientation; fall back to input orientation (nosymm)
-    m = None
-    for m in re.finditer(r"Standard orientation(.+?)Rotational constants \(GHZ\)",
-                         data, re.DOTALL):
-        pass
-    if m is None:
-        for m in re.finditer(r"Input orientation(.+?)Distance matrix",
-                             data, re.DOTALL):
-            pass
-        if m is not None:
-            logger.info("Couldn't find standard orientation so used input orientation instead.")
-    if m is None:
-        for m in re.finditer(r"Input orientation(.+?)Rotational constants \(GHZ\)",
-                             data, re.DOTALL):
-            pass
-        if m is not None:
-            logger.info("Couldn't find standard orientation so used input orientation instead.")
-    if m is None:
-        raise ValueError("Geometry table not detected.")
-
-    for line in m.group(1).split('\n'):
+    for line in table.split('\n'):
         fields = [x for x in line.split(' ') if x]
         if _valid_geom_line(fields):
             center = int(fields[0]) - 1
@@ -102,7 +132,6 @@ def parse(path):
             for e in range(3):
                 positions[center][e] = fields[3 + e]
 
-    raw_fcm = _parse_hessian(data, path)
     hessian = parse_serial_lower_hessian(raw_fcm, number_of_atoms)
 
     return ParsedSystem(atomic_numbers, positions, hessian)
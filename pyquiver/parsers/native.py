@@ -7,52 +7,97 @@ The format is::
     <comma-separated lower-triangular Hessian>
 """
 
+import io
+
 import numpy as np
 
-from ._common import ParsedSystem, parse_serial_lower_hessian
+from ._common import ParsedSystem, mapped_file, parse_serial_lower_hessian
 
 
-def parse(path):
-    """Parse a ``.qin`` file into a :class:`ParsedSystem`."""
-    with open(path, 'r') as f:
-        lines = f.read().split("\n")
-
+def count_atoms(path):
+    """The number of atoms in a ``.qin`` file (its first line)."""
+    with open(path, "rb") as f:
+        line = f.readline()
     try:
-        number_of_atoms = int(lines[0])
+        return int(line)
     except ValueError:
         raise ValueError("first line must contain integer number of atoms.")
 
-    atomic_numbers = [0] * number_of_atoms
-    positions = np.zeros((number_of_atoms, 3))
-    for line in lines[1:number_of_atoms + 1]:
-        fields = line.split(',')
+
+def parse(path):
+    """Parse a ``.qin`` file into a :class:`ParsedSystem`."""
+    with mapped_file(path) as data:
+        # the atom count and geometry are a few short lines; the Hessian line
+        # is decoded straight from the mapping
+        end = data.find(b"\n")
+        end = len(data) if end < 0 else end
         try:
-            center_number, atomic_number, x, y, z = fields
+            number_of_atoms = int(data[:end])
         except ValueError:
-            raise ValueError("the following line in the geometry did not have "
-                             "the appropriate number of fields: {0}".format(line))
-        center = int(center_number)
-        atomic_numbers[center] = int(atomic_number)
-        positions[center][0] = x
-        positions[center][1] = y
-        positions[center][2] = z
+            raise ValueError("first line must contain integer number of atoms.")
 
-    fcm_fields = lines[number_of_atoms + 1].split(',')
-    hessian = parse_serial_lower_hessian(fcm_fields, number_of_atoms)
+        atomic_numbers = [0] * number_of_atoms
+        positions = np.zeros((number_of_atoms, 3))
+        for _ in range(number_of_atoms):
+            start = end + 1
+            end = data.find(b"\n", start)
+            end = len(data) if end < 0 else end
+            line = data[start:end].decode()
+            fields = line.split(',')
+            try:
+                center_number, atomic_number, x, y, z = fields
+            except ValueError:
+                raise ValueError("the following line in the geometry did not have "
+                                 "the appropriate number of fields: {0}".format(line))
+            center = int(center_number)
+            atomic_numbers[center] = int(atomic_number)
+            positions[center][0] = x
+            positions[center][1] = y
+            positions[center][2] = z
+
+        start = end + 1
+        end = data.find(b"\n", start)
+        end = len(data) if end < 0 else end
+        hessian = parse_serial_lower_hessian(data[start:end], number_of_atoms)
 
     return ParsedSystem(atomic_numbers, positions, hessian)
 
 
-def serialize(system):
-    """Serialize a System to native ``.qin`` text."""
-    serial = "%d\n" % system.number_of_atoms
+# rows of the lower triangle are formatted and written in blocks of about
+# this many elements
+_WRITE_CHUNK = 1 << 20
+
+
+def write(system, f):
+    """Stream ``system`` in the native ``.qin`` format to the text file
+    handle ``f``. The lower triangle is formatted a block of rows at a time,
+    so memory stays bounded by the block rather than the whole file; each
+    block is formatted by ``np.savetxt`` with 17 significant digits, which
+    round-trips every float64 exactly."""
+    f.write("%d\n" % system.number_of_atoms)
     for i in range(system.number_of_atoms):
-        serial += "{0},{1},{2},{3},{4}\n".format(
+        f.write("{0},{1},{2},{3},{4}\n".format(
             i, system.atomic_numbers[i],
             system.positions_angstrom[i, 0],
             system.positions_angstrom[i, 1],
-            system.positions_angstrom[i, 2])
-    for i in range(system.number_of_atoms * 3):
-        for j in range(0, i + 1):
-            serial += str(system.hessian[i, j]) + ","
-    return serial
+            system.positions_angstrom[i, 2]))
+
+    hessian = system.hessian
+    size = system.number_of_atoms * 3
+    start = 0
+    while start < size:
+        # rows start..stop hold about _WRITE_CHUNK elements
+        stop = start + 1
+        while stop < size and (stop + 1) * (stop + 2) // 2 - start * (start + 1) // 2 <= _WRITE_CHUNK:
+            stop += 1
+        values = np.concatenate([hessian[i, :i + 1] for i in range(start, stop)])
+        # one format call for the whole block
+        np.savetxt(f, values[np.newaxis], fmt="%.17g", delimiter=",", newline=",")
+        start = stop
+
+
+def serialize(system):
+    """Serialize a System to native ``.qin`` text."""
+    buffer = io.StringIO()
+    write(system, buffer)
+    return buffer.getvalue()
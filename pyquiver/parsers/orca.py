@@ -1,70 +1,117 @@
-"""Parser for ORCA .hess files."""
+"""Parser for ORCA .hess files.
+
+The ``$hessian`` section is printed as blocks of (at most) five columns: a
+header line of column indices, then one line per row holding the row index
+and that row's five values. Every token in the section is a number, so it is
+decoded in one vectorized call and each column block is copied straight into
+a preallocated 3N x 3N array.
+"""
 
-import re
 import logging
-from io import StringIO
 
 import numpy as np
 
 from ..constants import SYMBOL_TO_Z, PHYSICAL_CONSTANTS
-from ._common import ParsedSystem
+from ._common import ParsedSystem, decode_floats, mapped_file
 
 logger = logging.getLogger("pyquiver")
 
 _BOHR_TO_ANGSTROM = PHYSICAL_CONSTANTS["atb"]
 
+# columns per block of the printed Hessian
+_BLOCK_COLUMNS = 5
+
+
+def _section(data, name):
+    # the text of section $name (after its header line), up to the next
+    # section, or None
+    header = b"$" + name
+    start = -1
+    while True:
+        start = data.find(header, start + 1)
+        if start < 0:
+            return None
+        end = start + len(header)
+        if (start == 0 or data[start - 1:start] == b"\n") and data[end:end + 1].strip() == b"":
+            break
+    start = data.find(b"\n", end)
+    if start < 0:
+        return None
+    stop = data.find(b"\n$", start)
+    return data[start + 1:len(data) if stop < 0 else stop + 1]
+
+
+def _parse_atoms(section):
+    # "<symbol> <mass> <x> <y> <z>" per atom, in bohr
+    count, _, body = section.lstrip().partition(b"\n")
+    number_of_atoms = int(count)
+    table = np.array(body.split(None, 5 * number_of_atoms)[:5 * number_of_atoms])
+    if len(table) != 5 * number_of_atoms:
+        raise ValueError("'$atoms' lists fewer than %d atoms." % number_of_atoms)
+    table = table.reshape(number_of_atoms, 5)
+    try:
+        atomic_numbers = [SYMBOL_TO_Z[s.decode()] for s in table[:, 0]]
+    except KeyError as e:
+        raise ValueError("unknown element %s in '$atoms'." % e)
+    coordinates = table[:, 2:].astype(float)
+    return atomic_numbers, coordinates.reshape(number_of_atoms, 3) * _BOHR_TO_ANGSTROM
+
+
+def _parse_hessian(section):
+    count, _, body = section.lstrip().partition(b"\n")
+    size = int(count)
+    values = decode_floats(body)
+
+    hessian = np.empty((size, size))
+    offset = 0
+    for column in range(0, size, _BLOCK_COLUMNS):
+        width = min(_BLOCK_COLUMNS, size - column)
+        # skip the column-index header, then (row index + width values) per row
+        start = offset + width
+        offset = start + size * (width + 1)
+        if offset > len(values):
+            raise ValueError("'$hessian' is truncated (expected a %dx%d matrix)." % (size, size))
+        hessian[:, column:column + width] = values[start:offset].reshape(size, width + 1)[:, 1:]
+
+    # symmetrize in place: H <- (H + H^T) / 2
+    hessian += hessian.T
+    hessian *= 0.5
+    return hessian
+
 
 def parse_orca_output(out_data):
-    """Parse the text of an ORCA .hess file.
+    """Parse the text (``str`` or ``bytes``) of an ORCA .hess file.
 
     Returns ``(atomic_numbers, positions_angstrom, hessian)``.
     """
-    lines = out_data.split('\n')
+    if isinstance(out_data, str):
+        out_data = out_data.encode()
 
-    # geometry
-    try:
-        atoms_line = next(n for n, line in enumerate(lines)
-                          if line.startswith('$atoms'))
-    except StopIteration:
+    atoms = _section(out_data, b"atoms")
+    if atoms is None:
         raise ValueError("Could not find '$atoms' in output data.")
+    atomic_numbers, positions = _parse_atoms(atoms)
 
-    number_of_atoms = int(lines[atoms_line + 1])
-
-    atomic_numbers = []
-    positions = np.zeros((number_of_atoms, 3))
-    for i, line in enumerate(lines[atoms_line + 2:atoms_line + number_of_atoms + 2]):
-        _, atom, _, x, y, z = re.split(r'\s+', line)
-        atomic_numbers.append(SYMBOL_TO_Z[atom])
-        positions[i][0] = float(x) * _BOHR_TO_ANGSTROM
-        positions[i][1] = float(y) * _BOHR_TO_ANGSTROM
-        positions[i][2] = float(z) * _BOHR_TO_ANGSTROM
-
-    # hessian
-    try:
-        hessian_line = next(n for n, line in enumerate(lines)
-                            if line.startswith('$hessian'))
-    except StopIteration:
+    hessian = _section(out_data, b"hessian")
+    if hessian is None:
         raise ValueError("Could not find '$hessian' in output data.")
+    hessian = _parse_hessian(hessian)
 
-    hessian_size = int(lines[hessian_line + 1])
-    hessian = None
-    for i, batch in enumerate(range(0, hessian_size, 5)):
-        batch_size = min(5, hessian_size - batch)
-        s = StringIO(u"\n".join(
-            lines[hessian_line + (i * (hessian_size + 1) + 2):
-                  hessian_line + ((i + 1) * (hessian_size + 1)) + 2]))
-        h = np.loadtxt(s, skiprows=1,
-                       converters=dict((j + 1, float) for j in range(batch_size)),
-                       usecols=tuple(j + 1 for j in range(batch_size)),
-                       ndmin=2)
-        hessian = h if hessian is None else np.hstack((hessian, h))
-
-    hessian = (hessian + hessian.T) / 2
     return atomic_numbers, positions, hessian
 
 
+def count_atoms(path):
+    """The number of atoms in an ORCA .hess file, from its ``$atoms``
+    header alone."""
+    with mapped_file(path) as data:
+        section = _section(data, b"atoms")
+        if section is None:
+            raise ValueError("Could not find '$atoms' in %s." % path)
+        return int(section.lstrip().partition(b"\n")[0])
+
+
 def parse(path):
     """Parse an ORCA .hess file at ``path`` into a :class:`ParsedSystem`."""
-    with open(path, 'r') as f:
-        atomic_numbers, positions, hessian = parse_orca_output(f.read())
+    with mapped_file(path) as data:
+        atomic_numbers, positions, hessian = parse_orca_output(data)
     return ParsedSystem(atomic_numbers, positions, hessian)
@@ -0,0 +1,345 @@
+"""Cost model and execution planner for batches.
+
+Whether a batch runs fastest serially, with threads over the isotopologues of
+each pair (``n_jobs``), with the ``"batched"`` engine or in worker processes
+(``executor="process"``) depends on the atom counts and the number of
+isotopologues. :func:`plan` estimates the time and peak memory of every pair
+from the atom counts in the files' headers (see
+:func:`pyquiver.parsers.count_atoms`) and the config's isotopologues, picks
+the strategy with the smallest estimated makespan that fits in memory, and
+orders the pairs largest first::
+
+    from pyquiver import batch
+    print(batch("demo.config", pairs, executor="auto", dry_run=True))
+    results = batch("demo.config", pairs, executor="auto")
+
+The model of one diagonalization of a 3N x 3N Hessian is ``overhead + unit *
+(3N)^3``, with both constants measured once per process on this host by
+:func:`calibrate` (single-threaded BLAS, as the parallel strategies run it).
+Parsing is taken as linear in the number of Hessian values. Estimates assume
+full Hessians (a partial Hessian analysis only makes them smaller) and that
+no eigenvalues are cached.
+"""
+
+import heapq
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from . import parsers
+from . import quiver
+from . import threads
+from .config import Config
+from .engines import DEFAULT_BATCH_BYTES
+
+logger = logging.getLogger("pyquiver")
+
+# rough cost of parsing one value of a lower-triangle Hessian from text
+PARSE_SECONDS_PER_VALUE = 1e-7
+# start-up cost of one worker process (interpreter, imports, pipes)
+PROCESS_STARTUP_SECONDS = 0.2
+# batches estimated to take less than this run serially: the model ignores
+# the fixed costs of threads and engines, which dominate at this scale
+SERIAL_SECONDS = 1.0
+
+STRATEGIES = ("serial", "thread", "batched", "process")
+
+# one pair's estimate: atom counts, isotopologues (excluding the unsubstituted
+# one), seconds and peak bytes when run on a single thread
+PairEstimate = namedtuple("PairEstimate",
+                          ["label", "gs_atoms", "ts_atoms", "isotopologues", "seconds",
+                           "peak_bytes"])
+
+_calibration = None
+
+
+def calibrate(size=300, repeats=3):
+    """``(overhead, unit)`` of ``np.linalg.eigvalsh`` on this host, in
+    seconds: one diagonalization of an n x n matrix takes about ``overhead +
+    unit * n**3``. Measured once (on random symmetric matrices of 3 and
+    ``size`` rows, best of ``repeats``) and remembered."""
+    global _calibration
+    if _calibration is None:
+        rng = np.random.default_rng(0)
+
+        def best(n):
+            a = rng.standard_normal((n, n))
+            a = a + a.T
+            times = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                np.linalg.eigvalsh(a)
+                times.append(time.perf_counter() - started)
+            return min(times)
+
+        with threads.limit_blas_threads(1):
+            overhead = best(3)
+            unit = max(best(size) - overhead, 0.0) / size**3
+        _calibration = (overhead, unit)
+        logger.debug("Calibrated eigvalsh: %.2e s per call + %.2e s per n^3.", overhead, unit)
+    return _calibration
+
+
+def available_memory():
+    """Bytes of memory available to new allocations (``MemAvailable`` on
+    Linux), or None if unknown."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def isotopologue_count(config, gs_atoms):
+    """The isotopologues a pair runs for ``config``: those listed, plus at
+    most one per atom of the ground state for each scan."""
+    return len(config.isotopologues) + len(config.scans) * gs_atoms
+
+
+def _lpt(seconds, workers):
+    # makespan of assigning jobs longest first to the least loaded worker
+    loads = [0.0] * max(1, workers)
+    for s in sorted(seconds, reverse=True):
+        heapq.heapreplace(loads, loads[0] + s)
+    return max(loads)
+
+
+class _Pair(object):
+    # the cost model of one pair
+    def __init__(self, label, gs_atoms, ts_atoms, isotopologues, calibration):
+        self.label = label
+        self.gs_atoms, self.ts_atoms = gs_atoms, ts_atoms
+        self.isotopologues = isotopologues
+        overhead, unit = calibration
+        self.sizes = (3 * gs_atoms, 3 * ts_atoms)
+        # one diagonalization of each structure
+        self.diagonalization = sum(overhead + unit * n**3 for n in self.sizes)
+        self.cubic = sum(unit * n**3 for n in self.sizes)
+        self.overhead = 2 * overhead
+        self.parse = PARSE_SECONDS_PER_VALUE * sum(n * (n + 1) // 2 for n in self.sizes)
+        # both Hessians, plus one more while the second file is parsed
+        largest = max(self.sizes)
+        self.resident = 8 * (sum(n * n for n in self.sizes) + largest * largest)
+        # a diagonalization holds the mass-weighted Hessian and LAPACK's copy
+        self.workspace = 16 * largest * largest
+
+    def seconds(self, strategy, n_jobs=1):
+        # the unsubstituted isotopologue is diagonalized first, on its own
+        k = self.isotopologues
+        if strategy == "thread":
+            return self.parse + self.diagonalization * (1 + math.ceil(k / float(n_jobs)))
+        if strategy == "batched":
+            # one stacked call per chunk of isotopologues of each structure
+            per_chunk = max(1, DEFAULT_BATCH_BYTES // (8 * max(self.sizes)**2))
+            calls = math.ceil((k + 1) / float(per_chunk))
+            return self.parse + self.cubic * (k + 1) + self.overhead * calls
+        return self.parse + self.diagonalization * (k + 1)
+
+    def peak_bytes(self, strategy, n_jobs=1):
+        if strategy == "thread":
+            return self.resident + self.workspace * min(n_jobs, self.isotopologues + 1)
+        if strategy == "batched":
+            stacked = min(8 * max(self.sizes)**2 * (self.isotopologues + 1),
+                          max(DEFAULT_BATCH_BYTES, 8 * max(self.sizes)**2))
+            return self.resident + 2 * stacked
+        return self.resident + self.workspace
+
+    def estimate(self):
+        return PairEstimate(self.label, self.gs_atoms, self.ts_atoms, self.isotopologues,
+                            self.seconds("serial"), self.peak_bytes("serial"))
+
+
+class Plan(object):
+    """How a batch will run: the chosen ``strategy`` (one of
+    :data:`STRATEGIES`) with ``n_jobs`` threads or processes and ``engine``,
+    the pairs' :class:`PairEstimate` s largest first (``estimates``, and
+    their labels as ``order``), the estimated ``makespan`` in seconds and
+    ``peak_bytes`` of memory, and the makespan of every strategy considered
+    (``alternatives``, None where it is unavailable: parallel strategies on
+    one core, those ruled out by a fixed engine, or anything that would not
+    fit in ``memory_limit``). Pairs whose
+    files could not be read are not estimated: they are listed in
+    ``unreadable`` (label -> error) and run last, for the executor to report
+    their failure."""
+
+    def __init__(self, strategy, n_jobs, engine, estimates, makespan, peak_bytes,
+                 alternatives, cores, memory_limit, unreadable=None):
+        self.strategy = strategy
+        self.n_jobs = n_jobs
+        self.engine = engine
+        self.estimates = estimates
+        self.makespan = makespan
+        self.peak_bytes = peak_bytes
+        self.alternatives = alternatives
+        self.cores = cores
+        self.memory_limit = memory_limit
+        self.unreadable = OrderedDict() if unreadable is None else unreadable
+
+    @property
+    def order(self):
+        return [e.label for e in self.estimates] + list(self.unreadable)
+
+    @property
+    def executor(self):
+        """The ``batch`` executor that runs this plan."""
+        return "process" if self.strategy == "process" else "serial"
+
+    def to_records(self):
+        """One dict per pair, largest first."""
+        return [e._asdict() for e in self.estimates]
+
+    def __str__(self, rows=20):
+        def mb(n):
+            return "unknown" if n is None else "%.1f MB" % (n / 1024.0**2)
+
+        lines = ["Plan: %s with %d %s (engine %s) for %d pairs on %d cores"
+                 % (self.strategy, self.n_jobs,
+                    "processes" if self.strategy == "process" else "threads",
+                    self.engine, len(self.order), self.cores),
+                 "Estimated time %.2f s, peak memory %s (available %s)"
+                 % (self.makespan, mb(self.peak_bytes), mb(self.memory_limit)),
+                 "Alternatives: " + ", ".join(
+                     "%s %s" % (name, "unavailable" if t is None else "%.2f s" % t)
+                     for name, t in self.alternatives.items()),
+                 "",
+                 "%-24s %8s %8s %13s %10s %11s" % ("label", "gs atoms", "ts atoms",
+                                                   "isotopologues", "seconds", "peak MB")]
+        for e in self.estimates[:rows]:
+            lines.append("%-24s %8d %8d %13d %10.3f %11.1f"
+                         % (e.label, e.gs_atoms, e.ts_atoms, e.isotopologues, e.seconds,
+                            e.peak_bytes / 1024.0**2))
+        if len(self.estimates) > rows:
+            lines.append("... %d more pairs" % (len(self.estimates) - rows))
+        if self.unreadable:
+            lines += ["", "Not estimated (run last):"]
+            lines += ["%-24s %s" % (label, error) for label, error in self.unreadable.items()]
+        return "\n".join(lines)
+
+
+def plan(config, pairs, style="gaussian", n_jobs=None, memory_limit=None, strategy=None,
+         calibration=None, engine=None):
+    """Plan a :func:`~pyquiver.batch` of ``pairs`` (``{label: (gs, ts)}``, paths
+    or ``System`` objects) without running it. Returns a :class:`Plan`.
+
+    ``n_jobs`` caps the threads or processes (default: all cores),
+    ``memory_limit`` the estimated peak memory in bytes (default: the memory
+    available now). ``strategy`` forces one of :data:`STRATEGIES` instead of
+    choosing the fastest, and ``calibration`` replaces the measured
+    ``(overhead, unit)`` of :func:`calibrate`. ``engine`` fixes the engine
+    rather than letting the strategy choose it: ``"eigvalsh"`` rules out the
+    batched strategy, and ``"batched"`` leaves only it and processes.
+    """
+    if isinstance(config, str):
+        config = Config(config)
+    if strategy is not None and strategy not in STRATEGIES:
+        raise ValueError("strategy must be one of %s, not %r"
+                         % (", ".join(STRATEGIES), strategy))
+    cores = threads.cpu_count() if n_jobs is None or n_jobs < 0 else n_jobs
+    if cores == 0:
+        raise ValueError("n_jobs must not be 0")
+    if memory_limit is None:
+        memory_limit = available_memory()
+    if calibration is None:
+        calibration = calibrate()
+
+    counts = {}
+
+    def atoms(structure):
+        if isinstance(structure, quiver.System):
+            return structure.number_of_atoms
+        if structure not in counts:
+            counts[structure] = parsers.count_atoms(structure, style)
+        return counts[structure]
+
+    models = []
+    unreadable = OrderedDict()
+    for label, pair in pairs.items():
+        if len(pair) != 2:
+            raise ValueError("pair %r is not a (gs, ts) pair" % (label,))
+        # a missing or malformed file fails that pair only, when it runs
+        try:
+            gs_atoms, ts_atoms = atoms(pair[0]), atoms(pair[1])
+        except (OSError, ValueError) as e:
+            unreadable[label] = "%s: %s" % (type(e).__name__, e)
+            logger.warning("Pair %s cannot be estimated: %s", label, unreadable[label])
+            continue
+        models.append(_Pair(label, gs_atoms, ts_atoms,
+                            isotopologue_count(config, gs_atoms), calibration))
+    models.sort(key=lambda m: m.seconds("serial"), reverse=True)
+
+    def fits(peak):
+        return memory_limit is None or peak <= memory_limit
+
+    # every strategy's best (makespan, n_jobs, peak), or None if it cannot fit
+    options = {}
+    for name in STRATEGIES:
+        if not models:
+            options[name] = (0.0, 1, 0)
+            continue
+        if name == "process":
+            largest = max(m.peak_bytes("serial") for m in models)
+            workers = min(cores, len(models))
+            if memory_limit is not None:
+                workers = min(workers, memory_limit // largest)
+            if workers < 1:
+                options[name] = None
+                continue
+            makespan = (_lpt([m.seconds("serial") for m in models], workers)
+                        + PROCESS_STARTUP_SECONDS * workers)
+            peak = sum(sorted((m.peak_bytes("serial") for m in models), reverse=True)[:workers])
+            options[name] = (makespan, workers, peak)
+            continue
+        jobs = cores if name == "thread" else 1
+        if name == "thread":
+            # as many threads as fit in memory
+            while jobs > 1 and not fits(max(m.peak_bytes(name, jobs) for m in models)):
+                jobs -= 1
+        peak = max(m.peak_bytes(name, jobs) for m in models)
+        options[name] = ((sum(m.seconds(name, jobs) for m in models), jobs, peak)
+                         if fits(peak) else None)
+    if cores == 1:
+        options["thread"] = options["process"] = None
+    if engine == "eigvalsh":
+        options["batched"] = None
+    elif engine == "batched":
+        options["serial"] = options["thread"] = None
+
+    if strategy is None:
+        feasible = [name for name in STRATEGIES if options[name] is not None]
+        if not feasible:
+            strategy = "batched" if engine == "batched" else "serial"
+            logger.warning("No strategy is estimated to fit in %.1f MB; planning a %s run.",
+                           memory_limit / 1024.0**2, strategy)
+        elif "serial" in feasible and options["serial"][0] < SERIAL_SECONDS:
+            strategy = "serial"
+        else:
+            strategy = min(feasible, key=lambda name: options[name][0])
+    chosen = options[strategy]
+    if chosen is None:   # forced, though it does not fit
+        jobs = min(cores, max(1, len(models))) if strategy in ("thread", "process") else 1
+        if strategy == "process":
+            makespan = _lpt([m.seconds("serial") for m in models], jobs)
+            peak = sum(sorted((m.peak_bytes("serial") for m in models), reverse=True)[:jobs])
+        else:
+            makespan = sum(m.seconds(strategy, jobs) for m in models)
+            peak = max(m.peak_bytes(strategy, jobs) for m in models)
+        chosen = (makespan, jobs, peak)
+    makespan, jobs, peak = chosen
+    if engine is None:
+        engine = "batched" if strategy == "batched" else "eigvalsh"
+    result = Plan(strategy, jobs, engine,
+                  [m.estimate() for m in models], makespan, peak,
+                  {name: None if o is None else o[0] for name, o in options.items()},
+                  cores, memory_limit, unreadable)
+    logger.info("%s", result)
+    return result
@@ -1,38 +1,110 @@
 import os
 import logging
+import threading
 
 import numpy as np
 
 from .constants import PHYSICAL_CONSTANTS, LINEARITY_THRESHOLD, DROP_NUM_LINEAR
+from . import eigencache
 from . import parsers
-from .parsers import native
+from .parsers import native, binary
 
 logger = logging.getLogger("pyquiver")
 
+# one reusable mass-weighting buffer per thread (and per shape and dtype), so
+# that repeated diagonalizations by a worker do not allocate a new 3Nx3N
+# array each time. KIE_Calculation releases its thread's buffer when it is
+# done (see release_workspaces); a pool thread's goes when the thread exits
+_workspaces = threading.local()
+
+
+def _workspace(n, dtype=np.float64):
+    buffers = _workspaces.__dict__.setdefault("buffers", {})
+    key = (n, np.dtype(dtype).str)
+    if key not in buffers:
+        buffers.clear()
+        buffers[key] = np.empty((n, n), dtype=dtype)
+    return buffers[key]
+
+
+def release_workspaces():
+    """Free the calling thread's mass-weighting buffer."""
+    _workspaces.__dict__.pop("buffers", None)
+
 # represents a geometric arrangement of atoms with specific masses
 class Isotopologue(object):
-    def __init__(self, id_, system, masses):
+    # a calculation holds many of these for its whole lifetime, so they are
+    # kept compact: slots, and no stored mass-weighted Hessian (see mw_hessian)
+    __slots__ = ("name", "system", "masses", "_eigenvalues", "_eigenvalues_dtype",
+                 "frequencies", "_frequency_key", "_reaction_mode", "active",
+                 "number_of_atoms", "cache_lookup")
+
+    def __init__(self, id_, system, masses, active=None):
         self.name = id_
         self.system = system
         self.masses = masses
+        # the eigenvalues of the mass-weighted Hessian (SI units, unscaled) are
+        # the expensive part and are kept; frequencies are derived from them
+        # and cached for the last (imag_threshold, scaling) requested
+        self.eigenvalues = None
+        # the precision the eigenvalues were computed in (they are always
+        # stored as float64, see calculate_frequencies)
+        self._eigenvalues_dtype = None
         self.frequencies = None
+        self._frequency_key = None
         self._reaction_mode = None
+        # how eigencache.lookup found (or did not find) the eigenvalues, if
+        # they were looked up at all
+        self.cache_lookup = None
+
+        # optional partial Hessian vibrational analysis (PHVA): 0-based indices
+        # of the atoms whose Hessian block is analysed; the rest are treated as
+        # frozen (infinitely heavy). None analyses the whole system.
+        self.active = None if active is None else np.asarray(active, dtype=int)
 
         self.number_of_atoms = system.number_of_atoms
-        self.mw_hessian = self.calculate_mw_hessian()
+
+    @property
+    def eigenvalues(self):
+        return self._eigenvalues
+
+    @eigenvalues.setter
+    def eigenvalues(self, value):
+        # eigenvalues from the caches, the engines or set_eigenvalues are full
+        # precision; calculate_frequencies records when they are not
+        self._eigenvalues = value
+        self._eigenvalues_dtype = None if value is None else np.dtype(np.float64)
+
+    @property
+    def mw_hessian(self):
+        """The mass-weighted Hessian, built on demand. It is not stored: once
+        the frequencies are known only they are kept, so memory scales with
+        the Hessians being diagonalized at the moment, not with the number of
+        isotopologues."""
+        return self.calculate_mw_hessian()
 
     def reaction_mode_composition(self):
         """Per-atom mass-weighted participation in the reaction mode (the most
         negative eigenvalue of the mass-weighted Hessian), as fractions summing
         to 1. An atom that is part of the reaction coordinate (e.g. a
         transferring hydrogen) carries a large fraction; a spectator carries a
-        small one. Only meaningful for a transition state."""
+        small one. Only meaningful for a transition state. Atoms outside a
+        partial (PHVA) active set carry zero."""
+        store = eigencache.active_store()
+        if self._reaction_mode is None and store is not None:
+            self._reaction_mode = store.get_reaction_mode(eigencache.isotopologue_key(self))
         if self._reaction_mode is None:
             conv_factor = PHYSICAL_CONSTANTS['Eh'] / (PHYSICAL_CONSTANTS['a0']**2 * PHYSICAL_CONSTANTS['amu'])
             _, vecs = np.linalg.eigh(self.mw_hessian * conv_factor)
             v = vecs[:, 0]   # eigh returns ascending eigenvalues; most negative first
-            per_atom = (v.reshape(self.number_of_atoms, 3) ** 2).sum(axis=1)
-            self._reaction_mode = per_atom / per_atom.sum()
+            per_atom = (v.reshape(-1, 3) ** 2).sum(axis=1)
+            composition = per_atom / per_atom.sum()
+            if self.active is not None:
+                composition, active_part = np.zeros(self.number_of_atoms), composition
+                composition[self.active] = active_part
+            self._reaction_mode = composition
+            if store is not None:
+                store.put_reaction_mode(eigencache.isotopologue_key(self), composition)
         return self._reaction_mode
 
     def __str__(self):
@@ -40,62 +112,176 @@ class Isotopologue(object):
         returnString += " masses: %s" % self.masses.__str__()
         return returnString
 
-    def calculate_mw_hessian(self):
-        # mass-weight the Hessian: H'_ij = H_ij / sqrt(m_i m_j), where each
-        # atom's mass is repeated across its three Cartesian coordinates
-        masses_ij = np.outer(np.array(self.masses), np.array(self.masses))
-        inv_sqrt_masses = 1 / np.sqrt(masses_ij)
-        inv_sqrt_masses = np.repeat(inv_sqrt_masses, 3, 0)
-        inv_sqrt_masses = np.repeat(inv_sqrt_masses, 3, 1)
-        return self.system.hessian * inv_sqrt_masses
-
-    def calculate_frequencies(self, imag_threshold, scaling=1.0, method="mass weighted hessian"):
-        # short circuit if frequencies have already been calculated
-        if self.frequencies is not None:
+    def coordinates(self):
+        # indices of the Cartesian coordinates that are analysed
+        if self.active is None:
+            return np.arange(3 * self.number_of_atoms)
+        return (3 * self.active[:, None] + np.arange(3)).ravel()
+
+    def inverse_sqrt_masses(self):
+        # 1/sqrt(m) for every analysed Cartesian coordinate
+        masses = np.asarray(self.masses, dtype=float)
+        if self.active is not None:
+            masses = masses[self.active]
+        return np.repeat(1.0 / np.sqrt(masses), 3)
+
+    def calculate_mw_hessian(self, out=None, dtype=np.float64):
+        # mass-weight the Hessian: H'_ij = H_ij / sqrt(m_i m_j), as the
+        # broadcast product of the Hessian with 1/sqrt(m) along both axes, so
+        # no full-size temporaries are needed. The result is written into
+        # out (any (3N, 3N) array, e.g. a reused buffer or a slice of a stack)
+        # if given; dtype=np.float32 halves the memory for screening work
+        inv_sqrt = self.inverse_sqrt_masses()
+        hessian = self.system.hessian
+        if self.active is not None:
+            coords = self.coordinates()
+            hessian = hessian[np.ix_(coords, coords)]
+        if out is None:
+            out = np.empty(hessian.shape, dtype=dtype)
+        np.multiply(hessian, inv_sqrt[:, None], out=out)
+        out *= inv_sqrt
+        return out
+
+    def set_eigenvalues(self, v, imag_threshold, scaling=1.0):
+        # store the eigenvalues v (SI units, unscaled) computed elsewhere, e.g.
+        # by one of the engines in pyquiver.engines, and the frequencies for
+        # this imag_threshold and scaling
+        self.eigenvalues = v
+        self.frequencies = None
+        return self.calculate_frequencies(imag_threshold, scaling)
+
+    def calculate_frequencies(self, imag_threshold, scaling=1.0, method="mass weighted hessian",
+                              dtype=np.float64):
+        # short circuit if frequencies have already been calculated with the
+        # same settings; a new scaling factor or threshold only needs the
+        # stored eigenvalues, not another diagonalization
+        # eigenvalues computed in a lower precision than requested (say, float32
+        # before a float64 request) are computed again
+        key = (imag_threshold, scaling)
+        precise = (self._eigenvalues is not None and
+                   np.finfo(dtype).precision <= np.finfo(self._eigenvalues_dtype).precision)
+        if precise and self.frequencies is not None and self._frequency_key == key:
             return self.frequencies
 
-        if method == "mass weighted hessian":
-            imaginary_freqs = []
-            small_freqs = []
+        if method != "mass weighted hessian":
+            raise ValueError("unknown frequency calculation type")
+        # full-precision eigenvalues may come from (and go to) the eigenvalue
+        # store, if one is enabled (see pyquiver.eigencache)
+        persistent = np.dtype(dtype) == np.float64
+        if not precise and not (persistent and eigencache.lookup(self)):
+            # mass-weight into this thread's workspace and apply the unit
+            # conversion to the eigenvalues rather than to the whole matrix
             conv_factor = PHYSICAL_CONSTANTS['Eh']/(PHYSICAL_CONSTANTS['a0']**2 * PHYSICAL_CONSTANTS['amu'])
+            n = len(self.coordinates())
+            mw_hessian = self.calculate_mw_hessian(out=_workspace(n, dtype))
+            self.eigenvalues = np.linalg.eigvalsh(mw_hessian).astype(np.float64) * conv_factor
+            self._eigenvalues_dtype = np.dtype(dtype)
+            if persistent:
+                eigencache.save(self)
+        self.frequencies = self.frequencies_for(imag_threshold, scaling)
+        self._frequency_key = key
+        return self.frequencies
 
-            v = np.linalg.eigvalsh(self.mw_hessian*conv_factor)
+    def frequencies_for(self, imag_threshold, scaling=1.0):
+        # frequencies from the stored eigenvalues, without touching the cache.
+        # A partial analysis has no free translations or rotations to drop:
+        # the frozen atoms pin the active block in space
+        if self.eigenvalues is None:
+            raise ValueError("eigenvalues of isotopologue %s have not been computed" % self.name)
+        return frequencies_from_eigenvalues(
+            self.eigenvalues, self.system.is_linear, imag_threshold, scaling,
+            partial=self.active is not None)
 
-            constant = scaling / (2*np.pi*PHYSICAL_CONSTANTS['c'])
-            freqs = np.sqrt(np.abs(v)) * np.sign(v) * constant
 
-            #freqs2 = [ np.copysign(np.sqrt(np.abs(freq)),freq) * constant for freq in v ]
-            #assert np.allclose(np.array(freqs), freqs2)
+def frequencies_from_eigenvalues(v, is_linear, imag_threshold, scaling=1.0, partial=False):
+    """Turn the eigenvalues of a mass-weighted Hessian (SI units, s^-2) into the
+    ``(small_freqs, imaginary_freqs, regular_freqs, n_small)`` tuple returned by
+    :meth:`Isotopologue.calculate_frequencies`. For a ``partial`` (PHVA)
+    Hessian no rigid-body modes are dropped.
 
-            freqs.sort()
+    Split out so that engines which diagonalize many isotopologues at once can
+    share the exact post-processing of the one-at-a-time path.
+    """
+    constant = scaling / (2*np.pi*PHYSICAL_CONSTANTS['c'])
+    freqs = np.sqrt(np.abs(v)) * np.sign(v) * constant
 
-            imaginary_freqs = []
-            small_freqs = []
-            regular_freqs = []
+    #freqs2 = [ np.copysign(np.sqrt(np.abs(freq)),freq) * constant for freq in v ]
+    #assert np.allclose(np.array(freqs), freqs2)
 
-            # detect imaginary frequencies
-            for f in freqs:
-                if f < -imag_threshold:
-                    imaginary_freqs.append(f)
+    freqs.sort()
 
-            if len(imaginary_freqs) > 1:
-                logger.warning("multiple imaginary frequencies detected")
+    imaginary_freqs = []
+    small_freqs = []
+    regular_freqs = []
 
-            # strip the imaginary frequencies
-            freqs = freqs[len(imaginary_freqs):]
+    # detect imaginary frequencies
+    for f in freqs:
+        if f < -imag_threshold:
+            imaginary_freqs.append(f)
 
-            if self.system.is_linear:
-                small_freqs = freqs[:DROP_NUM_LINEAR]
-                regular_freqs = freqs[DROP_NUM_LINEAR:]
-            else:
-                small_freqs = freqs[:1+DROP_NUM_LINEAR]
-                regular_freqs = freqs[1+DROP_NUM_LINEAR:]
+    if len(imaginary_freqs) > 1:
+        logger.warning("multiple imaginary frequencies detected")
 
-            # bugfix 2/6/20: third argument is regular_freqs, not freqs!
-            self.frequencies = (small_freqs, imaginary_freqs, np.array(regular_freqs), len(small_freqs))
-            return self.frequencies
-        else:
-            raise ValueError("unknown frequency calculation type")
+    # strip the imaginary frequencies
+    freqs = freqs[len(imaginary_freqs):]
+
+    if partial:
+        small_freqs = freqs[:0]
+        regular_freqs = freqs
+    elif is_linear:
+        small_freqs = freqs[:DROP_NUM_LINEAR]
+        regular_freqs = freqs[DROP_NUM_LINEAR:]
+    else:
+        small_freqs = freqs[:1+DROP_NUM_LINEAR]
+        regular_freqs = freqs[1+DROP_NUM_LINEAR:]
+
+    # bugfix 2/6/20: third argument is regular_freqs, not freqs!
+    return (small_freqs, imaginary_freqs, np.array(regular_freqs), len(small_freqs))
+
+
+def select_active_atoms(system, selection, substituted=()):
+    """Resolve a PHVA atom selection for ``system`` to sorted 0-based indices.
+
+    ``selection`` is ``None`` (the whole system), ``"auto"`` (drop frozen
+    atoms, i.e. atoms whose Hessian rows are all zero), a number (keep atoms
+    within that many angstroms of any atom in ``substituted``), or a sequence
+    of 1-indexed atom numbers. ``substituted`` holds the 0-based indices of the
+    atoms that carry isotopic substitutions; they must all be active. Returns
+    ``None`` when every atom is active, so a full analysis is done instead.
+    """
+    n = system.number_of_atoms
+    substituted = np.asarray(sorted(set(substituted)), dtype=int)
+    if selection is None:
+        return None
+    if isinstance(selection, str):
+        if selection != "auto":
+            raise ValueError("unknown active atom selection: %s" % selection)
+        rows = np.abs(system.hessian).reshape(n, 3, -1).max(axis=(1, 2))
+        active = np.flatnonzero(rows > 0.0)
+    elif np.isscalar(selection):
+        radius = float(selection)
+        if radius <= 0.0:
+            raise ValueError("PHVA radius must be positive")
+        positions = system.positions_angstrom
+        if len(substituted) == 0:
+            return None
+        dist = np.linalg.norm(positions[:, None, :] - positions[None, substituted, :], axis=2)
+        active = np.flatnonzero(dist.min(axis=1) <= radius)
+    else:
+        active = np.unique(np.asarray(selection, dtype=int)) - 1
+        if len(active) and (active[0] < 0 or active[-1] >= n):
+            raise ValueError("active atom numbers must be between 1 and %d" % n)
+
+    missing = np.setdiff1d(substituted, active)
+    if len(missing):
+        raise ValueError("substituted atoms must be active in a partial Hessian "
+                         "analysis of %s; inactive: %s"
+                         % (system.filename, ", ".join(str(i + 1) for i in missing)))
+    if len(active) == n:
+        return None
+    logger.info("Partial Hessian analysis of %s: %d of %d atoms active.",
+                system.filename, len(active), n)
+    return active
 
 
 class System(object):
@@ -107,7 +293,19 @@ class System(object):
 
         logger.info("Reading data from %s with style %s", outfile, style)
 
-        parsed = parsers.parse(outfile, style)
+        self._assign(parsers.parse(outfile, style))
+
+    @classmethod
+    def from_parsed(cls, parsed, filename=None):
+        """Build a System from a :class:`~pyquiver.parsers.ParsedSystem` (or
+        anything with the same three fields) without reading a file."""
+        self = cls.__new__(cls)
+        self.filename = filename
+        self.is_linear = True
+        self._assign(parsed)
+        return self
+
+    def _assign(self, parsed):
         self.atomic_numbers = parsed.atomic_numbers
         self.number_of_atoms = len(parsed.atomic_numbers)
         self.hessian = parsed.hessian
@@ -117,6 +315,21 @@ class System(object):
 
         self._detect_linear()
 
+    @property
+    def hessian(self):
+        return self._hessian
+
+    @hessian.setter
+    def hessian(self, value):
+        # a new Hessian needs a new digest in the eigenvalue caches
+        self._hessian = value
+        self._hessian_digest = None
+
+    def hessian_digest(self):
+        """SHA-256 (hex) of the Hessian, computed once; it identifies this
+        system's Hessian in the eigenvalue caches (see pyquiver.eigencache)."""
+        return eigencache.hessian_digest(self)
+
     def _detect_linear(self):
         # take every pair of bonds sharing atom 0; if any pair is sufficiently
         # non-parallel the molecule is non-linear
@@ -136,8 +349,17 @@ class System(object):
         logger.debug("Molecule is %s.", "linear" if self.is_linear else "not linear")
 
     def dump_pyquiver_input_file(self, extension=".qin"):
+        # stream the native .qin format next to the input file, then return
+        # its text as before
         path = os.path.splitext(self.filename)[0] + extension
-        serial = native.serialize(self)
         with open(path, 'w') as f:
-            f.write(serial)
-        return serial
+            native.write(self, f)
+        with open(path) as f:
+            return f.read()
+
+    def dump_pyquiver_binary_file(self, extension=".qinb"):
+        # write the binary .qinb format next to the input file; returns the
+        # path of the new file
+        path = os.path.splitext(self.filename)[0] + extension
+        binary.write(self, path)
+        return path
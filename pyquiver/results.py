@@ -15,6 +15,31 @@ KIEResult = namedtuple("KIEResult",
 # named view of an equilibrium isotope effect
 EIEResult = namedtuple("EIEResult", ["name", "value"])
 
+# one row of KIE_Calculation.screen: the approximate rpfr_gs / rpfr_ts and, when
+# validated, the exact ratio and the relative error of the estimate
+ScreenResult = namedtuple("ScreenResult",
+                          ["name", "gs_rpfr", "ts_rpfr", "value", "exact", "error"])
+
+# Arrhenius fit of one isotopologue's column of a temperature sweep: the
+# prefactor ratio A_light/A_heavy and dEa = Ea_light - Ea_heavy in kJ/mol
+# (label is the batch label and scaling the swept scaling factor, or None)
+ArrheniusFit = namedtuple("ArrheniusFit",
+                          ["label", "name", "scaling", "column", "prefactor_ratio",
+                           "delta_ea"])
+
+# one k-label combination of KIE_Calculation.combinations: the rule of the
+# geometric mean estimate, its predicted relative deviation, the exact value if
+# the deviation called for one (else None), and the value to use
+CombinationResult = namedtuple("CombinationResult",
+                               ["name", "sites", "estimate", "deviation", "exact", "value"])
+
+# one pair of a batch run in worker processes (see pyquiver.workers): its
+# KIEResult/EIEResult rows, whether they are EIEs, the Skodje-Truhlar values if
+# energies were given, the error (a traceback) if the pair failed, and the
+# wall time in seconds
+PairResult = namedtuple("PairResult",
+                        ["label", "results", "eie", "skodje_truhlar", "error", "elapsed"])
+
 
 class Results(object):
     """Ordered, tabular view of a KIE_Calculation's isotopologue results."""
@@ -0,0 +1,126 @@
+"""Streaming writers for batch results.
+
+:func:`~pyquiver.batch.iter_results` yields a
+:class:`~pyquiver.results.PairResult` per pair as it completes; a sink
+appends each one to a file straight away and flushes every ``flush_every``
+records or ``flush_seconds`` seconds, so a campaign's memory does not grow
+with the number of pairs and a job that is killed leaves everything finished
+so far on disk::
+
+    from pyquiver.batch import iter_results
+    from pyquiver.sinks import CSVSink
+
+    with CSVSink("results.csv") as sink:
+        sink.write_all(iter_results("demo.config", pairs, executor="process"))
+
+Both sinks append to an existing file, so a restarted campaign extends it.
+"""
+
+import csv
+import json
+import logging
+import os
+import time
+
+from .batch import _rows
+
+logger = logging.getLogger("pyquiver")
+
+
+class _Sink(object):
+    # an append-mode file, flushed periodically
+    def __init__(self, path, flush_every=100, flush_seconds=10.0):
+        if flush_every < 1:
+            raise ValueError("flush_every must be at least 1")
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.written = 0   # pairs written
+        self.failed = 0    # pairs that failed
+        self._file = open(path, "a", newline="")
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    def write(self, record):
+        """Append one PairResult, flushing if it is time to."""
+        if record.error is not None:
+            self.failed += 1
+        self._write(record)
+        self.written += 1
+        self._unflushed += 1
+        if (self._unflushed >= self.flush_every or
+                time.monotonic() - self._flushed_at >= self.flush_seconds):
+            self.flush()
+
+    def write_all(self, records):
+        """Append every record of an iterable (e.g. ``iter_results(...)``);
+        returns the sink."""
+        for record in records:
+            self.write(record)
+        return self
+
+    def flush(self):
+        """Hand everything written so far to the operating system."""
+        self._file.flush()
+        self._unflushed = 0
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CSVSink(_Sink):
+    """Append the rows of each pair (as in ``BatchResults.to_csv``: a label
+    column, then one row per isotopologue) to a CSV file. The header is
+    written with the first row, or taken from the file when appending to an
+    earlier run. Failed pairs have no rows; they are only counted
+    (``failed``) and logged by ``iter_results``."""
+
+    def __init__(self, path, float_format="%.4f", flush_every=100, flush_seconds=10.0):
+        existing = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, newline="") as f:
+                existing = next(csv.reader(f), None)
+        super(CSVSink, self).__init__(path, flush_every, flush_seconds)
+        self.float_format = float_format
+        self.columns = existing
+        self._writer = csv.writer(self._file, lineterminator="\n")
+
+    def _cell(self, v):
+        if v is None:
+            return ""
+        return self.float_format % v if isinstance(v, float) else str(v)
+
+    def _write(self, record):
+        if record.error is not None:
+            return
+        for row in _rows(record.label, record.results, record.skodje_truhlar):
+            if self.columns is None:
+                self.columns = list(row.keys())
+                self._writer.writerow(self.columns)
+            self._writer.writerow([self._cell(row.get(c)) for c in self.columns])
+
+
+class JSONLSink(_Sink):
+    """Append one JSON object per pair to a JSON Lines file: ``label``,
+    ``eie``, ``results`` (a list of row objects), ``skodje_truhlar``,
+    ``error`` and ``elapsed``. Failed pairs are written too, with their
+    ``error``."""
+
+    def _write(self, record):
+        st = record.skodje_truhlar
+        line = {"label": record.label,
+                "eie": record.eie,
+                "results": [r._asdict() for r in record.results],
+                "skodje_truhlar": None if st is None else {k: float(v) for k, v in st.items()},
+                "error": record.error,
+                "elapsed": record.elapsed}
+        self._file.write(json.dumps(line) + "\n")
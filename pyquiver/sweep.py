@@ -0,0 +1,258 @@
+"""Temperature sweeps of a finished KIE/EIE calculation.
+
+Frequencies do not depend on temperature, so a KIE(T) curve only needs the
+frequencies a :class:`~pyquiver.KIE_Calculation` has already computed. The
+reduced partition function ratios and the Wigner, Bell (infinite parabola)
+and Skodje-Truhlar corrections are evaluated for every temperature at once,
+as arrays over a (temperature x isotopologue x mode) grid, and the result is
+one tidy table with an Arrhenius fit per isotopologue::
+
+    calc = KIE_Calculation("demo.config", "gs.out", "ts.out")
+    curve = calc.sweep(np.linspace(250, 400, 100))
+    curve.to_dataframe()       # temperature, name, uncorrected, wigner, ...
+    curve.arrhenius()          # one ArrheniusFit (A_L/A_H, dEa) per isotopologue
+
+``BatchResults.sweep`` does the same for every pair of a :func:`~pyquiver.batch`
+run and adds a ``label`` column.
+"""
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from .constants import PHYSICAL_CONSTANTS
+from .results import ArrheniusFit
+
+logger = logging.getLogger("pyquiver")
+
+h = PHYSICAL_CONSTANTS["h"]    # J s
+c = PHYSICAL_CONSTANTS["c"]    # cm / s
+kB = PHYSICAL_CONSTANTS["kB"]  # J / K
+R = kB * PHYSICAL_CONSTANTS["NA"]  # J / (mol K)
+
+# the (temperature x isotopologue x mode) grid is evaluated in blocks of
+# isotopologues holding at most this many elements per array
+_GRID_ELEMENTS = 2**21
+
+
+class SweepResults(object):
+    """Tidy results of a temperature sweep: one row per (temperature,
+    isotopologue), plus a leading ``label`` column for a batch sweep or
+    ``scaling`` column for a scaling-factor sweep."""
+
+    def __init__(self, columns, records):
+        self.columns = list(columns)
+        self._records = records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def to_records(self):
+        """Return a list of dicts, one per (temperature, isotopologue)."""
+        return [dict(r) for r in self._records]
+
+    def to_dataframe(self):
+        """Return a pandas DataFrame (requires the optional pandas extra)."""
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError("to_dataframe requires pandas; install with "
+                              "`pip install pyquiver-kie[pandas]`")
+        return pd.DataFrame(self.to_records(), columns=self.columns)
+
+    def to_csv(self, path=None, float_format="%.4f"):
+        """Render the sweep as CSV text; write to ``path`` if given."""
+        def cell(v):
+            return float_format % v if isinstance(v, float) else str(v)
+
+        lines = [",".join(self.columns)]
+        lines += [",".join(cell(r[col]) for col in self.columns) for r in self._records]
+        text = "\n".join(lines) + "\n"
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def arrhenius(self, column=None):
+        """Fit ln(value) = ln(A_light/A_heavy) - dEa/(R T) for each isotopologue
+        (and each label and scaling factor, when the table has those columns).
+
+        ``column`` defaults to ``infinite_parabola`` for a KIE and ``value``
+        for an EIE. ``delta_ea`` is Ea(light) - Ea(heavy) in kJ/mol (for an EIE,
+        the corresponding reaction enthalpy difference). Returns a list of
+        :class:`~pyquiver.results.ArrheniusFit`, in table order.
+        """
+        if column is None:
+            column = "value" if "value" in self.columns else "infinite_parabola"
+        if column not in self.columns or column in ("label", "scaling", "name", "temperature"):
+            raise ValueError("cannot fit column %r" % column)
+
+        groups = OrderedDict()
+        for r in self._records:
+            groups.setdefault((r.get("label"), r["name"], r.get("scaling")), []).append(
+                (r["temperature"], r[column]))
+
+        fits = []
+        for (label, name, scaling), points in groups.items():
+            temperatures, values = np.array(points, dtype=float).T
+            if len(np.unique(temperatures)) < 2:
+                raise ValueError("an Arrhenius fit needs at least two temperatures")
+            slope, intercept = np.polyfit(1.0 / temperatures, np.log(values), 1)
+            fits.append(ArrheniusFit(label, name, scaling, column, float(np.exp(intercept)),
+                                     float(-slope * R / 1000.0)))
+        return fits
+
+
+def _temperature_grid(temperatures):
+    temperatures = np.atleast_1d(np.asarray(temperatures, dtype=float))
+    if temperatures.ndim != 1 or len(temperatures) == 0:
+        raise ValueError("temperatures must be a non-empty sequence")
+    if not np.all(temperatures > 0.0):
+        raise ValueError("temperatures must be positive")
+    return temperatures
+
+
+def _padded(frequencies):
+    # stack ragged per-isotopologue frequency lists into one array; the
+    # padding is 1 cm^-1 in both the light and heavy arrays, which contributes
+    # a factor of exactly 1 to the partition function ratio
+    width = max([len(f) for f in frequencies] + [1])
+    grid = np.ones((len(frequencies), width))
+    for i, f in enumerate(frequencies):
+        grid[i, :len(f)] = f
+    return grid
+
+
+def log_rpfr_grid(light, heavy, temperatures):
+    """ln of the reduced partition function ratio for every temperature and
+    isotopologue: ``light``/``heavy`` are lists of per-isotopologue frequency
+    arrays (cm^-1, as from ``calculate_frequencies``), and the result has shape
+    ``(len(temperatures), len(light))``. The same terms as
+    :func:`~pyquiver.kie.partition_components`, summed as logarithms."""
+    light, heavy = _padded(light), _padded(heavy)
+    beta = (h * c / (kB * temperatures))[:, None, None]
+    out = np.empty((len(temperatures), len(light)))
+    block = max(1, _GRID_ELEMENTS // (len(temperatures) * light.shape[1]))
+    for start in range(0, len(light), block):
+        stop = start + block
+        u_light = beta * light[None, start:stop]
+        u_heavy = beta * heavy[None, start:stop]
+        # the sign of a small negative (non-imaginary) mode cancels in each
+        # ratio, as it does in partition_components
+        product = np.log(np.abs(heavy[start:stop] / light[start:stop])).sum(axis=-1)
+        excitation = np.log(np.abs(np.expm1(-u_light) / np.expm1(-u_heavy)))
+        out[:, start:stop] = product + (excitation + 0.5 * (u_light - u_heavy)).sum(axis=-1)
+    return out
+
+
+def _tunnelling_grid(heavy_imag, light_imag, temperatures):
+    # vectorized kie.wigner and kie.bell: (temperature x isotopologue) factors
+    u_light = (h * c / kB) * light_imag[None, :] / temperatures[:, None]
+    u_heavy = (h * c / kB) * heavy_imag[None, :] / temperatures[:, None]
+    wigner = (1.0 + u_light**2 / 24.0) / (1.0 + u_heavy**2 / 24.0)
+    bell = (u_light / u_heavy) * (np.sin(u_heavy / 2.0) / np.sin(u_light / 2.0))
+    return wigner, bell
+
+
+def _skodje_truhlar_grid(heavy_imag, light_imag, temperatures, barrier):
+    # vectorized tunneling.skodje_truhlar: kappa_light / kappa_heavy
+    beta = 1.0 / (kB * temperatures[:, None])
+
+    def kappa(imag):
+        alpha = 2.0 * np.pi / (h * np.abs(imag[None, :] * c))
+        bpa = beta * np.pi / alpha
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            above = bpa / np.sin(bpa) - beta / (alpha - beta) * np.exp((beta - alpha) * barrier)
+            below = beta / (beta - alpha) * (np.exp((beta - alpha) * barrier) - 1.0)
+        return np.where(alpha > beta, above, below), alpha < beta
+
+    light, light_below = kappa(light_imag)
+    heavy, heavy_below = kappa(heavy_imag)
+    crossed = light_below | heavy_below
+    if crossed.any():
+        logger.warning("%d of %d temperatures are below the Skodje-Truhlar "
+                       "crossover for an imaginary mode; the correction diverges "
+                       "in this deep-tunnelling regime and should not be trusted",
+                       crossed.any(axis=1).sum(), len(temperatures))
+    return light / heavy
+
+
+def sweep_calculation(calc, temperatures, barrier=None, scaling=None):
+    """The body of :meth:`KIE_Calculation.sweep`: ``barrier`` is in joules
+    (or None for no Skodje-Truhlar column), and ``scaling`` overrides the
+    configured frequency scaling factor. Returns :class:`SweepResults`."""
+    temperatures = _temperature_grid(temperatures)
+    config = calc.config
+    names = list(calc.KIES)
+    kies = [calc.KIES[name] for name in names]
+
+    def frequencies(tup):
+        if scaling is None:
+            return [iso.calculate_frequencies(config.imag_threshold, scaling=config.scaling)
+                    for iso in tup]
+        return [iso.frequencies_for(config.imag_threshold, scaling) for iso in tup]
+
+    gs = [frequencies(k.gs_tuple) for k in kies]
+    ts = [frequencies(k.ts_tuple) for k in kies]
+    log_ratio = (log_rpfr_grid([f[0][2] for f in gs], [f[1][2] for f in gs], temperatures)
+                 - log_rpfr_grid([f[0][2] for f in ts], [f[1][2] for f in ts], temperatures))
+    value = np.exp(log_ratio)
+
+    ref = config.reference_isotopologue
+    has_ref = ref not in ("default", "none")
+    ref_index = names.index(ref) if has_ref else None
+
+    def referenced(grid):
+        # divide every isotopologue by the reference at the same temperature
+        # (the reference's own rows are left out of the table, as in Results)
+        return grid / grid[:, [ref_index]] if has_ref else grid
+
+    if calc.eie_flag == 1:
+        columns = ["temperature", "name", "value"]
+        grids = [referenced(value)]
+    else:
+        light_imag = np.array([f[0][1][0] for f in ts])
+        heavy_imag = np.array([f[1][1][0] for f in ts])
+        uncorrected = value * (light_imag / heavy_imag)[None, :]
+        wigner, bell = _tunnelling_grid(heavy_imag, light_imag, temperatures)
+        columns = ["temperature", "name", "uncorrected", "wigner", "infinite_parabola"]
+        uncorrected_ref = referenced(uncorrected)
+        grids = [uncorrected_ref, referenced(uncorrected * wigner),
+                 referenced(uncorrected * bell)]
+        if barrier is not None:
+            # as KIE_Calculation.skodje_truhlar: the referenced uncorrected
+            # KIE times the referenced ratio of the corrections
+            ratio = _skodje_truhlar_grid(heavy_imag, light_imag, temperatures, barrier)
+            columns.append("skodje_truhlar")
+            grids.append(uncorrected_ref * referenced(ratio))
+
+    keep = [i for i, name in enumerate(names) if not (has_ref and name == ref)]
+    records = []
+    for t, temperature in enumerate(temperatures):
+        for i in keep:
+            row = OrderedDict([("temperature", float(temperature)), ("name", names[i])])
+            for column, grid in zip(columns[2:], grids):
+                row[column] = float(grid[t, i])
+            records.append(row)
+    logger.debug("Swept %d isotopologues over %d temperatures.", len(keep), len(temperatures))
+    return SweepResults(columns, records)
+
+
+def sweep_scaling(calc, scalings, temperatures, barrier=None):
+    """The body of :meth:`KIE_Calculation.sweep_scaling`: one temperature
+    sweep per scaling factor, from the stored (unscaled) eigenvalues, as one
+    table with a leading ``scaling`` column."""
+    scalings = np.atleast_1d(np.asarray(scalings, dtype=float))
+    if scalings.ndim != 1 or len(scalings) == 0 or not np.all(scalings > 0.0):
+        raise ValueError("scalings must be a non-empty sequence of positive numbers")
+    columns, records = None, []
+    for scaling in scalings:
+        result = sweep_calculation(calc, temperatures, barrier, float(scaling))
+        columns = ["scaling"] + result.columns
+        for row in result:
+            records.append(OrderedDict([("scaling", float(scaling))] + list(row.items())))
+    return SweepResults(columns, records)
@@ -0,0 +1,177 @@
+"""Symmetry-equivalent isotopologues.
+
+Isotopologues related by a symmetry operation of the molecule (the two
+ortho carbons of a phenyl ring, the mirror-image hydrogens of a methylene)
+have identical mass-weighted Hessian spectra, so only one of them needs to be
+diagonalized. This module finds the point-group operations of a
+:class:`~pyquiver.quiver.System` and uses them to group isotopologues:
+
+* :func:`symmetry_operations` finds every orthogonal transformation (about
+  the atomic-number-weighted centroid) that maps the geometry onto itself,
+  as a rotation matrix plus an atom permutation, and keeps only those the
+  Hessian is invariant under as well.
+* :func:`equivalent_atoms` labels each atom with its equivalence class.
+* :func:`deduplicate` maps every isotopologue pair of a calculation onto a
+  representative; ``KIE_Calculation(..., symmetry=True)`` computes the
+  representatives and copies their eigenvalues to the rest.
+
+Operations are found from two reference atoms: every candidate image of that
+pair fixes an orthogonal matrix (fitted by SVD, as in the Kabsch algorithm),
+which is then checked against all atoms. Linear molecules are left alone.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("pyquiver")
+
+# geometric tolerance (angstroms) for an atom to map onto another
+GEOMETRY_TOLERANCE = 0.01
+# largest deviation of the transformed Hessian, relative to its largest element
+HESSIAN_TOLERANCE = 1e-3
+
+
+def _centered(system):
+    z = np.asarray(system.atomic_numbers, dtype=float)
+    positions = np.asarray(system.positions_angstrom, dtype=float)
+    return positions - (z[:, None] * positions).sum(axis=0) / z.sum()
+
+
+def _match(transformed, positions, atomic_numbers, tol):
+    # the atom each transformed position lands on, or None if any misses or
+    # two land on the same atom
+    dist = np.linalg.norm(transformed[:, None, :] - positions[None, :, :], axis=2)
+    dist[atomic_numbers[:, None] != atomic_numbers[None, :]] = np.inf
+    perm = dist.argmin(axis=1)
+    if not np.all(dist[np.arange(len(perm)), perm] < tol):
+        return None
+    if len(np.unique(perm)) != len(perm):
+        return None
+    return perm
+
+
+def _hessian_invariant(hessian, rotation, perm, tol):
+    # H_{perm(i) perm(j)} = R H_ij R^T for every 3x3 block
+    n = len(perm)
+    blocks = hessian.reshape(n, 3, n, 3)
+    rotated = np.einsum("ab,ibjc,dc->iajd", rotation, blocks, rotation, optimize=True)
+    permuted = blocks[perm][:, :, perm, :]
+    scale = np.abs(hessian).max()
+    return np.abs(rotated - permuted).max() <= tol * scale
+
+
+def symmetry_operations(system, tol=GEOMETRY_TOLERANCE, hessian_tol=HESSIAN_TOLERANCE):
+    """Return the symmetry operations of ``system`` as ``(rotation, perm)``
+    pairs, identity first: ``rotation`` is a 3x3 orthogonal matrix and atom
+    ``i`` is carried onto atom ``perm[i]``. Only one operation is kept per
+    permutation (in a planar molecule, an operation and its product with the
+    molecular plane permute the atoms alike). Operations that hold for the
+    geometry but not for the Hessian (to ``hessian_tol`` relative to its
+    largest element) are discarded."""
+    n = system.number_of_atoms
+    identity = (np.eye(3), np.arange(n))
+    positions = _centered(system)
+    atomic_numbers = np.asarray(system.atomic_numbers)
+    radii = np.linalg.norm(positions, axis=1)
+
+    # atoms can only map onto atoms of the same element at the same distance
+    # from the centroid; take the reference atoms from the smallest such sets
+    def candidates(i):
+        return [j for j in range(n) if atomic_numbers[j] == atomic_numbers[i]
+                and abs(radii[j] - radii[i]) < tol]
+
+    order = sorted((i for i in range(n) if radii[i] > tol),
+                   key=lambda i: len(candidates(i)))
+    if not order:
+        return [identity]
+    a = order[0]
+    b = next((i for i in order
+              if np.linalg.norm(np.cross(positions[a], positions[i])) > tol * radii[a]), None)
+    if b is None:
+        logger.debug("%s is linear; no symmetry operations are used.",
+                     getattr(system, "filename", "system"))
+        return [identity]
+
+    basis = np.column_stack([positions[a], positions[b],
+                             np.cross(positions[a], positions[b])])
+    inverse = np.linalg.inv(basis)
+    distance_ab = np.linalg.norm(positions[a] - positions[b])
+
+    operations = [identity]
+    seen = {identity[1].tobytes()}
+    for a2 in candidates(a):
+        for b2 in candidates(b):
+            if a2 == b2 or abs(np.linalg.norm(positions[a2] - positions[b2]) - distance_ab) > 2 * tol:
+                continue
+            normal = np.cross(positions[a2], positions[b2])
+            for sign in (1.0, -1.0):
+                image = np.column_stack([positions[a2], positions[b2], sign * normal])
+                u, _, vt = np.linalg.svd(image @ inverse)
+                rotation = u @ vt
+                perm = _match(positions @ rotation.T, positions, atomic_numbers, tol)
+                if perm is None or perm.tobytes() in seen:
+                    continue
+                seen.add(perm.tobytes())
+                if _hessian_invariant(system.hessian, rotation, perm, hessian_tol):
+                    operations.append((rotation, perm))
+                else:
+                    logger.debug("Geometric symmetry operation of %s rejected by the Hessian.",
+                                 getattr(system, "filename", "system"))
+    logger.info("Found %d symmetry operations for %s.", len(operations),
+                getattr(system, "filename", "system"))
+    return operations
+
+
+def equivalent_atoms(system, operations=None):
+    """Label each atom of ``system`` with the smallest (0-based) index of the
+    atoms it is symmetry-equivalent to."""
+    if operations is None:
+        operations = symmetry_operations(system)
+    # the operations form a group, so the images of an atom are its orbit
+    return np.min([perm for _, perm in operations], axis=0)
+
+
+def _invariant(operations, reference_masses, active):
+    # operations that also preserve the reference masses and the PHVA active
+    # set, so that the substitution pattern is all that distinguishes
+    # isotopologues
+    reference_masses = np.asarray(reference_masses, dtype=float)
+    kept = []
+    for rotation, perm in operations:
+        if not np.array_equal(reference_masses[perm], reference_masses):
+            continue
+        if active is not None and not np.array_equal(np.sort(perm[active]), active):
+            continue
+        kept.append(perm)
+    return kept
+
+
+def _canonical(perms, reference_masses, masses):
+    # the substitution pattern {(atom, mass)} in a form that is the same for
+    # every symmetry-equivalent pattern: the smallest of its images
+    masses = np.asarray(masses, dtype=float)
+    changed = np.flatnonzero(masses != np.asarray(reference_masses, dtype=float))
+    images = [tuple(sorted(zip(perm[changed].tolist(), masses[changed].tolist())))
+              for perm in perms]
+    return min(images)
+
+
+def deduplicate(iso_pairs, gs_operations, ts_operations):
+    """Map each ``((gs_ref, gs_sub), (ts_ref, ts_sub))`` pair (as yielded by
+    ``KIE_Calculation.make_isotopologues``) to the index of the first pair that
+    is equivalent to it in both the ground and transition states. Returns a
+    list of indices; a pair that is its own representative maps to itself."""
+    if not iso_pairs:
+        return []
+    (gs_ref, _), (ts_ref, _) = iso_pairs[0]
+    gs_perms = _invariant(gs_operations, gs_ref.masses, gs_ref.active)
+    ts_perms = _invariant(ts_operations, ts_ref.masses, ts_ref.active)
+
+    first = {}
+    representatives = []
+    for index, ((gs_ref, gs_sub), (ts_ref, ts_sub)) in enumerate(iso_pairs):
+        key = (_canonical(gs_perms, gs_ref.masses, gs_sub.masses),
+               _canonical(ts_perms, ts_ref.masses, ts_sub.masses))
+        representatives.append(first.setdefault(key, index))
+    return representatives
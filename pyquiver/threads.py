@@ -0,0 +1,208 @@
+"""Coordinated BLAS thread counts for parallel runs.
+
+``np.linalg.eigvalsh`` hands its work to the BLAS/LAPACK library numpy is
+linked against, and OpenBLAS, MKL and BLIS each start a thread per core. When
+``KIE_Calculation(n_jobs=8)`` runs eight diagonalizations in threads (or
+``batch(..., executor="process")`` runs eight workers), every one of them
+would use all the cores, and the oversubscribed run can be slower than a
+serial one. With the default ``blas_threads="auto"`` PyQuiver therefore caps
+the BLAS threads at ``cores // workers`` for the duration of the calculation
+or batch and restores the previous setting afterwards::
+
+    from pyquiver import threads
+    threads.blas_info()            # [{"backend": "openblas", "path": ..., "num_threads": 64}]
+    with threads.limit_blas_threads(4):
+        ...
+
+The limit is process-wide, as the BLAS libraries' own settings are: limits
+in force at the same time (nested, or entered from several threads) share
+one setting, the smallest of them, and the previous counts come back when
+the last one exits. If `threadpoolctl <https://github.com/joblib/threadpoolctl>`_
+is installed it does the detection and limiting; otherwise the OpenBLAS, MKL
+and BLIS libraries loaded into the process are found through
+``/proc/self/maps`` (Linux only), once, and their thread counts set directly;
+a BLAS library loaded after that first search is not seen. Elsewhere no BLAS
+is detected and the limits do nothing.
+"""
+
+import ctypes
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+logger = logging.getLogger("pyquiver")
+
+# backend, library filename pattern, and the (set, get) function names to try
+_BACKENDS = [
+    ("openblas", re.compile(r"openblas"),
+     [("openblas_set_num_threads", "openblas_get_num_threads"),
+      ("openblas_set_num_threads64_", "openblas_get_num_threads64_"),
+      ("scipy_openblas_set_num_threads64_", "scipy_openblas_get_num_threads64_"),
+      ("scipy_openblas_set_num_threads", "scipy_openblas_get_num_threads")]),
+    ("mkl", re.compile(r"mkl_rt"), [("MKL_Set_Num_Threads", "MKL_Get_Max_Threads")]),
+    ("blis", re.compile(r"libblis"),
+     [("bli_thread_set_num_threads", "bli_thread_get_num_threads")]),
+]
+
+_Library = namedtuple("_Library", ["backend", "path", "set", "get"])
+
+# the libraries found by _loaded_libraries, kept for the rest of the process
+_libraries = None
+
+# the limits in force (one n per limit_blas_threads block being run, from any
+# thread), and how to restore the counts from before the first of them
+_limits_lock = threading.Lock()
+_limits = []
+_restore = None
+
+
+def _threadpoolctl():
+    try:
+        import threadpoolctl
+    except ImportError:
+        return None
+    return threadpoolctl
+
+
+def _loaded_libraries():
+    # the BLAS libraries mapped into this process, found on the first call and
+    # cached in _libraries from then on: a BLAS loaded later (say, by a module
+    # imported afterwards) is never seen unless _libraries is reset to None
+    global _libraries
+    if _libraries is not None:
+        return _libraries
+    import numpy.linalg  # noqa: F401  (make sure numpy's BLAS is loaded)
+    paths = []
+    try:
+        with open("/proc/self/maps") as f:
+            for line in f:
+                path = line.split(None, 5)[-1].strip()
+                if path.startswith("/") and path not in paths:
+                    paths.append(path)
+    except OSError:   # not Linux
+        pass
+    libraries = []
+    for path in paths:
+        name = os.path.basename(path)
+        for backend, pattern, functions in _BACKENDS:
+            if not pattern.search(name):
+                continue
+            try:
+                library = ctypes.CDLL(path)
+            except OSError:
+                break
+            for set_name, get_name in functions:
+                if hasattr(library, set_name) and hasattr(library, get_name):
+                    setter = getattr(library, set_name)
+                    setter.argtypes = [ctypes.c_int]
+                    setter.restype = None
+                    libraries.append(_Library(backend, path, setter, getattr(library, get_name)))
+                    break
+            break
+    _libraries = libraries
+    return libraries
+
+
+def blas_info():
+    """The BLAS libraries in use: a list of ``{"backend": ..., "path": ...,
+    "num_threads": ...}``, empty if none could be detected."""
+    threadpoolctl = _threadpoolctl()
+    if threadpoolctl is not None:
+        return [{"backend": info["internal_api"], "path": info["filepath"],
+                 "num_threads": info["num_threads"]}
+                for info in threadpoolctl.threadpool_info() if info["user_api"] == "blas"]
+    return [{"backend": lib.backend, "path": lib.path, "num_threads": int(lib.get())}
+            for lib in _loaded_libraries()]
+
+
+def cpu_count():
+    """The number of cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:   # not available on macOS and Windows
+        return os.cpu_count() or 1
+
+
+def blas_threads_for(n_jobs, blas_threads="auto", cores=None):
+    """The BLAS thread count for each of ``n_jobs`` workers, or None to leave
+    BLAS alone.
+
+    ``blas_threads`` is ``"auto"`` (``cores // workers`` when there is more
+    than one worker, so that workers x BLAS threads <= cores), a positive
+    integer, or None. A negative ``n_jobs`` means one worker per core.
+    """
+    if blas_threads is None:
+        return None
+    if cores is None:
+        cores = cpu_count()
+    if blas_threads == "auto":
+        workers = n_jobs if n_jobs > 0 else cores
+        if workers <= 1:
+            return None
+        return max(1, cores // workers)
+    if isinstance(blas_threads, bool) or not isinstance(blas_threads, int) or blas_threads < 1:
+        raise ValueError("blas_threads must be 'auto', None or a positive integer, not %r"
+                         % (blas_threads,))
+    return blas_threads
+
+
+def set_blas_threads(n):
+    """Set the thread count of every detected BLAS library to ``n`` for the
+    rest of the process (see :func:`limit_blas_threads` to restore it)."""
+    threadpoolctl = _threadpoolctl()
+    if threadpoolctl is not None:
+        threadpoolctl.threadpool_limits(limits=n, user_api="blas")
+        return
+    for lib in _loaded_libraries():
+        lib.set(n)
+
+
+def _save_counts():
+    # a function restoring the current thread counts
+    threadpoolctl = _threadpoolctl()
+    if threadpoolctl is not None:
+        # limits=None changes nothing but remembers the counts
+        return threadpoolctl.threadpool_limits(limits=None,
+                                               user_api="blas").restore_original_limits
+    libraries = _loaded_libraries()
+    previous = [int(lib.get()) for lib in libraries]
+
+    def restore():
+        for lib, count in zip(libraries, previous):
+            lib.set(count)
+    return restore
+
+
+@contextmanager
+def limit_blas_threads(n):
+    """Run the body with every detected BLAS library limited to ``n``
+    threads, restoring the previous counts afterwards (``n=None`` changes
+    nothing).
+
+    Safe to enter from several threads at once: while blocks overlap the
+    smallest of their limits applies, and the counts are restored when the
+    last of them exits.
+    """
+    global _restore
+    if n is None:
+        yield
+        return
+    with _limits_lock:
+        if not _limits:
+            _restore = _save_counts()
+        _limits.append(n)
+        set_blas_threads(min(_limits))
+        logger.debug("BLAS threads limited to %d.", min(_limits))
+    try:
+        yield
+    finally:
+        with _limits_lock:
+            _limits.remove(n)
+            if _limits:
+                set_blas_threads(min(_limits))
+            else:
+                _restore()
+                _restore = None
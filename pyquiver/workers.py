@@ -0,0 +1,341 @@
+"""Worker processes for ``batch(..., executor="process")``.
+
+Parsing is pure Python and holds the GIL, and threads diagonalizing at once
+compete with BLAS's own threads, so large campaigns scale better across
+processes. :func:`run_pairs` keeps ``n_jobs`` long-lived workers busy, one
+pair at a time each, and yields a lightweight :class:`PairResult` per pair as
+it completes, rather than the full ``KIE_Calculation`` (Systems, Hessians and
+isotopologues) that would have to be pickled back.
+
+* Pairs given as file paths are parsed in the worker. Pairs given as
+  ``System`` objects have their Hessian copied into
+  ``multiprocessing.shared_memory`` when the pair is submitted, and the
+  workers map it instead of receiving a pickled copy. The copy is unlinked
+  as soon as no running pair uses it, so shared memory holds the Hessians of
+  the running pairs only, not of the whole batch.
+* A pair that raises is reported in its ``PairResult.error`` and the run
+  continues; so is a worker that dies (e.g. killed for running out of
+  memory), which is replaced.
+* With ``timeout``, a pair that runs longer than that many seconds has its
+  worker terminated and replaced, and is reported as failed.
+
+The parse cache and eigenvalue store enabled in the parent (see
+:mod:`pyquiver.parsers.cache` and :mod:`pyquiver.eigencache`) are enabled in
+every worker too.
+"""
+
+import logging
+import multiprocessing
+import sys
+import time
+import traceback
+from collections import deque, namedtuple
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from . import eigencache
+from . import parsers
+from . import quiver
+from . import threads
+from .parsers import ParsedSystem
+from .results import PairResult
+
+logger = logging.getLogger("pyquiver")
+
+# what a worker needs to rebuild a System whose Hessian is in shared memory
+_SharedSystem = namedtuple("_SharedSystem",
+                           ["name", "shape", "atomic_numbers", "positions_angstrom",
+                            "filename", "digest"])
+
+
+def _share(system):
+    # copy the Hessian of ``system`` into a new shared memory segment; returns
+    # the segment (for the parent to unlink) and its descriptor
+    hessian = np.ascontiguousarray(system.hessian, dtype=np.float64)
+    segment = shared_memory.SharedMemory(create=True, size=max(hessian.nbytes, 1))
+    np.ndarray(hessian.shape, dtype=np.float64, buffer=segment.buf)[...] = hessian
+    return segment, _SharedSystem(segment.name, hessian.shape, list(system.atomic_numbers),
+                                  np.asarray(system.positions_angstrom), system.filename,
+                                  getattr(system, "_hessian_digest", None))
+
+
+class _Shares(object):
+    # the shared Hessians of the Systems in running pairs, counted by pair so
+    # that a System in several running pairs is copied once
+    def __init__(self):
+        self._shared = {}   # id(System) -> [segment, _SharedSystem, pairs]
+
+    def acquire(self, structure):
+        # the descriptor to send for ``structure`` (a path is sent as is)
+        if not isinstance(structure, quiver.System):
+            return structure
+        entry = self._shared.get(id(structure))
+        if entry is None:
+            entry = self._shared[id(structure)] = list(_share(structure)) + [0]
+        entry[2] += 1
+        return entry[1]
+
+    def release(self, structure):
+        # one pair using ``structure`` is done; unlink its copy if it was the last
+        entry = self._shared.get(id(structure))
+        if entry is None:
+            return
+        entry[2] -= 1
+        if entry[2] == 0:
+            del self._shared[id(structure)]
+            _unlink(entry[0])
+
+    def close(self):
+        for segment, _, _ in self._shared.values():
+            _unlink(segment)
+        self._shared.clear()
+
+
+def _unlink(segment):
+    segment.close()
+    segment.unlink()
+
+
+def _open(name):
+    # attach to a segment of the parent's without registering it with a
+    # resource tracker: the parent unlinks it, and a worker forked before the
+    # parent's tracker started has a tracker of its own, which would report
+    # the segment as leaked (and try to unlink it) when the worker exits.
+    # Unregistering afterwards is no fix, since a tracker shared with the
+    # parent would then lose the parent's own record of the segment.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _attach(shared, attached):
+    # the System for a shared descriptor, attaching its segment the first time
+    if shared.name not in attached:
+        segment = _open(shared.name)
+        hessian = np.ndarray(shared.shape, dtype=np.float64, buffer=segment.buf)
+        hessian.setflags(write=False)
+        system = quiver.System.from_parsed(
+            ParsedSystem(shared.atomic_numbers, shared.positions_angstrom, hessian),
+            shared.filename)
+        if shared.digest is not None:
+            system._hessian_digest = shared.digest
+        attached[shared.name] = (segment, system)
+    return attached[shared.name][1]
+
+
+def _release(attached, keep=()):
+    # detach every segment whose name is not in ``keep``
+    for name in [name for name in attached if name not in keep]:
+        segment, _ = attached.pop(name)
+        try:
+            segment.close()
+        except BufferError:   # still referenced; closed when collected
+            pass
+
+
+def _initialize(parse_cache, store_path, memory_bytes, blas_threads):
+    # enable the parent's caches in this worker, and cap its BLAS threads
+    if parse_cache is None:
+        parsers.disable_cache()
+    else:
+        parsers.enable_cache(*parse_cache)
+    eigencache.configure_memory(memory_bytes)
+    # a store opened before a fork must not be used by the child
+    eigencache.disable_store()
+    if store_path is not None:
+        eigencache.enable_store(store_path)
+    if blas_threads is not None:
+        threads.set_blas_threads(blas_threads)
+
+
+def compute(label, config, gs, ts, energies=None, **options):
+    """Run the KIE calculation of one pair and summarize it as a
+    :class:`PairResult`, catching any exception into its ``error``.
+    ``energies`` is ``(reactant, ts, product)`` or None; ``options`` are
+    passed to :class:`~pyquiver.KIE_Calculation`."""
+    from .kie import KIE_Calculation
+
+    started = time.perf_counter()
+    try:
+        calc = KIE_Calculation(config, gs, ts, **options)
+        st = None
+        if energies is not None:
+            reactant, ts_energy, product = energies
+            st = calc.skodje_truhlar(reactant, product, ts_energy)
+        return PairResult(label, list(calc.results), calc.eie_flag == 1, st, None,
+                          time.perf_counter() - started)
+    except Exception:
+        return PairResult(label, [], None, None, traceback.format_exc(),
+                          time.perf_counter() - started)
+
+
+def _run(task, settings, attached):
+    # one pair in a worker
+    label, gs, ts, energies = task
+    config, style, engine, active_atoms, symmetry = settings
+    keep = [s.name for s in (gs, ts) if isinstance(s, _SharedSystem)]
+    _release(attached, keep)
+    try:
+        gs, ts = [_attach(s, attached) if isinstance(s, _SharedSystem) else s
+                  for s in (gs, ts)]
+    except Exception:
+        return PairResult(label, [], None, None, traceback.format_exc(), 0.0)
+    return compute(label, config, gs, ts, energies, style=style, engine=engine,
+                   active_atoms=active_atoms, symmetry=symmetry,
+                   blas_threads=None)   # set once per worker
+
+
+def _worker(connection, settings, environment):
+    # receive tasks until a None, answering each with its PairResult
+    _initialize(*environment)
+    attached = {}
+    try:
+        while True:
+            task = connection.recv()
+            if task is None:
+                break
+            connection.send(_run(task, settings, attached))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        _release(attached)
+
+
+def _caches():
+    # the parent's cache settings, for _initialize
+    cache = parsers.active_cache()
+    store = eigencache.active_store()
+    return ((cache.directory, cache.max_bytes) if cache is not None else None,
+            store.path if store is not None and store.path != ":memory:" else None,
+            eigencache.memory_cache().max_bytes)
+
+
+class _Worker(object):
+    # a worker process and the pair it is running
+    def __init__(self, context, settings, environment):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker, args=(child, settings, environment),
+                                       daemon=True)
+        self.process.start()
+        child.close()
+        self.task = None      # (index, label, gs, ts) of the running pair
+        self.deadline = None
+
+    def submit(self, index, task, shares, timeout=None):
+        # share the pair's Systems for as long as it runs (see _Shares)
+        label, gs, ts, energies = task
+        self.task = (index, label, gs, ts)
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.connection.send((label, shares.acquire(gs), shares.acquire(ts), energies))
+
+    def done(self, shares):
+        # the running pair has finished, failed or been abandoned
+        _, _, gs, ts = self.task
+        shares.release(gs)
+        shares.release(ts)
+        self.task = self.deadline = None
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+def run_pairs(config, pairs, n_jobs=-1, timeout=None, style="gaussian", energies=None,
+              engine="eigvalsh", active_atoms=None, symmetry=False, blas_threads="auto"):
+    """Run every ``(label, (gs, ts))`` of ``pairs`` in ``n_jobs`` worker
+    processes (all CPUs if negative), yielding ``(index, PairResult)`` in the
+    order the pairs complete. ``gs`` and ``ts`` are paths or ``System``
+    objects; ``energies`` maps labels to ``(reactant, ts, product)`` energies
+    as in :func:`~pyquiver.batch`. ``timeout`` is in seconds per pair, and
+    ``blas_threads`` sets each worker's BLAS threads (see
+    :func:`pyquiver.threads.blas_threads_for`)."""
+    if timeout is not None and timeout <= 0:
+        raise ValueError("timeout must be positive")
+    if n_jobs == 0:
+        raise ValueError("n_jobs must not be 0")
+
+    tasks = [(label, gs, ts, None if energies is None else tuple(energies[label]))
+             for label, (gs, ts) in pairs]
+    if not tasks:
+        return
+    if n_jobs < 0:
+        n_jobs = threads.cpu_count()
+    n_jobs = min(n_jobs, len(tasks))
+    blas_threads = threads.blas_threads_for(n_jobs, blas_threads)
+
+    context = multiprocessing.get_context()
+    settings = (config, style, engine, active_atoms, symmetry)
+    environment = _caches() + (blas_threads,)
+    pending = deque(enumerate(tasks))
+    shares = _Shares()
+    workers = []
+    try:
+        workers = [_Worker(context, settings, environment) for _ in range(n_jobs)]
+        for worker in workers:
+            worker.submit(*pending.popleft(), shares=shares, timeout=timeout)
+        while any(w.task is not None for w in workers):
+            running = [w for w in workers if w.task is not None]
+            deadlines = [w.deadline for w in running if w.deadline is not None]
+            ready = wait([w.connection for w in running] +
+                         [w.process.sentinel for w in running],
+                         max(0.0, min(deadlines) - time.monotonic()) if deadlines else None)
+            for worker in running:
+                index, label = worker.task[:2]
+                result, dead = None, False
+                if worker.connection in ready:
+                    try:
+                        result = worker.connection.recv()
+                    except EOFError:
+                        dead = True
+                elif worker.process.sentinel in ready:
+                    dead = True
+                elif worker.deadline is not None and time.monotonic() >= worker.deadline:
+                    dead = True
+                    result = PairResult(label, [], None, None,
+                                        "TimeoutError: pair %r exceeded the %g s timeout"
+                                        % (label, timeout), timeout)
+                else:
+                    continue
+                worker.done(shares)
+                if dead:
+                    worker.kill()
+                    if result is None:
+                        result = PairResult(label, [], None, None,
+                                            "RuntimeError: worker process exited with "
+                                            "code %s" % worker.process.exitcode, None)
+                    # replace the worker only if there is work left for it
+                    if pending:
+                        replacement = _Worker(context, settings, environment)
+                        workers[workers.index(worker)] = replacement
+                        worker = replacement
+                if result.error is not None:
+                    logger.warning("Pair %s failed:\n%s", label, result.error)
+                if pending and worker.process.is_alive():
+                    worker.submit(*pending.popleft(), shares=shares, timeout=timeout)
+                yield index, result
+    finally:
+        for worker in workers:
+            if worker.task is None:
+                worker.stop()
+            else:
+                worker.kill()
+        shares.close()
@@ -36,3 +36,40 @@ def claisen_systems():
     ts = quiver.System(os.path.join(TUTORIAL, "gaussian", "claisen_ts.out"),
                        style="g09")
     return gs, ts
+
+
+@pytest.fixture
+def make_system():
+    """Return a helper that builds a System from arrays rather than a file,
+    for synthetic or oversized systems. The Hessian is set only if given (the
+    planner needs just the atom count); atoms default to carbons at the
+    origin."""
+    import numpy as np
+    from pyquiver import quiver
+
+    def _system(number_of_atoms, hessian=None, atomic_numbers=None, positions=None,
+                filename="synthetic"):
+        system = quiver.System.__new__(quiver.System)
+        system.filename = filename
+        system.is_linear = False
+        system.number_of_atoms = number_of_atoms
+        system.atomic_numbers = (list(atomic_numbers) if atomic_numbers is not None
+                                 else [6] * number_of_atoms)
+        system.positions_angstrom = (np.asarray(positions, dtype=float)
+                                     if positions is not None
+                                     else np.zeros((number_of_atoms, 3)))
+        if hessian is not None:
+            system.hessian = hessian
+        return system
+    return _system
+
+
+@pytest.fixture
+def fresh_eigencache():
+    """An empty in-process eigenvalue cache (see pyquiver.eigencache), for
+    tests that count diagonalizations: the cache is shared by the whole
+    process, so systems parsed by earlier tests would otherwise be hits."""
+    from pyquiver import eigencache
+    eigencache.memory_cache().clear()
+    yield eigencache.memory_cache()
+    eigencache.memory_cache().clear()
@@ -84,3 +84,204 @@ def test_skodje_truhlar_column(files):
     direct = KIE_Calculation(cfg, gs, ts).skodje_truhlar(
         reactant_energy=0.0, product_energy=0.0, ts_energy=0.02)
     assert by_iso["C1"]["skodje_truhlar"] == pytest.approx(direct["C1"])
+
+
+# --- executor="process" --------------------------------------------------------
+
+fork_only = pytest.mark.skipif(
+    __import__("multiprocessing").get_start_method() != "fork",
+    reason="patches the worker function, which needs fork to reach the workers")
+
+
+def test_process_executor_matches_serial(files):
+    cfg, gs, ts = files
+    pairs = {"a": (gs, ts), "b": (gs, ts)}
+    serial = batch(cfg, pairs, energies={"a": (0.0, 0.02, 0.0), "b": (0.0, 0.02, 0.0)})
+    parallel = batch(cfg, pairs, executor="process", n_jobs=2,
+                     energies={"a": (0.0, 0.02, 0.0), "b": (0.0, 0.02, 0.0)})
+    assert list(parallel) == ["a", "b"]
+    assert parallel.to_records() == serial.to_records()
+    assert parallel.failures == {}
+    assert parallel["a"].label == "a" and parallel["a"].elapsed > 0
+
+
+def test_process_executor_shares_system_hessians(files, monkeypatch):
+    from multiprocessing import shared_memory
+    from pyquiver import System
+    cfg, gs, ts = files
+    created = []
+    real = shared_memory.SharedMemory
+
+    def recording(*args, **kwargs):
+        segment = real(*args, **kwargs)
+        if kwargs.get("create"):
+            created.append(segment.name)
+        return segment
+
+    monkeypatch.setattr(shared_memory, "SharedMemory", recording)
+    gs_system, ts_system = System(gs), System(ts)
+    results = batch(cfg, {"a": (gs_system, ts_system), "b": (gs_system, ts_system)},
+                    executor="process", n_jobs=2)
+    assert len(created) == 2            # one segment per distinct System
+    assert results.to_records() == batch(cfg, {"a": (gs, ts), "b": (gs, ts)}).to_records()
+    for name in created:                # unlinked once the batch is done
+        with pytest.raises(FileNotFoundError):
+            real(name=name)
+
+
+def test_process_executor_unlinks_hessians_per_pair(files, monkeypatch):
+    from multiprocessing import shared_memory
+    from pyquiver import System, iter_results
+    cfg, gs, ts = files
+    created = []
+    real = shared_memory.SharedMemory
+
+    def recording(*args, **kwargs):
+        segment = real(*args, **kwargs)
+        if kwargs.get("create"):
+            created.append(segment.name)
+        return segment
+
+    def live():
+        names = []
+        for name in created:
+            try:
+                real(name=name).close()
+                names.append(name)
+            except FileNotFoundError:
+                pass
+        return names
+
+    monkeypatch.setattr(shared_memory, "SharedMemory", recording)
+    pairs = {str(i): (System(gs), System(ts)) for i in range(3)}
+    for i, result in enumerate(iter_results(cfg, pairs, executor="process", n_jobs=1)):
+        assert result.error is None
+        # only the next pair's Hessians are still shared
+        assert live() == created[2 * (i + 1):2 * (i + 2)]
+    assert len(created) == 6 and live() == []
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_process_executor_no_resource_tracker_warnings(files, method):
+    # in a fresh interpreter, where no resource tracker is running yet when
+    # the workers start
+    import multiprocessing
+    import os
+    import subprocess
+    import sys
+
+    import pyquiver
+    if method not in multiprocessing.get_all_start_methods():
+        pytest.skip("no %s start method" % method)
+    cfg, gs, ts = files
+    script = "\n".join([
+        "import multiprocessing",
+        "from pyquiver import batch, System",
+        "if __name__ == '__main__':",
+        "    multiprocessing.set_start_method(%r)" % method,
+        "    pairs = {str(i): (System(%r), System(%r)) for i in range(3)}" % (gs, ts),
+        "    results = batch(%r, pairs, executor='process', n_jobs=2)" % cfg,
+        "    assert not results.failures, results.failures",
+    ])
+    root = os.path.dirname(os.path.dirname(os.path.abspath(pyquiver.__file__)))
+    environment = dict(os.environ, PYTHONPATH=root)
+    run = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                         env=environment, timeout=120)
+    assert run.returncode == 0, run.stderr
+    assert "resource_tracker" not in run.stderr
+    assert "leaked" not in run.stderr
+
+
+def test_process_executor_isolates_failures(files, tmp_path):
+    cfg, gs, ts = files
+    results = batch(cfg, {"good": (gs, ts), "bad": (gs, str(tmp_path / "missing.out"))},
+                    executor="process", n_jobs=2)
+    assert list(results) == ["good"]
+    assert list(results.failures) == ["bad"]
+    assert "Traceback" in results.failures["bad"]
+    with pytest.raises(ValueError):
+        results.sweep([300.0])          # no full calculations to sweep
+
+
+def test_serial_executor_isolates_failures(files, tmp_path):
+    from pyquiver import iter_results
+    cfg, gs, ts = files
+    pairs = {"bad": (gs, str(tmp_path / "missing.out")), "good": (gs, ts)}
+    results = batch(cfg, pairs)
+    assert list(results) == ["good"]
+    assert list(results.failures) == ["bad"]
+    assert "FileNotFoundError" in results.failures["bad"]
+    assert results.to_records() == batch(cfg, {"good": (gs, ts)}).to_records()
+    # iter_results reports the same pair
+    errors = [r.label for r in iter_results(cfg, pairs) if r.error is not None]
+    assert errors == ["bad"]
+
+
+@fork_only
+def test_process_executor_timeout_and_dead_worker(files, monkeypatch):
+    import os
+    import time
+    from pyquiver import workers
+    cfg, gs, ts = files
+    real_run = workers._run
+
+    def run(task, settings, attached):
+        if task[0] == "slow":
+            time.sleep(60)
+        if task[0] == "crash":
+            os._exit(3)
+        return real_run(task, settings, attached)
+
+    monkeypatch.setattr(workers, "_run", run)
+    pairs = {"slow": (gs, ts), "crash": (gs, ts), "a": (gs, ts), "b": (gs, ts)}
+    started = time.monotonic()
+    results = batch(cfg, pairs, executor="process", n_jobs=2, timeout=5)
+    assert time.monotonic() - started < 30
+    assert list(results) == ["a", "b"]
+    assert results.failures["slow"].startswith("TimeoutError")
+    assert "exited with code 3" in results.failures["crash"]
+
+
+def test_process_executor_arguments(files):
+    cfg, gs, ts = files
+    with pytest.raises(ValueError):
+        batch(cfg, {"a": (gs, ts)}, executor="threads")
+    with pytest.raises(ValueError):
+        batch(cfg, {"a": (gs, ts)}, timeout=10)        # serial has no timeouts
+    with pytest.raises(ValueError):
+        batch(cfg, {"a": (gs,)}, executor="process")
+
+
+# --- iter_results --------------------------------------------------------------
+
+def test_iter_results_streams_records(files, tmp_path):
+    from pyquiver import iter_results
+    cfg, gs, ts = files
+    pairs = {"a": (gs, ts), "bad": (gs, str(tmp_path / "missing.out")), "b": (gs, ts)}
+    records = iter_results(cfg, pairs, energies={k: (0.0, 0.02, 0.0) for k in pairs})
+    assert not isinstance(records, list)            # lazy
+    records = list(records)
+    assert [r.label for r in records] == ["a", "bad", "b"]
+    assert records[1].error is not None and records[1].results == []
+    full = batch(cfg, {"a": (gs, ts)}, energies={"a": (0.0, 0.02, 0.0)})
+    assert records[0].results == list(full["a"].results)
+    assert records[0].skodje_truhlar["C1"] == full.to_records()[0]["skodje_truhlar"]
+
+
+def test_iter_results_process_order(files, tmp_path):
+    from pyquiver import iter_results
+    cfg, gs, ts = files
+    pairs = {str(i): (gs, ts) for i in range(4)}
+    pairs["bad"] = (gs, str(tmp_path / "missing.out"))
+    unordered = list(iter_results(cfg, pairs, executor="process", n_jobs=2))
+    assert sorted(r.label for r in unordered) == sorted(pairs)
+    ordered = list(iter_results(cfg, pairs, executor="process", n_jobs=2, ordered=True))
+    assert [r.label for r in ordered] == list(pairs)
+    assert ordered[-1].error is not None
+
+
+def test_iter_results_checks_arguments_eagerly(files):
+    from pyquiver import iter_results
+    cfg, gs, ts = files
+    with pytest.raises(ValueError):
+        iter_results(cfg, {"a": (gs, ts)}, executor="threads")
@@ -249,3 +249,60 @@ def test_check_element_mismatch_rejected(make_config, claisen_systems):
                                     "isotopologue X 1 1 2D"))
     with pytest.raises(ValueError):
         c.check(gs, ts)
+
+
+# --- scans --------------------------------------------------------------------
+
+SCAN = """\
+scaling 0.96
+temperature 300
+imag_threshold 50
+mass_override_isotopologue default
+reference_isotopologue none
+isotopologue C1 1 1 14C
+scan 13C
+atom_map 2 4
+"""
+
+
+def test_scan_lines_parsed(make_config):
+    c = make_config(SCAN)
+    assert c.scans == ["13C"]
+    assert c.atom_map == {2: 4}
+    assert "Scan: 13C" in str(c)
+
+
+def test_scan_expands_per_site(make_config, claisen_systems):
+    gs, _ = claisen_systems
+    c = make_config(SCAN)
+    expanded = c.expand_scans(gs)
+    carbons = [i + 1 for i, z in enumerate(gs.atomic_numbers) if z == 6]
+    assert list(expanded.isotopologues) == ["C%d" % i for i in carbons]
+    assert expanded.isotopologues["C1"] == [(1, 1, "14C")]   # explicit wins
+    assert expanded.isotopologues["C2"] == [(2, 4, "13C")]   # atom_map
+    assert c.isotopologues.keys() == {"C1"}                  # shared Config untouched
+    assert expanded.expand_scans(gs) is expanded
+
+
+def test_from_dict_scan_only():
+    c = Config.from_dict({}, temperature=300, scaling=0.96, imag_threshold=50,
+                         scan="2D", atom_map={1: 2})
+    assert c.scans == ["2D"] and c.atom_map == {1: 2}
+
+
+@pytest.mark.parametrize("scan", [["5000.0"], ["13C", "14C"], ["99Z"]])
+def test_scan_validates_labels(scan):
+    with pytest.raises(ValueError):
+        Config.from_dict({}, temperature=300, scaling=0.96, imag_threshold=50, scan=scan)
+
+
+def test_scan_matches_explicit_isotopologues(claisen_systems):
+    from pyquiver.kie import KIE_Calculation
+    gs, ts = claisen_systems
+    settings = dict(temperature=393, scaling=0.9614, imag_threshold=50)
+    scanned = KIE_Calculation(Config.from_dict({}, scan=["13C", "17O"], **settings), gs, ts)
+    explicit = KIE_Calculation(Config.from_dict(
+        {"C1": [(1, 1, "13C")], "O3": [(3, 3, "17O")], "C6": [(6, 6, "13C")]},
+        **settings), gs, ts)
+    for name in explicit.KIES:
+        assert scanned.results[name] == pytest.approx(explicit.results[name])
@@ -213,6 +213,35 @@ def test_orca_missing_hessian():
         parse_orca_output(data)
 
 
+# ORCA prints five columns per block, so a 7x7 matrix spans a full block and
+# a two-column one
+def _orca_hess(size=7):
+    h = np.arange(size * size, dtype=float).reshape(size, size)
+    lines = ["$hessian", str(size)]
+    for column in range(0, size, 5):
+        width = min(5, size - column)
+        lines.append("          " + "".join("%19d" % j for j in range(column, column + width)))
+        for row in range(size):
+            lines.append("%5d   " % row + "".join("%19.10E" % v for v in h[row, column:column + width]))
+    lines += ["", "$atoms", "1", " C     12.01100      1.0 0.0 0.0", "", "$end"]
+    return "\n".join(lines) + "\n", (h + h.T) / 2
+
+
+def test_orca_hessian_blocks():
+    text, expected = _orca_hess()
+    atomic_numbers, positions, hessian = parse_orca_output(text)
+    assert atomic_numbers == [6]
+    assert np.array_equal(hessian, expected)
+    # bytes are accepted as well as text
+    assert np.array_equal(parse_orca_output(text.encode())[2], expected)
+
+
+def test_orca_truncated_hessian():
+    text, _ = _orca_hess()
+    with pytest.raises(ValueError, match="truncated"):
+        parse_orca_output(text.replace("$hessian\n7", "$hessian\n8"))
+
+
 # --- calculate_rpfr imaginary-frequency-count mismatch -----------------------
 
 class _FreqStub:
@@ -0,0 +1,188 @@
+"""Tests for the eigenvalue caches (``pyquiver.eigencache``): the in-process
+LRU cache and the persistent SQLite store."""
+
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from pyquiver import Config, eigencache, quiver
+from pyquiver.kie import KIE_Calculation
+
+CFG = ("gaussian", "claisen_demo.config")
+GS = ("gaussian", "claisen_gs.out")
+TS = ("gaussian", "claisen_ts.out")
+
+
+@pytest.fixture
+def store(tmp_path):
+    yield eigencache.enable_store(str(tmp_path / "eigenvalues.sqlite"))
+    eigencache.disable_store()
+
+
+@pytest.fixture
+def no_memory():
+    # the in-process cache turned off for one test
+    eigencache.configure_memory(0)
+    yield
+    eigencache.configure_memory(eigencache.DEFAULT_MEMORY_BYTES)
+
+
+def _counting_eigvalsh():
+    real_eigvalsh = np.linalg.eigvalsh
+    calls = []
+
+    def counting(a, *args, **kwargs):
+        calls.append(np.shape(a))
+        return real_eigvalsh(a, *args, **kwargs)
+    return calls, counting
+
+
+def _config(tutorial, **changes):
+    config = Config(tutorial(*CFG))
+    fields = dict(isotopologues=config.isotopologues, temperature=config.temperature,
+                  scaling=config.scaling, imag_threshold=config.imag_threshold,
+                  reference_isotopologue=config.reference_isotopologue)
+    fields.update(changes)
+    return Config.from_dict(**fields)
+
+
+@pytest.mark.parametrize("engine", ["eigvalsh", "batched"])
+def test_new_settings_never_rediagonalize(store, no_memory, tutorial, engine):
+    first = KIE_Calculation(tutorial(*CFG), tutorial(*GS), tutorial(*TS), engine=engine)
+    unique = first.eigenvalue_cache["misses"]
+    assert first.eigenvalue_cache["hits"] == 0 and unique > 0
+
+    # a new process: freshly parsed systems, and a different temperature,
+    # scaling and reference
+    changed = _config(tutorial, temperature=300.0, scaling=0.95, reference_isotopologue="none")
+    calls, counting = _counting_eigvalsh()
+    with mock.patch.object(np.linalg, "eigvalsh", counting), \
+            mock.patch.object(np.linalg, "eigh", side_effect=AssertionError("diagonalized")):
+        second = KIE_Calculation(changed, tutorial(*GS), tutorial(*TS), engine=engine)
+    assert calls == []
+    assert second.eigenvalue_cache == {"hits": unique, "misses": 0, "memory_hits": 0}
+    assert store.stats()["entries"] == unique
+
+    # with no cache at all nothing is looked up, or counted
+    eigencache.disable_store()
+    expected = KIE_Calculation(changed, tutorial(*GS), tutorial(*TS))
+    assert expected.eigenvalue_cache == {"hits": 0, "misses": 0, "memory_hits": 0}
+    for name in expected.KIES:
+        assert np.allclose(second.KIES[name].value, expected.KIES[name].value, rtol=1e-10)
+
+
+def test_key_covers_masses_and_active_atoms(tutorial):
+    system = quiver.System(tutorial(*GS))
+    masses = np.ones(system.number_of_atoms)
+    heavier = masses.copy()
+    heavier[0] = 2.0
+    keys = {eigencache.isotopologue_key(quiver.Isotopologue("a", system, masses)),
+            eigencache.isotopologue_key(quiver.Isotopologue("b", system, heavier)),
+            eigencache.isotopologue_key(quiver.Isotopologue("c", system, masses, active=[0, 1, 2]))}
+    assert len(keys) == 3
+    # the name does not enter the key
+    assert (eigencache.isotopologue_key(quiver.Isotopologue("d", system, masses))
+            == eigencache.isotopologue_key(quiver.Isotopologue("a", system, masses)))
+
+
+def test_reaction_mode_is_stored(store, tutorial):
+    system = quiver.System(tutorial(*TS))
+    masses = np.linspace(1.0, 16.0, system.number_of_atoms)
+    iso = quiver.Isotopologue("x", system, masses)
+    iso.calculate_frequencies(50)
+    composition = iso.reaction_mode_composition()
+
+    again = quiver.Isotopologue("x", quiver.System(tutorial(*TS)), masses)
+    with mock.patch.object(np.linalg, "eigh", side_effect=AssertionError("diagonalized")):
+        assert np.array_equal(again.reaction_mode_composition(), composition)
+
+
+def test_float32_work_is_not_stored(store, tutorial):
+    system = quiver.System(tutorial(*GS))
+    iso = quiver.Isotopologue("x", system, np.ones(system.number_of_atoms))
+    iso.calculate_frequencies(50, dtype=np.float32)
+    assert store.stats() == {"hits": 0, "misses": 0, "entries": 0}
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_memory_cache_shared_between_calculations(fresh_eigencache, claisen_systems, tutorial,
+                                                  n_jobs):
+    # on by default
+    assert fresh_eigencache.max_bytes == eigencache.DEFAULT_MEMORY_BYTES > 0
+    gs, ts = claisen_systems
+    first = KIE_Calculation(tutorial(*CFG), gs, ts, n_jobs=n_jobs)
+    unique = first.eigenvalue_cache["misses"]
+
+    # same systems, a different config and reference: nothing is diagonalized
+    changed = _config(tutorial, temperature=350.0, reference_isotopologue="none")
+    with mock.patch.object(np.linalg, "eigvalsh", side_effect=AssertionError("diagonalized")):
+        second = KIE_Calculation(changed, gs, ts, n_jobs=n_jobs)
+    assert second.eigenvalue_cache == {"hits": unique, "misses": 0, "memory_hits": unique}
+    assert fresh_eigencache.stats()["entries"] == unique
+
+    # the cached arrays are shared, so they are read-only
+    eigenvalues = second.KIES["C1"].gs_tuple[1].eigenvalues
+    assert eigenvalues is first.KIES["C1"].gs_tuple[1].eigenvalues
+    assert not eigenvalues.flags.writeable
+
+
+def test_reassigned_hessian_is_rediagonalized(store, fresh_eigencache, claisen_systems, tutorial):
+    gs, ts = claisen_systems
+    before = KIE_Calculation(tutorial(*CFG), gs, ts).KIES["C1"].value
+    digest = ts.hessian_digest()
+    ts.hessian = ts.hessian * 1.1
+    assert ts.hessian_digest() != digest
+    after = KIE_Calculation(tutorial(*CFG), gs, ts)
+    assert not np.allclose(after.KIES["C1"].value, before)
+    assert after.eigenvalue_cache["misses"] > 0
+    fresh = quiver.System(tutorial(*TS))
+    fresh.hessian = fresh.hessian * 1.1
+    eigencache.disable_store()
+    fresh_eigencache.clear()
+    expected = KIE_Calculation(tutorial(*CFG), quiver.System(tutorial(*GS)), fresh)
+    assert np.allclose(after.KIES["C1"].value, expected.KIES["C1"].value)
+
+
+def test_memory_cache_lru_by_size():
+    cache = eigencache.MemoryCache(max_bytes=3 * 80)
+    for key in "abc":
+        cache.put(key, np.zeros(10))
+    assert cache.get("a") is not None   # a is now the most recently used
+    cache.put("d", np.zeros(10))
+    assert cache.get("b") is None
+    assert [k for k in "acd" if cache.get(k) is not None] == ["a", "c", "d"]
+    assert cache.stats() == {"hits": 4, "misses": 1, "entries": 3, "bytes": 240}
+    # an array larger than the whole cache is not kept
+    cache.put("e", np.zeros(100))
+    assert cache.get("e") is None and len(cache) == 3
+
+
+def test_memory_cache_can_be_disabled(no_memory, claisen_systems, tutorial):
+    gs, ts = claisen_systems
+    KIE_Calculation(tutorial(*CFG), gs, ts)
+    again = KIE_Calculation(tutorial(*CFG), gs, ts)
+    # nothing to look in, so no lookups are counted
+    assert again.eigenvalue_cache == {"hits": 0, "misses": 0, "memory_hits": 0}
+    assert len(eigencache.memory_cache()) == 0
+    with pytest.raises(ValueError):
+        eigencache.configure_memory(-1)
+
+
+def test_cache_counts_are_per_calculation(fresh_eigencache, claisen_systems, tutorial):
+    gs, ts = claisen_systems
+    first = KIE_Calculation(tutorial(*CFG), gs, ts)
+    unique = first.eigenvalue_cache["misses"]
+
+    # another calculation's lookups, interleaved with this one's (as when
+    # they run in threads), are not counted
+    other = quiver.Isotopologue("other", quiver.System(tutorial(*TS)),
+                                np.ones(ts.number_of_atoms))
+    real_lookup = eigencache.lookup
+
+    def interleaved(iso):
+        real_lookup(other)
+        return real_lookup(iso)
+    with mock.patch.object(eigencache, "lookup", side_effect=interleaved):
+        second = KIE_Calculation(tutorial(*CFG), gs, ts)
+    assert second.eigenvalue_cache == {"hits": unique, "misses": 0, "memory_hits": unique}
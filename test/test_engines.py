@@ -0,0 +1,73 @@
+"""Tests for the frequency engines (pyquiver.engines).
+
+Every engine must reproduce the default one-diagonalization-per-isotopologue
+results; these tests also pin down how much LAPACK work each engine does.
+"""
+
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from pyquiver import engines, quiver
+from pyquiver.kie import KIE_Calculation
+
+CFG = ("gaussian", "claisen_demo.config")
+GS = ("gaussian", "claisen_gs.out")
+TS = ("gaussian", "claisen_ts.out")
+
+
+def _counting_eigvalsh():
+    real_eigvalsh = np.linalg.eigvalsh
+    calls = []
+
+    def counting(a, *args, **kwargs):
+        calls.append(np.shape(a))
+        return real_eigvalsh(a, *args, **kwargs)
+    return calls, counting
+
+
+@pytest.fixture
+def default_calc(tutorial):
+    return KIE_Calculation(tutorial(*CFG), tutorial(*GS), tutorial(*TS))
+
+
+def test_batched_matches_default(tutorial, default_calc):
+    calc = KIE_Calculation(tutorial(*CFG), tutorial(*GS), tutorial(*TS),
+                           engine="batched")
+    assert list(calc.KIES) == list(default_calc.KIES)
+    for name in calc.KIES:
+        assert np.allclose(calc.KIES[name].value, default_calc.KIES[name].value,
+                           rtol=1e-10)
+
+
+def test_batched_is_one_stacked_call_per_system(tutorial, fresh_eigencache):
+    calls, counting = _counting_eigvalsh()
+    with mock.patch("numpy.linalg.eigvalsh", side_effect=counting):
+        calc = KIE_Calculation(tutorial(*CFG), tutorial(*GS), tutorial(*TS),
+                               engine="batched")
+    n_iso = len(calc.config.isotopologues)
+    # one stacked call for the gs and one for the ts, each holding the
+    # reference plus every substitution
+    assert calls == [(n_iso + 1, 42, 42), (n_iso + 1, 42, 42)]
+
+
+def test_batched_chunks_to_memory_budget(claisen_systems):
+    gs, _ = claisen_systems
+    masses = np.ones(gs.number_of_atoms) * 12.0
+    isos = [quiver.Isotopologue(str(i), gs, masses + i) for i in range(5)]
+    calls, counting = _counting_eigvalsh()
+    with mock.patch("numpy.linalg.eigvalsh", side_effect=counting):
+        # room for two 42x42 Hessians per chunk -> 2 + 2 + 1
+        engines.batched(isos, 50, max_bytes=2 * 42 * 42 * 8)
+    assert [shape[0] for shape in calls] == [2, 2, 1]
+
+    expected = quiver.Isotopologue("x", gs, masses + 4).calculate_frequencies(50)
+    assert np.allclose(isos[4].frequencies[2], expected[2])
+
+
+def test_unknown_engine_rejected(tutorial):
+    with pytest.raises(ValueError):
+        KIE_Calculation(tutorial(*CFG), tutorial(*GS), tutorial(*TS),
+                        engine="not_an_engine")
+    assert "batched" in engines.supported_engines()
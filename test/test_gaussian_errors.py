@@ -14,7 +14,7 @@ def _write(tmp_path, text, name="job.out"):
 
 
 def test_tail_handles_tiny_file(tmp_path):
-    # a file too short to seek backwards exercises the OSError fallback in _tail
+    # a one-line file without a trailing newline is its own last line
     p = tmp_path / "tiny.out"
     p.write_text("x")
     assert gaussian._tail(str(p)) == "x"
@@ -86,3 +86,46 @@ def test_input_orientation_fallbacks(tmp_path, text):
     # geometry is found via input orientation, then the missing archive raises
     with pytest.raises(ValueError):
         quiver.System(_write(tmp_path, text), style="gaussian")
+
+
+def test_tail_handles_empty_file(tmp_path):
+    # an empty file cannot be memory-mapped
+    p = tmp_path / "empty.out"
+    p.write_text("")
+    assert gaussian._tail(str(p)) == ""
+
+
+def _archive(hessian, freq=True):
+    # a minimal archive block, wrapped at 20 columns the way Gaussian wraps
+    # at 70 (so numbers and the terminator are split across lines)
+    text = "1\\1\\GINC-HOST\\%s\\RB3LYP\\#p\\\\C,0,0.,0.,0.\\" % ("Freq" if freq else "SP")
+    if freq:
+        text += "NImag=0\\\\%s\\\\" % hessian
+    text += "\\@"
+    return "".join(" " + text[i:i + 20] + "\n" for i in range(0, len(text), 20))
+
+
+def _job(*archives):
+    return (" #p freq\n"
+            "NAtoms=    1 \n"
+            "Standard orientation\n"
+            "    1    6    0    1.000000    0.000000    0.000000\n"
+            " Rotational constants (GHZ)\n"
+            "Standard orientation\n"
+            "    1    6    0    2.000000    0.000000    0.000000\n"
+            " Rotational constants (GHZ)\n"
+            + "".join(archives)
+            + " Normal termination of Gaussian\n")
+
+
+def test_last_table_and_frequency_archive(tmp_path):
+    # the final geometry and the last archive that carries NImag= are used,
+    # skipping a later archive of a non-frequency job
+    text = _job(_archive("9.,9.,9.,9.,9.,9."), _archive("0.1,0.01,0.2,0.02,0.03,0.3"),
+                _archive(None, freq=False))
+    parsed = gaussian.parse(_write(tmp_path, text))
+    assert parsed.atomic_numbers == [6]
+    assert parsed.positions_angstrom[0][0] == 2.0
+    assert parsed.hessian[0][0] == 0.1
+    assert parsed.hessian[2][1] == 0.03
+    assert parsed.hessian[1][2] == 0.03
@@ -6,6 +6,7 @@ when several isotopologues share one config, the reference ("default")
 isotopologue must be diagonalized only once, not once per substitution.
 """
 
+import tracemalloc
 from unittest import mock
 
 import numpy as np
@@ -46,6 +47,61 @@ def test_mass_weighting_preserves_symmetry():
     assert np.allclose(iso.mw_hessian, iso.mw_hessian.T)
 
 
+def test_mass_weighting_into_buffer(synthetic_system):
+    hessian = synthetic_system(150).hessian
+    masses = np.linspace(1.0, 30.0, 150)
+    iso = quiver.Isotopologue("t", FakeSystem(hessian), masses)
+    m3 = np.repeat(masses, 3)
+    expected = hessian / np.sqrt(np.outer(m3, m3))
+
+    out = np.empty_like(hessian)
+    tracemalloc.start()
+    result = iso.calculate_mw_hessian(out=out)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert result is out
+    assert np.allclose(out, expected, rtol=1e-14)
+    # only 3N-length vectors (and numpy's fixed-size ufunc buffer) are
+    # allocated, never an N x N temporary
+    assert peak < hessian.nbytes / 10
+
+
+def test_mass_weighting_float32_frequencies(synthetic_system):
+    system = synthetic_system(20)
+    masses = np.linspace(1.0, 30.0, 20)
+    iso = quiver.Isotopologue("t", system, masses)
+    assert iso.calculate_mw_hessian(dtype=np.float32).dtype == np.float32
+    exact = iso.calculate_frequencies(imag_threshold=50)[2]
+    approx = quiver.Isotopologue("t", system, masses).calculate_frequencies(
+        imag_threshold=50, dtype=np.float32)[2]
+    assert np.allclose(approx, exact, rtol=1e-4)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_workspace_released_after_calculation(n_jobs, fresh_eigencache, synthetic_system):
+    from pyquiver import Config
+    gs, ts = synthetic_system(20), synthetic_system(20, imaginary=True)
+    cfg = Config.from_dict({"C1": [(1, 1, "13C")], "C2": [(2, 2, "13C")]},
+                           temperature=300, scaling=1.0, imag_threshold=50)
+    KIE_Calculation(cfg, gs, ts, n_jobs=n_jobs)
+    assert not quiver._workspaces.__dict__.get("buffers")
+
+
+def test_float32_eigenvalues_recomputed_for_float64(synthetic_system):
+    system = synthetic_system(20)
+    iso = quiver.Isotopologue("t", system, np.linspace(1.0, 30.0, 20))
+    approx = iso.calculate_frequencies(imag_threshold=50, dtype=np.float32)[2].copy()
+    # a float64 request does not reuse the float32 eigenvalues...
+    exact = iso.calculate_frequencies(imag_threshold=50)[2]
+    assert not np.array_equal(exact, approx)
+    assert np.array_equal(exact, quiver.Isotopologue(
+        "t", system, np.linspace(1.0, 30.0, 20)).calculate_frequencies(imag_threshold=50)[2])
+    # ...but a float32 request reuses float64 ones
+    with mock.patch("numpy.linalg.eigvalsh", side_effect=AssertionError("diagonalized")):
+        assert np.array_equal(iso.calculate_frequencies(imag_threshold=50, dtype=np.float32)[2],
+                              exact)
+
+
 # --- frequency calculation + per-object caching ------------------------------
 
 def _make_iso():
@@ -73,9 +129,18 @@ def test_frequencies_second_call_is_cached():
     assert first is second
 
 
+def test_new_scaling_reuses_eigenvalues():
+    iso = _make_iso()
+    unscaled = iso.calculate_frequencies(imag_threshold=50)
+    with mock.patch("numpy.linalg.eigvalsh", side_effect=AssertionError):
+        scaled = iso.calculate_frequencies(imag_threshold=50, scaling=0.5)
+    assert np.allclose(scaled[2], 0.5 * unscaled[2])
+    assert iso.calculate_frequencies(imag_threshold=50, scaling=0.5) is scaled
+
+
 # --- reference isotopologue is diagonalized once, not per substitution --------
 
-def test_reference_diagonalized_once(tutorial):
+def test_reference_diagonalized_once(tutorial, fresh_eigencache):
     cfg = tutorial("gaussian", "claisen_demo.config")
     gs = tutorial("gaussian", "claisen_gs.out")
     ts = tutorial("gaussian", "claisen_ts.out")
@@ -95,3 +160,136 @@ def test_reference_diagonalized_once(tutorial):
     # the naive recompute-the-reference path would be 4 per substitution
     assert len(calls) == 2 + 2 * n_iso
     assert len(calls) < 4 * n_iso
+
+
+# --- partial Hessian vibrational analysis (PHVA) ------------------------------
+
+def _with_frozen_atoms(system, n_frozen):
+    # append atoms far away whose Hessian rows are all zero, as a QM/MM or
+    # cluster model with a frozen environment would report them
+    import copy
+    frozen = copy.copy(system)
+    n = system.number_of_atoms + n_frozen
+    frozen.hessian = np.zeros((3 * n, 3 * n))
+    frozen.hessian[:3 * system.number_of_atoms, :3 * system.number_of_atoms] = system.hessian
+    frozen.atomic_numbers = list(system.atomic_numbers) + [6] * n_frozen
+    frozen.positions_angstrom = np.vstack([system.positions_angstrom,
+                                           np.full((n_frozen, 3), 50.0)])
+    frozen.number_of_atoms = n
+    return frozen
+
+
+def test_phva_auto_selects_unfrozen_atoms(claisen_systems):
+    gs, _ = claisen_systems
+    frozen = _with_frozen_atoms(gs, 3)
+    active = quiver.select_active_atoms(frozen, "auto", substituted=[0])
+    assert list(active) == list(range(gs.number_of_atoms))
+
+    masses = [12.0] * frozen.number_of_atoms
+    iso = quiver.Isotopologue("t", frozen, masses, active)
+    assert iso.mw_hessian.shape == (3 * gs.number_of_atoms,) * 2
+    # nothing is dropped: the frozen atoms pin translations and rotations
+    small, _, regular, n_small = iso.calculate_frequencies(imag_threshold=50)
+    assert n_small == 0 and len(regular) == 3 * gs.number_of_atoms
+
+
+def test_phva_all_atoms_is_full_analysis(claisen_systems):
+    gs, _ = claisen_systems
+    every = range(1, gs.number_of_atoms + 1)
+    assert quiver.select_active_atoms(gs, every) is None
+    assert quiver.select_active_atoms(gs, "auto") is None
+    assert quiver.select_active_atoms(gs, None) is None
+
+
+def test_phva_substituted_atoms_must_be_active(claisen_systems):
+    gs, _ = claisen_systems
+    with pytest.raises(ValueError):
+        quiver.select_active_atoms(gs, [2, 3, 4], substituted=[0])
+    with pytest.raises(ValueError):
+        quiver.select_active_atoms(gs, -1.0, substituted=[0])
+    with pytest.raises(ValueError):
+        quiver.select_active_atoms(gs, "everything")
+
+
+def test_phva_radius_converges_to_full(tutorial, claisen_systems):
+    from pyquiver import Config
+    gs, ts = claisen_systems
+    cfg = Config.from_dict({"C1": [(1, 1, "13C")], "C4": [(4, 4, "13C")]},
+                           temperature=393, scaling=0.9614, imag_threshold=50)
+    full = KIE_Calculation(cfg, gs, ts)
+    partial = KIE_Calculation(cfg, gs, ts, active_atoms=3.0)
+    gs_active, ts_active = partial.select_active_atoms()
+    assert gs_active is not None and len(gs_active) < gs.number_of_atoms
+    for name in full.KIES:
+        assert partial.KIES[name].value[0] == pytest.approx(
+            full.KIES[name].value[0], abs=2e-4)
+    # the batched engine handles the active block exactly like eigvalsh
+    batched = KIE_Calculation(cfg, gs, ts, active_atoms=3.0, engine="batched")
+    for name in full.KIES:
+        assert np.allclose(batched.KIES[name].value, partial.KIES[name].value)
+
+
+def test_phva_reaction_mode_covers_all_atoms(claisen_systems):
+    _, ts = claisen_systems
+    masses = [12.0] * ts.number_of_atoms
+    active = np.arange(8)
+    composition = quiver.Isotopologue("t", ts, masses, active).reaction_mode_composition()
+    assert composition.shape == (ts.number_of_atoms,)
+    assert np.all(composition[8:] == 0.0)
+    assert composition.sum() == pytest.approx(1.0)
+
+
+# --- memory: mass-weighted Hessians are not kept -------------------------------
+
+@pytest.fixture
+def synthetic_system(make_system):
+    # a System with a random positive definite Hessian (with one negative
+    # diagonal element if ``imaginary``)
+    def _system(n_atoms, imaginary=False):
+        rng = np.random.default_rng(0)
+        x = rng.normal(size=(3 * n_atoms, 3 * n_atoms))
+        hessian = x @ x.T / (3 * n_atoms)
+        if imaginary:
+            hessian[0, 0] -= 3.0
+        return make_system(n_atoms, hessian, positions=rng.normal(size=(n_atoms, 3)))
+    return _system
+
+
+def test_isotopologue_is_compact(claisen_systems):
+    gs, _ = claisen_systems
+    iso = quiver.Isotopologue("t", gs, [12.0] * gs.number_of_atoms)
+    assert not hasattr(iso, "__dict__")
+    iso.calculate_frequencies(imag_threshold=50)
+    # nothing Hessian-sized survives the diagonalization
+    assert all(np.size(getattr(iso, slot)) <= 3 * gs.number_of_atoms
+               for slot in quiver.Isotopologue.__slots__
+               if slot not in ("system", "frequencies"))
+
+
+def test_peak_memory_independent_of_isotopologue_count(synthetic_system):
+    from pyquiver import Config
+    gs, ts = synthetic_system(60), synthetic_system(60, imaginary=True)
+    hessian_bytes = gs.hessian.nbytes
+
+    def peak(k):
+        cfg = Config.from_dict({"C%d" % i: [(i, i, "13C")] for i in range(1, k + 1)},
+                               temperature=300, scaling=1.0, imag_threshold=50)
+        return KIE_Calculation(cfg, gs, ts, track_memory=True).peak_memory
+
+    few, many = peak(2), peak(20)
+    assert many < 5 * hessian_bytes
+    assert many < 1.6 * few
+    assert KIE_Calculation(
+        Config.from_dict({"C1": [(1, 1, "13C")]}, temperature=300, scaling=1.0,
+                         imag_threshold=50), gs, ts).peak_memory is None
+
+
+def test_memory_tracing_stopped_after_failure(synthetic_system):
+    from pyquiver import Config, engines
+    gs, ts = synthetic_system(20), synthetic_system(20, imaginary=True)
+    cfg = Config.from_dict({"C1": [(1, 1, "13C")]}, temperature=300, scaling=1.0,
+                           imag_threshold=50)
+    with mock.patch.object(engines, "run", side_effect=RuntimeError("failed")):
+        with pytest.raises(RuntimeError):
+            KIE_Calculation(cfg, gs, ts, track_memory=True)
+    assert not tracemalloc.is_tracing()
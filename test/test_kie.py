@@ -2,6 +2,7 @@
 KIE_Calculation driver), beyond the pure physics functions."""
 
 import logging
+from unittest import mock
 
 import numpy as np
 import pytest
@@ -111,3 +112,88 @@ def test_apply_reference_divides(kie):
     # dividing by itself yields ones in every column
     result = calc.KIES["C1"].apply_reference(calc.KIES["C1"])
     assert np.allclose(result, 1.0)
+
+
+# --- trace-based screening (no diagonalization) ------------------------------
+
+def test_screen_does_not_diagonalize(tutorial):
+    from unittest import mock
+    with mock.patch("numpy.linalg.eigvalsh") as eigvalsh, \
+            mock.patch("numpy.linalg.eigh") as eigh:
+        rows = KIE_Calculation.screen(tutorial(*CFG), tutorial(*GS), tutorial(*TS))
+    assert not eigvalsh.called and not eigh.called
+    assert [r.name for r in rows] == ["C1", "C2", "O3", "C4", "C5", "C6", "H/D"]
+    assert all(r.exact is None and r.error is None for r in rows)
+
+
+def test_screen_validate_reports_error(tutorial):
+    rows = KIE_Calculation.screen(tutorial(*CFG), tutorial(*GS), tutorial(*TS),
+                                  validate=True)
+    by_name = {r.name: r for r in rows}
+    # first order is good to well under a percent for the heavy atoms
+    for name in ("C1", "O3", "C4"):
+        assert abs(by_name[name].error) < 0.01
+        assert by_name[name].value == pytest.approx(
+            by_name[name].exact * (1 + by_name[name].error))
+
+
+def test_approximate_rpfr_converges_with_order(claisen_systems):
+    # at high temperature every u = hv/kT is small and the expansion converges:
+    # second order must beat first order against the exact rpfr
+    gs, _ = claisen_systems
+    light = np.array([12.0] * gs.number_of_atoms)
+    heavy = light.copy()
+    heavy[0] = 13.00335
+    exact = kiemod.calculate_rpfr((quiver.Isotopologue("l", gs, light),
+                                   quiver.Isotopologue("h", gs, heavy)),
+                                  50, 1.0, 2000.0)[0]
+    first = kiemod.approximate_rpfr(gs, light, heavy, 2000.0, order=1)
+    second = kiemod.approximate_rpfr(gs, light, heavy, 2000.0, order=2)
+    assert abs(second / exact - 1) < abs(first / exact - 1) < 1e-3
+    assert kiemod.approximate_rpfr(gs, light, light, 300.0) == 1.0
+    with pytest.raises(ValueError):
+        kiemod.approximate_rpfr(gs, light, heavy, 300.0, order=3)
+
+
+# --- multi-label combinations ---------------------------------------------------
+
+def test_combinations_exact_matches_explicit_isotopologue(tutorial):
+    cfg = tutorial("gaussian", "claisen_demo.config")
+    gs, ts = tutorial("gaussian", "claisen_gs.out"), tutorial("gaussian", "claisen_ts.out")
+    calc = KIE_Calculation(cfg, gs, ts)
+    results = calc.combinations(sites=["C1", "C2", "O3"], k=[1, 2], tolerance=0.0)
+    by_name = {r.name: r for r in results}
+    assert [r.name for r in results] == ["C1", "C2", "O3", "C1+C2", "C1+O3", "C2+O3"]
+    assert by_name["C1"].exact is None
+    assert by_name["C1"].value == pytest.approx(calc.results["C1"].infinite_parabola)
+    # the rule of the geometric mean holds closely for heavy atoms
+    pair = by_name["C1+C2"]
+    assert pair.estimate == pytest.approx(calc.results["C1"].infinite_parabola
+                                          * calc.results["C2"].infinite_parabola
+                                          * calc.KIES["C5"].value[-1])
+    assert pair.exact == pytest.approx(pair.estimate, rel=1e-3)
+
+    config = Config(cfg)
+    config.isotopologues["C1+C2"] = [(1, 1, "13C"), (2, 2, "13C")]
+    direct = KIE_Calculation(config, gs, ts)
+    assert pair.exact == pytest.approx(direct.results["C1+C2"].infinite_parabola, rel=1e-10)
+
+
+def test_combinations_skip_additive_ones(tutorial):
+    calc = KIE_Calculation(tutorial("gaussian", "claisen_demo.config"),
+                           tutorial("gaussian", "claisen_gs.out"),
+                           tutorial("gaussian", "claisen_ts.out"))
+    with mock.patch("numpy.linalg.eigvalsh", side_effect=AssertionError):
+        results = calc.combinations(k=3, tolerance=np.inf)
+    assert len(results) == 20                       # C(6, 3) non-reference sites
+    assert all(r.exact is None and r.value == r.estimate for r in results)
+
+
+@pytest.mark.parametrize("kwargs", [dict(sites=["C1", "nope"]), dict(k=0), dict(k=9),
+                                    dict(sites=["C1", "C1"])])
+def test_combinations_validate(tutorial, kwargs):
+    calc = KIE_Calculation(tutorial("gaussian", "claisen_demo.config"),
+                           tutorial("gaussian", "claisen_gs.out"),
+                           tutorial("gaussian", "claisen_ts.out"))
+    with pytest.raises(ValueError):
+        calc.combinations(**kwargs)
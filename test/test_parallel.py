@@ -29,7 +29,7 @@ def test_parallel_matches_serial(tutorial, n_jobs):
         assert np.allclose(serial.KIES[name].value, parallel.KIES[name].value)
 
 
-def test_reference_still_diagonalized_once_in_parallel(tutorial):
+def test_reference_still_diagonalized_once_in_parallel(tutorial, fresh_eigencache):
     real_eigvalsh = np.linalg.eigvalsh
     calls = []
 
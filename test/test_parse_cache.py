@@ -0,0 +1,104 @@
+"""Tests for the opt-in on-disk parse cache (``pyquiver.parsers.cache``)."""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from pyquiver import batch, parsers, quiver
+from pyquiver.parsers import cache
+
+
+@pytest.fixture
+def parse_cache(tmp_path):
+    yield parsers.enable_cache(str(tmp_path / "cache"))
+    parsers.disable_cache()
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    # count calls to the real Gaussian parser
+    calls = []
+    original = parsers._PARSERS["gaussian"]
+
+    def parse(path):
+        calls.append(path)
+        return original(path)
+    monkeypatch.setitem(parsers._PARSERS, "gaussian", parse)
+    return calls
+
+
+def test_hit_skips_parsing(parse_cache, counted, tutorial):
+    first = quiver.System(tutorial("gaussian", "claisen_gs.out"), style="gaussian")
+    second = quiver.System(tutorial("gaussian", "claisen_gs.out"), style="g16")
+    assert len(counted) == 1
+    assert second.atomic_numbers == first.atomic_numbers
+    assert np.array_equal(second.positions_angstrom, first.positions_angstrom)
+    assert np.array_equal(second.hessian, first.hessian)
+    assert len(os.listdir(parse_cache.directory)) == 1
+
+
+def test_key_follows_content_not_path(parse_cache, counted, tutorial, tmp_path):
+    copy = tmp_path / "renamed.out"
+    shutil.copy(tutorial("gaussian", "claisen_gs.out"), str(copy))
+    quiver.System(tutorial("gaussian", "claisen_gs.out"))
+    quiver.System(str(copy))
+    assert len(counted) == 1
+    with open(str(copy), "a") as f:
+        f.write("\n Normal termination of Gaussian\n")
+    quiver.System(str(copy))
+    assert len(counted) == 2
+
+
+def test_batch_uses_cache(parse_cache, counted, tutorial):
+    pairs = {label: (tutorial("gaussian", "claisen_gs.out"), tutorial("gaussian", "claisen_ts.out"))
+             for label in ("a", "b", "c")}
+    batch(tutorial("gaussian", "claisen_demo.config"), pairs)
+    assert len(counted) == 2
+
+
+@pytest.mark.parametrize("damage", ["flip", "truncate"])
+def test_bad_entry_is_reparsed(parse_cache, counted, tutorial, damage):
+    path = tutorial("gaussian", "claisen_gs.out")
+    first = quiver.System(path)
+    entry, = [os.path.join(parse_cache.directory, name) for name in os.listdir(parse_cache.directory)]
+    with open(entry, "r+b") as f:
+        if damage == "flip":
+            f.seek(-8, os.SEEK_END)
+            f.write(b"\xff" * 8)
+        else:
+            f.truncate(os.path.getsize(entry) - 8)
+    second = quiver.System(path)
+    assert len(counted) == 2
+    assert np.array_equal(second.hessian, first.hessian)
+    # the entry was replaced by a good one
+    assert np.array_equal(quiver.System(path).hessian, first.hessian)
+    assert len(counted) == 2
+
+
+def test_lru_eviction(tmp_path, tutorial):
+    store = cache.ParseCache(str(tmp_path / "cache"))
+    gs = store.parse(tutorial("gaussian", "claisen_gs.out"), "gaussian", parsers._PARSERS["gaussian"])
+    # room for two entries of this size
+    store.max_bytes = int(2.5 * store.size())
+    files = [tutorial("gaussian", "claisen_ts.out"), tutorial("pyquiver", "claisen_gs.qin")]
+    for path, style in zip(files, ("gaussian", "native")):
+        store.parse(path, style, parsers._PARSERS[style])
+        # age the earlier entries so the use order is unambiguous
+        for mtime, _, entry in store._entries():
+            os.utime(entry, (mtime - 10, mtime - 10))
+    assert len(store._entries()) == 2
+    assert store.size() <= store.max_bytes
+    # the oldest entry (the ground state) was evicted
+    assert not os.path.exists(store._entry(store.key(tutorial("gaussian", "claisen_gs.out"), "gaussian")))
+    assert gs.hessian.shape == (42, 42)
+
+    store.clear()
+    assert store.size() == 0
+
+
+def test_disabled_by_default(tutorial):
+    assert parsers.active_cache() is None
+    with pytest.raises(ValueError):
+        cache.ParseCache(tutorial(), max_bytes=0)
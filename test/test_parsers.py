@@ -4,11 +4,15 @@ The Claisen tutorial system has 14 atoms, so every parser should produce a
 42x42 symmetric Hessian.
 """
 
+import tracemalloc
+
 import numpy as np
 import pytest
 
 from pyquiver import quiver
 from pyquiver import parsers
+from pyquiver.parsers import binary, native
+from pyquiver.parsers._common import decode_floats, expand_lower_triangle, parse_serial_lower_hessian
 
 N_ATOMS = 14
 
@@ -67,3 +71,152 @@ def test_pyquiver_round_trips_against_g09(tutorial):
                         style="pyquiver")
     g09 = quiver.System(tutorial("gaussian", "claisen_gs.out"), style="g09")
     assert np.allclose(qin.hessian, g09.hessian, atol=1e-6)
+
+
+def _fchk_text(system):
+    # a formatted checkpoint in Gaussian's fixed layout: I12 six per line,
+    # E16.8 five per line
+    def section(name, kind, values):
+        per_line, fmt = (6, "%12d") if kind == "I" else (5, "%16.8E")
+        lines = ["%-40s   %s   N=%12d" % (name, kind, len(values))]
+        for i in range(0, len(values), per_line):
+            lines.append("".join(fmt % v for v in values[i:i + per_line]))
+        return lines
+
+    n3 = 3 * system.number_of_atoms
+    lines = ["claisen", "Freq      RB3LYP                                                      6-31G(d)",
+             "%-40s   I     %12d" % ("Number of atoms", system.number_of_atoms)]
+    lines += section("Atomic numbers", "I", system.atomic_numbers)
+    lines += section("Nuclear charges", "R", [float(z) for z in system.atomic_numbers])
+    lines += section("Current cartesian coordinates", "R",
+                     (system.positions_angstrom / 0.5291772).ravel())
+    lines += section("Cartesian Force Constants", "R", system.hessian[np.tril_indices(n3)])
+    lines += section("Vib-E2", "R", [0.0] * 7)
+    return "\n".join(lines) + "\n"
+
+
+def test_fchk_matches_gaussian_log(tutorial, tmp_path):
+    g16 = quiver.System(tutorial("gaussian", "claisen_gs.out"), style="gaussian")
+    path = tmp_path / "claisen_gs.fchk"
+    path.write_text(_fchk_text(g16))
+    fchk = quiver.System(str(path), style="fchk")
+    assert fchk.atomic_numbers == g16.atomic_numbers
+    assert np.allclose(fchk.positions_angstrom, g16.positions_angstrom, atol=1e-6)
+    assert np.allclose(fchk.hessian, g16.hessian, rtol=1e-7, atol=1e-12)
+
+
+def test_fchk_errors(tutorial, tmp_path):
+    text = _fchk_text(quiver.System(tutorial("gaussian", "claisen_gs.out"), style="gaussian"))
+    no_freq = tmp_path / "opt.fchk"
+    no_freq.write_text(text[:text.index("Cartesian Force Constants")])
+    with pytest.raises(ValueError, match="No frequency job"):
+        quiver.System(str(no_freq), style="fchk")
+    # a block that holds fewer values than its header declares
+    truncated = tmp_path / "truncated.fchk"
+    truncated.write_text(text.replace("N=          42", "N=          45", 1))
+    with pytest.raises(ValueError, match="declares 45"):
+        quiver.System(str(truncated), style="fchk")
+    # ...and so is a bad force constant block, not as a missing frequency job
+    short = tmp_path / "short.fchk"
+    short.write_text(text.replace("N=         903", "N=         904", 1))
+    with pytest.raises(ValueError, match="'Cartesian Force Constants' .* declares 904"):
+        quiver.System(str(short), style="fchk")
+    start = text.index("\n", text.index("Cartesian Force Constants")) + 1
+    value = text[start:].split()[0]
+    bad = tmp_path / "bad_token.fchk"
+    bad.write_text(text[:start] + text[start:].replace(value, "nan?", 1))
+    with pytest.raises(ValueError, match="'nan\\?'"):
+        quiver.System(str(bad), style="fchk")
+
+
+def test_serial_lower_triangle(tutorial):
+    system = quiver.System(tutorial("gaussian", "claisen_gs.out"), style="gaussian")
+    n3 = 3 * system.number_of_atoms
+    packed = system.hessian[np.tril_indices(n3)]
+    fields = [repr(float(v)) for v in packed] + [""]
+    assert np.array_equal(parse_serial_lower_hessian(fields, system.number_of_atoms),
+                          system.hessian)
+    assert np.array_equal(expand_lower_triangle(packed, n3), system.hessian)
+
+
+def test_lower_triangle_expansion_allocates_only_the_result():
+    size = 600
+    values = np.arange(size * (size + 1) // 2, dtype=float)
+    tracemalloc.start()
+    try:
+        full = expand_lower_triangle(values, size)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 1.1 * full.nbytes
+    assert np.array_equal(full, full.T)
+    assert full[size - 1, 0] == values[(size - 1) * size // 2]
+
+
+def test_lower_triangle_length_checked():
+    with pytest.raises(ValueError, match="lower-triangle"):
+        parse_serial_lower_hessian(["1.0", "2.0"], 1)
+
+
+@pytest.mark.parametrize("text", [
+    "1.5,-2.0e-3,3,\n", b" 1.5\t-2.0E-03\n 3 ", b"1.5, -2.0e-3,,3", memoryview(b"1.5 -0.002 3.0"),
+])
+def test_decode_floats_delimiters(text):
+    assert np.array_equal(decode_floats(text), [1.5, -2.0e-3, 3.0])
+
+
+def test_decode_floats_chunks():
+    values = np.random.default_rng(0).normal(size=5000)
+    text = ",".join(repr(v) for v in values.tolist()).encode()
+    assert np.array_equal(decode_floats(text), values)
+    # chunk boundaries never split a number
+    assert np.array_equal(decode_floats(text, chunk_size=97), values)
+    assert np.array_equal(decode_floats(text, chunk_size=1000), values)
+    assert decode_floats(b"").shape == (0,)
+    assert decode_floats(b" ,\n").shape == (0,)
+
+
+def test_decode_floats_bad_token(tmp_path):
+    with pytest.raises(ValueError, match="'1.0D-02'"):
+        decode_floats(b"1.0,1.0D-02,3.0")
+    # the error surfaces from a memory-mapped parse as well
+    path = tmp_path / "bad.qin"
+    path.write_text("1\n0,6,0.0,0.0,0.0\n1.0,2.0,x,4.0,5.0,6.0,\n")
+    with pytest.raises(ValueError, match="'x'"):
+        quiver.System(str(path), style="native")
+
+
+def test_bad_token_in_orca_and_fchk(tutorial, tmp_path):
+    with open(tutorial("orca", "claisen_gs_freq.hess")) as f:
+        text = f.read()
+    start = text.index("$hessian")
+    row = text.index("\n", text.index("\n", text.index("\n", start) + 1) + 1) + 1
+    value = text[row:].split()[1]
+    orca = tmp_path / "bad.hess"
+    orca.write_text(text[:row] + text[row:].replace(value, "1.0D-02", 1))
+    with pytest.raises(ValueError, match="'1.0D-02'"):
+        quiver.System(str(orca), style="orca")
+
+    text = _fchk_text(quiver.System(tutorial("gaussian", "claisen_gs.out"), style="gaussian"))
+    start = text.index("\n", text.index("Current cartesian coordinates")) + 1
+    value = text[start:].split()[0]
+    fchk = tmp_path / "bad.fchk"
+    fchk.write_text(text[:start] + text[start:].replace(value, "nan?", 1))
+    with pytest.raises(ValueError, match="'nan\\?'"):
+        quiver.System(str(fchk), style="fchk")
+
+
+def test_count_atoms_reads_headers_only(tutorial, tmp_path):
+    g16 = quiver.System(tutorial("gaussian", "claisen_gs.out"), style="gaussian")
+    fchk = tmp_path / "claisen_gs.fchk"
+    fchk.write_text(_fchk_text(g16))
+    qin = tmp_path / "claisen_gs.qin"
+    qin.write_text(native.serialize(g16))
+    qinb = str(tmp_path / "claisen_gs.qinb")
+    binary.write(g16, qinb)
+    for path, style in [(tutorial("gaussian", "claisen_gs.out"), "g16"),
+                        (tutorial("orca", "claisen_gs_freq.hess"), "orca"),
+                        (str(fchk), "fchk"), (str(qin), "pyquiver"), (qinb, "qinb")]:
+        assert parsers.count_atoms(path, style) == 14
+    with pytest.raises(ValueError):
+        parsers.count_atoms(str(qin), "nope")
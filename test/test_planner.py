@@ -0,0 +1,134 @@
+"""Tests for the batch planner (pyquiver.planner)."""
+
+import pytest
+
+from pyquiver import batch, iter_results, planner
+from pyquiver.batch import BatchResults
+
+CONFIG = ("gaussian", "claisen_demo.config")
+GS = ("gaussian", "claisen_gs.out")
+TS = ("gaussian", "claisen_ts.out")
+
+# a fixed cost model: 10 us per call plus 1 ns per n^3
+CALIBRATION = (1e-5, 1e-9)
+
+
+@pytest.fixture
+def files(tutorial):
+    return tutorial(*CONFIG), tutorial(*GS), tutorial(*TS)
+
+
+def test_estimates_largest_first(files, make_system):
+    cfg, gs, ts = files
+    pairs = {"small": (gs, ts), "large": (make_system(200), make_system(201)),
+             "medium": (make_system(60), make_system(60))}
+    plan = planner.plan(cfg, pairs, n_jobs=4, calibration=CALIBRATION)
+    assert plan.order == ["large", "medium", "small"]
+    small = plan.estimates[-1]
+    assert (small.gs_atoms, small.ts_atoms, small.isotopologues) == (14, 14, 7)
+    seconds = [e.seconds for e in plan.estimates]
+    assert seconds == sorted(seconds, reverse=True)
+    # 8 diagonalizations of each 603 x 603 Hessian dominate the large pair
+    assert plan.estimates[0].seconds == pytest.approx(8 * 1e-9 * (600**3 + 603**3), rel=0.05)
+    assert "Plan:" in str(plan) and "large" in str(plan)
+
+
+def test_strategy_follows_sizes_cores_and_memory(files, make_system):
+    cfg, _, _ = files
+    many = {str(i): (make_system(300), make_system(300)) for i in range(64)}
+    assert planner.plan(cfg, many, n_jobs=16, memory_limit=1 << 40,
+                        calibration=CALIBRATION).strategy == "process"
+    # one core: nothing to parallelize over
+    plan = planner.plan(cfg, many, n_jobs=1, memory_limit=1 << 40, calibration=CALIBRATION)
+    assert plan.strategy in ("serial", "batched") and plan.n_jobs == 1
+    assert plan.alternatives["process"] is None
+    # memory for only two pairs at once caps the workers
+    per_pair = planner.plan(cfg, {"x": many["0"]}, n_jobs=1,
+                            calibration=CALIBRATION).estimates[0].peak_bytes
+    plan = planner.plan(cfg, many, n_jobs=16, memory_limit=2 * per_pair + 1,
+                        strategy="process", calibration=CALIBRATION)
+    assert plan.n_jobs == 2 and plan.peak_bytes <= 2 * per_pair + 1
+    # tiny batches stay serial
+    assert planner.plan(cfg, {"a": (make_system(14), make_system(14))}, n_jobs=16,
+                        calibration=CALIBRATION).strategy == "serial"
+    with pytest.raises(ValueError):
+        planner.plan(cfg, many, strategy="gpu", calibration=CALIBRATION)
+
+
+def test_lpt_makespan():
+    assert planner._lpt([5, 4, 3, 3, 3], 2) == 10   # greedy: 5+3 | 4+3+3
+    assert planner._lpt([5, 4, 3], 1) == 12
+
+
+def test_calibrate_is_remembered(monkeypatch):
+    monkeypatch.setattr(planner, "_calibration", None)
+    overhead, unit = planner.calibrate(size=64, repeats=1)
+    assert overhead >= 0 and unit >= 0
+    assert planner.calibrate() == (overhead, unit)
+
+
+def test_dry_run_does_not_run(files, monkeypatch):
+    import sys
+    batch_module = sys.modules["pyquiver.batch"]
+    cfg, gs, ts = files
+
+    def fail(*args, **kwargs):
+        raise AssertionError("dry_run ran a calculation")
+
+    monkeypatch.setattr(batch_module, "KIE_Calculation", fail)
+    plan = batch(cfg, {"a": (gs, ts)}, executor="auto", dry_run=True)
+    assert isinstance(plan, planner.Plan) and plan.order == ["a"]
+    plan = batch(cfg, {"a": (gs, ts)}, executor="process", n_jobs=2, dry_run=True)
+    assert plan.strategy == "process"
+
+
+def test_auto_executor_matches_serial(files):
+    cfg, gs, ts = files
+    pairs = {"a": (gs, ts), "b": (gs, ts)}
+    results = batch(cfg, pairs, executor="auto")
+    assert isinstance(results, BatchResults) and list(results) == ["a", "b"]
+    assert results.to_records() == batch(cfg, pairs).to_records()
+
+
+def test_auto_keeps_an_explicit_engine(files, make_system):
+    cfg, _, _ = files
+    many = {str(i): (make_system(300), make_system(300)) for i in range(64)}
+    chosen = planner.plan(cfg, many, n_jobs=1, memory_limit=1 << 40, calibration=CALIBRATION)
+    assert chosen.engine == ("batched" if chosen.strategy == "batched" else "eigvalsh")
+    plan = planner.plan(cfg, many, n_jobs=1, memory_limit=1 << 40, calibration=CALIBRATION,
+                        engine="eigvalsh")
+    assert plan.strategy == "serial" and plan.engine == "eigvalsh"
+    assert plan.alternatives["batched"] is None
+    plan = planner.plan(cfg, many, n_jobs=1, memory_limit=1 << 40, calibration=CALIBRATION,
+                        engine="batched")
+    assert plan.strategy == "batched" and plan.engine == "batched"
+    plan = planner.plan(cfg, many, n_jobs=16, memory_limit=1 << 40, calibration=CALIBRATION,
+                        engine="batched")
+    assert plan.strategy == "process" and plan.engine == "batched"
+
+
+def test_auto_with_timeout_plans_processes(files):
+    cfg, gs, ts = files
+    pairs = {"a": (gs, ts)}
+    # the planner would run this small batch serially, which cannot time out
+    assert batch(cfg, pairs, executor="auto", dry_run=True).strategy == "serial"
+    plan = batch(cfg, pairs, executor="auto", timeout=600, dry_run=True)
+    assert plan.strategy == "process"
+    results = batch(cfg, pairs, executor="auto", timeout=600)
+    assert not results.failures
+    assert results.to_records() == batch(cfg, pairs).to_records()
+
+
+def test_unreadable_pairs_are_listed_not_raised(files, tmp_path):
+    cfg, gs, ts = files
+    missing = str(tmp_path / "missing.out")
+    pairs = {"missing": (missing, ts), "a": (gs, ts)}
+    plan = batch(cfg, pairs, executor="auto", dry_run=True)
+    assert [e.label for e in plan.estimates] == ["a"]
+    assert plan.order == ["a", "missing"]
+    assert plan.unreadable["missing"].startswith("FileNotFoundError")
+    assert "Not estimated" in str(plan) and "missing" in str(plan)
+    # the executor reports the failure when the pair runs
+    results = list(iter_results(cfg, pairs, executor="auto"))
+    assert [r.label for r in results] == ["missing", "a"]
+    assert "FileNotFoundError" in results[0].error and results[1].error is None
@@ -1,4 +1,4 @@
-"""Round-trip test for the native .qin serialization.
+"""Round-trip tests for the native .qin and binary .qinb serializations.
 
 Parsing a g09 file, dumping it to the native ``.qin`` format, and re-parsing
 must reproduce the same geometry and Hessian. This exercises
@@ -9,8 +9,10 @@ the trailing-comma handling in the lower-triangle Hessian parser.
 import shutil
 
 import numpy as np
+import pytest
 
 from pyquiver import quiver
+from pyquiver.parsers import binary, native
 
 
 def test_qin_round_trip(tmp_path, tutorial):
@@ -27,3 +29,76 @@ def test_qin_round_trip(tmp_path, tutorial):
     assert reparsed.number_of_atoms == original.number_of_atoms
     assert reparsed.atomic_numbers == original.atomic_numbers
     assert np.allclose(reparsed.hessian, original.hessian, atol=1e-6)
+
+
+@pytest.mark.parametrize("style,filename", [
+    ("gaussian", "gaussian/claisen_gs.out"),
+    ("orca", "orca/claisen_gs_freq.hess"),
+    ("pyquiver", "pyquiver/claisen_gs.qin"),
+])
+def test_binary_conversion_is_exact(style, filename, tutorial, tmp_path):
+    source = quiver.System(tutorial(*filename.split("/")), style=style)
+    out = binary.convert(tutorial(*filename.split("/")), style, out=str(tmp_path / "x.qinb"))
+    converted = quiver.System(out, style="binary")
+    assert converted.atomic_numbers == source.atomic_numbers
+    assert np.array_equal(converted.positions_angstrom, source.positions_angstrom)
+    assert np.array_equal(converted.hessian, source.hessian)
+
+
+def test_binary_dump_and_header(tmp_path, tutorial):
+    src = tmp_path / "claisen_gs.out"
+    shutil.copy(tutorial("gaussian", "claisen_gs.out"), str(src))
+    path = quiver.System(str(src), style="gaussian").dump_pyquiver_binary_file()
+    assert path == str(tmp_path / "claisen_gs.qinb")
+    version, number_of_atoms, digest = binary.read_header(path)
+    assert (version, number_of_atoms) == (2, 14)
+    assert binary.content_hash(path) == digest
+    z, positions, packed = binary.load(path, verify=True)
+    assert isinstance(packed, np.memmap) and packed.shape == (42 * 43 // 2,)
+
+
+def test_binary_rejects_bad_files(tmp_path, tutorial):
+    path = binary.convert(tutorial("pyquiver", "claisen_gs.qin"), "native",
+                          out=str(tmp_path / "x.qinb"))
+    data = bytearray(open(path, "rb").read())
+
+    corrupt = tmp_path / "corrupt.qinb"
+    data[-1] ^= 0xFF
+    corrupt.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="corrupt"):
+        binary.load(str(corrupt), verify=True)
+
+    truncated = tmp_path / "truncated.qinb"
+    truncated.write_bytes(bytes(data[:-8]))
+    with pytest.raises(ValueError, match="truncated"):
+        quiver.System(str(truncated), style="binary")
+
+    text = tmp_path / "text.qinb"
+    text.write_text("14\n")
+    with pytest.raises(ValueError, match="not a binary"):
+        quiver.System(str(text), style="binary")
+
+
+def test_qin_writer_round_trips_exactly(tmp_path, tutorial, monkeypatch):
+    system = quiver.System(tutorial("gaussian", "claisen_ts.out"), style="gaussian")
+    # a tiny block size exercises the row chunking
+    monkeypatch.setattr(native, "_WRITE_CHUNK", 50)
+    path = tmp_path / "claisen_ts.qin"
+    with open(str(path), "w") as f:
+        native.write(system, f)
+    text = path.read_text()
+    assert text.count(",") == 14 * 4 + 42 * 43 // 2
+    assert text.endswith(",")
+    reparsed = quiver.System(str(path), style="pyquiver")
+    assert reparsed.atomic_numbers == system.atomic_numbers
+    assert np.array_equal(reparsed.positions_angstrom, system.positions_angstrom)
+    assert np.array_equal(reparsed.hessian, system.hessian)
+
+
+def test_dump_returns_text(tmp_path, tutorial):
+    src = tmp_path / "claisen_ts.out"
+    shutil.copy(tutorial("gaussian", "claisen_ts.out"), str(src))
+    system = quiver.System(str(src), style="gaussian")
+    text = system.dump_pyquiver_input_file()
+    assert text == (tmp_path / "claisen_ts.qin").read_text()
+    assert text == native.serialize(system)
@@ -0,0 +1,60 @@
+"""Tests for the streaming result writers (pyquiver.sinks)."""
+
+import json
+
+import pytest
+
+from pyquiver import batch, iter_results
+from pyquiver.sinks import CSVSink, JSONLSink
+
+CONFIG = ("gaussian", "claisen_demo.config")
+GS = ("gaussian", "claisen_gs.out")
+TS = ("gaussian", "claisen_ts.out")
+
+
+@pytest.fixture
+def pairs(tutorial, tmp_path):
+    gs, ts = tutorial(*GS), tutorial(*TS)
+    return tutorial(*CONFIG), {"a": (gs, ts), "bad": (gs, str(tmp_path / "missing.out")),
+                               "b": (gs, ts)}
+
+
+def test_csv_sink_matches_batch_csv(pairs, tmp_path):
+    cfg, p = pairs
+    path = tmp_path / "out.csv"
+    with CSVSink(str(path)) as sink:
+        sink.write_all(iter_results(cfg, p))
+    assert sink.written == 3 and sink.failed == 1
+    good = {k: v for k, v in p.items() if k != "bad"}
+    assert path.read_text() == batch(cfg, good).to_csv()
+
+
+def test_csv_sink_appends_without_a_second_header(pairs, tmp_path):
+    cfg, p = pairs
+    path = tmp_path / "out.csv"
+    good = {"a": p["a"]}
+    with CSVSink(str(path)) as sink:
+        sink.write_all(iter_results(cfg, good))
+    with CSVSink(str(path)) as sink:
+        sink.write_all(iter_results(cfg, {"b": p["b"]}))
+    lines = path.read_text().splitlines()
+    assert lines[0].startswith("label,") and sum(l.startswith("label,") for l in lines) == 1
+    assert {l.split(",")[0] for l in lines[1:]} == {"a", "b"}
+
+
+def test_flushes_before_close(pairs, tmp_path):
+    cfg, p = pairs
+    path = tmp_path / "out.jsonl"
+    sink = JSONLSink(str(path), flush_every=1)
+    records = iter_results(cfg, p)
+    sink.write(next(records))
+    # on disk already, as if the job were killed now
+    assert json.loads(path.read_text())["label"] == "a"
+    sink.write_all(records)
+    sink.close()
+    lines = [json.loads(l) for l in path.read_text().splitlines()]
+    assert [l["label"] for l in lines] == ["a", "bad", "b"]
+    assert lines[1]["error"] and lines[0]["error"] is None
+    assert lines[0]["results"][0]["name"] == "C1" and lines[0]["eie"] is False
+    with pytest.raises(ValueError):
+        JSONLSink(str(path), flush_every=0)
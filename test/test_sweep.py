@@ -0,0 +1,115 @@
+"""Tests for temperature sweeps (pyquiver.sweep)."""
+
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from pyquiver import batch, KIE_Calculation, SweepResults
+from pyquiver.sweep import R
+
+CONFIG = ("gaussian", "claisen_demo.config")
+GS = ("gaussian", "claisen_gs.out")
+TS = ("gaussian", "claisen_ts.out")
+
+
+@pytest.fixture
+def calc(tutorial):
+    return KIE_Calculation(tutorial(*CONFIG), tutorial(*GS), tutorial(*TS), style="g09")
+
+
+def test_sweep_matches_fixed_temperature(calc):
+    T = calc.config.temperature
+    energies = (0.0, 0.02, 0.0)
+    st = calc.skodje_truhlar(reactant_energy=0.0, product_energy=0.0, ts_energy=0.02)
+    curve = calc.sweep([250.0, T, 500.0], energies=energies)
+    rows = [r for r in curve if r["temperature"] == T]
+    assert [r["name"] for r in rows] == [r.name for r in calc.results]
+    for row in rows:
+        expected = calc.results[row["name"]]
+        assert row["uncorrected"] == pytest.approx(expected.uncorrected, rel=1e-12)
+        assert row["wigner"] == pytest.approx(expected.wigner, rel=1e-12)
+        assert row["infinite_parabola"] == pytest.approx(expected.infinite_parabola, rel=1e-12)
+        assert row["skodje_truhlar"] == pytest.approx(st[row["name"]], rel=1e-12)
+
+
+def test_sweep_reuses_frequencies(calc):
+    with mock.patch("numpy.linalg.eigvalsh", side_effect=AssertionError), \
+            mock.patch("numpy.linalg.eigh", side_effect=AssertionError):
+        curve = calc.sweep(np.linspace(200.0, 500.0, 150))
+    assert len(curve) == 150 * len(calc.results)
+
+
+def test_eie_sweep(tutorial):
+    calc = KIE_Calculation(tutorial(*CONFIG), tutorial(*GS), tutorial(*GS), style="g09")
+    curve = calc.sweep([300.0, 400.0])
+    assert curve.columns == ["temperature", "name", "value"]
+    assert all(r["value"] == pytest.approx(1.0) for r in curve)
+    with pytest.raises(ValueError):
+        calc.sweep([300.0], energies=(0.0, 0.02, 0.0))
+
+
+@pytest.mark.parametrize("temperatures", [[], [300.0, -1.0], [[300.0]]])
+def test_sweep_rejects_bad_temperatures(calc, temperatures):
+    with pytest.raises(ValueError):
+        calc.sweep(temperatures)
+
+
+def test_arrhenius_recovers_parameters():
+    temperatures = np.linspace(250.0, 450.0, 20)
+    kie = 1.02 * np.exp(-1500.0 / (R * temperatures))   # dEa = 1.5 kJ/mol
+    records = [{"temperature": t, "name": "C1", "value": k}
+               for t, k in zip(temperatures, kie)]
+    fit, = SweepResults(["temperature", "name", "value"], records).arrhenius()
+    assert fit.name == "C1" and fit.label is None and fit.column == "value"
+    assert fit.prefactor_ratio == pytest.approx(1.02)
+    assert fit.delta_ea == pytest.approx(1.5)
+
+
+def test_arrhenius_needs_two_temperatures(calc):
+    with pytest.raises(ValueError):
+        calc.sweep([300.0]).arrhenius()
+    with pytest.raises(ValueError):
+        calc.sweep([300.0, 400.0]).arrhenius(column="name")
+
+
+def test_batch_sweep(tutorial):
+    results = batch(tutorial(*CONFIG), {"a": (tutorial(*GS), tutorial(*TS))},
+                    style="g09", energies={"a": (0.0, 0.02, 0.0)})
+    curve = results.sweep([300.0, 350.0, 400.0])
+    assert curve.columns[:3] == ["label", "temperature", "name"]
+    assert "skodje_truhlar" in curve.columns
+    assert {r["label"] for r in curve} == {"a"}
+    assert [f.label for f in curve.arrhenius()] == ["a"] * len(results["a"].results)
+    assert curve.to_csv().splitlines()[0].startswith("label,temperature,name")
+    pytest.importorskip("pandas")
+    assert len(curve.to_dataframe()) == len(curve)
+
+
+# --- scaling factors ----------------------------------------------------------
+
+def test_scaling_sweep_matches_new_calculation(calc, tutorial):
+    from pyquiver import Config
+    with mock.patch("numpy.linalg.eigvalsh", side_effect=AssertionError):
+        curve = calc.sweep_scaling([calc.config.scaling, 1.0], [300.0, 400.0])
+    assert curve.columns[:3] == ["scaling", "temperature", "name"]
+    assert len(curve) == 2 * 2 * len(calc.results)
+
+    config = Config(tutorial(*CONFIG))
+    config.scaling = 1.0
+    config.temperature = 400.0
+    unscaled = KIE_Calculation(config, tutorial(*GS), tutorial(*TS), style="g09")
+    for row in curve:
+        if row["scaling"] == 1.0 and row["temperature"] == 400.0:
+            expected = unscaled.results[row["name"]]
+            assert row["infinite_parabola"] == pytest.approx(expected.infinite_parabola,
+                                                             rel=1e-12)
+    fits = curve.arrhenius()
+    assert {f.scaling for f in fits} == {calc.config.scaling, 1.0}
+
+
+def test_scaling_sweep_defaults_to_config_temperature(calc):
+    curve = calc.sweep_scaling([0.95, 0.97, 0.99])
+    assert {r["temperature"] for r in curve} == {calc.config.temperature}
+    with pytest.raises(ValueError):
+        calc.sweep_scaling([0.0])
@@ -0,0 +1,94 @@
+"""Tests for symmetry-equivalent isotopologues (pyquiver.symmetry)."""
+
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from pyquiver import Config, KIE_Calculation, symmetry
+
+
+def _spring_hessian(positions, stiffness):
+    # the Hessian of a network of springs between nearby atoms (plus a weak
+    # on-site term so a planar network is stiff out of plane), which has
+    # exactly the symmetry of the geometry
+    n = len(positions)
+    hessian = np.zeros((n, 3, n, 3))
+    for i in range(n):
+        for j in range(i + 1, n):
+            d = positions[j] - positions[i]
+            r = np.linalg.norm(d)
+            if r < 2.6:
+                block = stiffness / r**2 * np.outer(d, d) / r**2
+                hessian[i, :, i, :] += block
+                hessian[j, :, j, :] += block
+                hessian[i, :, j, :] -= block
+                hessian[j, :, i, :] -= block
+    return hessian.reshape(3 * n, 3 * n) + 0.02 * np.eye(3 * n)
+
+
+@pytest.fixture
+def make_benzene(make_system):
+    # benzene held together by springs of the given stiffness
+    def _benzene(stiffness=0.3):
+        angles = np.arange(6) * np.pi / 3
+        ring = np.column_stack([np.cos(angles), np.sin(angles), np.zeros(6)])
+        positions = np.vstack([1.39 * ring, 2.48 * ring])
+        return make_system(12, _spring_hessian(positions, stiffness),
+                           [6] * 6 + [1] * 6, positions, filename="spring")
+    return _benzene
+
+
+def test_benzene_operations(make_benzene):
+    benzene = make_benzene()
+    operations = symmetry.symmetry_operations(benzene)
+    # D6h has 24 operations; in a planar molecule each permutation is shared
+    # by an operation and its product with the mirror plane
+    assert len(operations) == 12
+    assert np.array_equal(operations[0][1], np.arange(12))
+    for rotation, _ in operations:
+        assert np.allclose(rotation @ rotation.T, np.eye(3))
+    assert list(symmetry.equivalent_atoms(benzene, operations)) == [0] * 6 + [6] * 6
+
+
+def test_hessian_vetoes_geometric_operations(make_benzene):
+    benzene = make_benzene()
+    hessian = benzene.hessian.reshape(12, 3, 12, 3)
+    hessian[0, :, 0, :] += 0.05 * np.eye(3)           # make carbon 1 special
+    labels = symmetry.equivalent_atoms(benzene)
+    assert labels[0] == 0 and 0 not in labels[1:]
+
+
+def test_claisen_mirror_hydrogens(claisen_systems):
+    gs, ts = claisen_systems
+    assert len(symmetry.symmetry_operations(gs)) == 2
+    assert symmetry.equivalent_atoms(gs)[10] == 9
+    assert len(symmetry.symmetry_operations(ts)) == 1
+
+
+def test_symmetry_dedup_matches_full_calculation(fresh_eigencache, make_benzene):
+    gs, ts = make_benzene(0.3), make_benzene(0.25)
+    config = Config.from_dict({"C1H2": [(1, 1, "13C"), (8, 8, "2D")]}, temperature=300,
+                              scaling=1.0, imag_threshold=50, scan=["13C", "2D"])
+    with mock.patch("numpy.linalg.eigvalsh", wraps=np.linalg.eigvalsh) as eigvalsh:
+        deduplicated = KIE_Calculation(config, gs, ts, symmetry=True)
+    # reference, one carbon, one hydrogen and the C1/H8 pair, per structure
+    assert eigvalsh.call_count == 2 * 4
+    # every isotopologue diagonalized again, none taken from the cache
+    fresh_eigencache.clear()
+    full = KIE_Calculation(config, gs, ts)
+    assert list(deduplicated.KIES) == list(full.KIES)
+    for name in full.KIES:
+        assert deduplicated.results[name].value == pytest.approx(full.results[name].value,
+                                                                 rel=1e-10)
+
+
+def test_symmetry_off_by_default(claisen_systems):
+    gs, ts = claisen_systems
+    config = Config.from_dict({}, temperature=393, scaling=0.9614, imag_threshold=50,
+                              scan=["2D"])
+    calc = KIE_Calculation(config, gs, ts)
+    assert calc.find_representatives([None] * 3) == [0, 1, 2]
+    with_symmetry = KIE_Calculation(config, gs, ts, symmetry=True)
+    for name in calc.KIES:
+        assert with_symmetry.results[name] == pytest.approx(calc.results[name])
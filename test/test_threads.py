@@ -0,0 +1,115 @@
+"""Tests for the BLAS thread policy (pyquiver.threads)."""
+
+import pytest
+
+from pyquiver import KIE_Calculation, batch, cli, threads
+
+
+@pytest.fixture
+def claisen_paths(tutorial):
+    return (tutorial("gaussian", "claisen_demo.config"),
+            tutorial("gaussian", "claisen_gs.out"), tutorial("gaussian", "claisen_ts.out"))
+
+
+def test_blas_threads_for():
+    assert threads.blas_threads_for(1, cores=64) is None          # serial: leave BLAS alone
+    assert threads.blas_threads_for(8, cores=64) == 8
+    assert threads.blas_threads_for(3, cores=8) == 2
+    assert threads.blas_threads_for(16, cores=8) == 1             # never below one
+    assert threads.blas_threads_for(-1, cores=8) == 1             # one worker per core
+    assert threads.blas_threads_for(8, 4, cores=64) == 4
+    assert threads.blas_threads_for(8, None, cores=64) is None
+    for bad in (0, -2, 1.5, "four", True):
+        with pytest.raises(ValueError):
+            threads.blas_threads_for(8, bad)
+
+
+def test_limit_restores_previous_count():
+    info = threads.blas_info()
+    if not info:
+        pytest.skip("no controllable BLAS library detected")
+    before = [lib["num_threads"] for lib in info]
+    with threads.limit_blas_threads(3):
+        assert [lib["num_threads"] for lib in threads.blas_info()] == [3] * len(info)
+    assert [lib["num_threads"] for lib in threads.blas_info()] == before
+    with threads.limit_blas_threads(None):                         # no-op
+        assert [lib["num_threads"] for lib in threads.blas_info()] == before
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    # record the limit of every limit_blas_threads block
+    seen = []
+    real = threads.limit_blas_threads
+
+    def recording(n):
+        seen.append(n)
+        return real(n)
+
+    monkeypatch.setattr(threads, "limit_blas_threads", recording)
+    monkeypatch.setattr(threads, "cpu_count", lambda: 8)
+    return seen
+
+
+def test_calculation_limits_blas_threads(claisen_paths, limits):
+    calc = KIE_Calculation(*claisen_paths, n_jobs=4)
+    assert calc.blas_threads == 2 and limits == [2]
+    KIE_Calculation(*claisen_paths)
+    KIE_Calculation(*claisen_paths, n_jobs=4, blas_threads=None)
+    assert limits == [2, None, None]
+
+
+def test_batch_and_cli_pass_blas_threads(claisen_paths, limits):
+    cfg, gs, ts = claisen_paths
+    batch(cfg, {"a": (gs, ts)}, n_jobs=2, blas_threads=3)
+    assert limits == [3]
+    calc = cli.main([cfg, gs, ts, "-j", "2", "--blas-threads", "none"])
+    assert calc.blas_threads is None
+    with pytest.raises(SystemExit):
+        cli.main([cfg, gs, ts, "--blas-threads", "0"])
+
+
+class _FakeLibrary(object):
+    backend, path = "openblas", "/fake/libopenblas.so"
+
+    def __init__(self, count):
+        self.count = count
+
+    def set(self, n):
+        self.count = n
+
+    def get(self):
+        return self.count
+
+
+def test_overlapping_limits_restore_once(monkeypatch):
+    lib = _FakeLibrary(8)
+    monkeypatch.setattr(threads, "_threadpoolctl", lambda: None)
+    monkeypatch.setattr(threads, "_loaded_libraries", lambda: [lib])
+    # two blocks entered and left out of order, as from two threads
+    first, second = threads.limit_blas_threads(4), threads.limit_blas_threads(2)
+    first.__enter__()
+    assert lib.count == 4
+    second.__enter__()
+    assert lib.count == 2
+    first.__exit__(None, None, None)
+    assert lib.count == 2               # the second block is still running
+    second.__exit__(None, None, None)
+    assert lib.count == 8
+
+    # and from real threads, each checking its limit holds while it runs
+    import threading
+    barrier = threading.Barrier(4)
+    seen = []
+
+    def run(n):
+        with threads.limit_blas_threads(n):
+            barrier.wait()
+            seen.append(lib.count)
+            barrier.wait()
+    workers = [threading.Thread(target=run, args=(n,)) for n in (1, 2, 3, 4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert seen == [1] * 4 and lib.count == 8